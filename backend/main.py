@@ -12,7 +12,14 @@ project_root = backend_dir.parent
 if str(project_root) not in sys.path:
     sys.path.insert(0, str(project_root))
 
-from backend.routers import loading, chunking, parsing, embedding, indexing, filtering, generation
+from backend.utils.startup import timed_import, start_warmup
+from backend.services.embedding_service import EmbeddingService
+from backend.services.indexing_service import IndexingService
+from backend.services.job_service import start_job_workers, stop_job_workers
+from backend.services.loading_service import shutdown_page_pool
+from backend.utils.config import JOB_INPROCESS_WORKERS, STARTUP_WARMUP
+from backend.utils.executor import shutdown_executors
+from backend.utils.upload import UploadSizeLimitMiddleware
 
 app = FastAPI(title="RAG Practical Camp API", version="1.0.0")
 
@@ -24,15 +31,48 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# 上传大小在接收请求体时检查，超过 MAX_UPLOAD_SIZE_MB 的请求不会被完整缓存
+app.add_middleware(UploadSizeLimitMiddleware)
+
+# 注册路由（逐个导入并记录导入耗时，见 /api/system/startup）
+ROUTERS = [
+    ("loading", "/api/loading", "文档加载"),
+    ("chunking", "/api/chunking", "文档分块"),
+    ("parsing", "/api/parsing", "文档解析"),
+    ("embedding", "/api/embedding", "向量嵌入"),
+    ("indexing", "/api/indexing", "向量索引"),
+    ("filtering", "/api/filtering", "结果过滤和排序"),
+    ("generation", "/api/generation", "文本生成"),
+    ("jobs", "/api/jobs", "摄取任务"),
+    ("system", "/api/system", "系统状态"),
+]
+for module_name, prefix, tag in ROUTERS:
+    app.include_router(timed_import(f"backend.routers.{module_name}").router, prefix=prefix, tags=[tag])
+
+
+def _warm_embedding_model():
+    EmbeddingService().load_model()
+
+
+@app.on_event("startup")
+def on_startup():
+    """后台预热embedding模型和向量数据库，启动进程内的摄取任务worker"""
+    if STARTUP_WARMUP:
+        start_warmup("embedding_model", _warm_embedding_model)
+        start_warmup("vector_store", IndexingService().warm_up)
+    if JOB_INPROCESS_WORKERS > 0:
+        start_job_workers(JOB_INPROCESS_WORKERS)
+
+
+@app.on_event("shutdown")
+def on_shutdown():
+    """停止任务worker，关闭各阶段的线程池/进程池、页面提取进程池和embedding编码进程池"""
+    stop_job_workers()
+    shutdown_executors()
+    shutdown_page_pool()
+    for embedding_service in EmbeddingService.instances():
+        embedding_service.stop_pool()
 
-# 注册路由
-app.include_router(loading.router, prefix="/api/loading", tags=["文档加载"])
-app.include_router(chunking.router, prefix="/api/chunking", tags=["文档分块"])
-app.include_router(parsing.router, prefix="/api/parsing", tags=["文档解析"])
-app.include_router(embedding.router, prefix="/api/embedding", tags=["向量嵌入"])
-app.include_router(indexing.router, prefix="/api/indexing", tags=["向量索引"])
-app.include_router(filtering.router, prefix="/api/filtering", tags=["结果过滤和排序"])
-app.include_router(generation.router, prefix="/api/generation", tags=["文本生成"])
 
 # 静态文件服务（前端页面 - Vue构建后的dist目录）
 frontend_dist_path = os.path.join(project_root, "frontend", "dist")
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import Optional
-import os
 from backend.services.chunking_service import ChunkingService
-from backend.utils.storage import list_results, load_result
+from backend.utils.storage import list_history, load_result
+from backend.utils.executor import run_in_stage
 
 router = APIRouter()
 
@@ -19,7 +19,9 @@ class ChunkRequest(BaseModel):
 async def chunk_document(request: ChunkRequest):
     """对文档进行分块"""
     try:
-        result = ChunkingService.chunk_document(
+        result = await run_in_stage(
+            "cpu",
+            ChunkingService.chunk_document,
             file_id=request.file_id,
             chunking_strategy=request.chunking_strategy,
             chunk_size=request.chunk_size,
@@ -31,34 +33,13 @@ async def chunk_document(request: ChunkRequest):
 
 
 @router.get("/history")
-async def get_chunking_history():
-    """获取历史分块记录列表"""
+async def get_chunking_history(limit: Optional[int] = None, offset: int = 0, order: str = "desc"):
+    """获取历史分块记录列表（从结果目录查询，支持分页和按创建时间排序）"""
     try:
-        results = list_results("chunking")
-        history = []
-
-        for item in results:
-            chunk_id = item["file_id"]
-            result_data = load_result("chunking", chunk_id)
-
-            if result_data:
-                file_path = item["file_path"]
-                file_mtime = os.path.getmtime(file_path) if os.path.exists(file_path) else 0
-
-                history.append({
-                    "chunk_id": result_data.get("chunk_id", chunk_id),
-                    "file_id": result_data.get("file_id", ""),
-                    "chunking_strategy": result_data.get("strategy", result_data.get("chunking_strategy", "")),
-                    "total_chunks": result_data.get("total_chunks", 0),
-                    "created_at": file_mtime,
-                    "status": result_data.get("status", "unknown")
-                })
-
-        history.sort(key=lambda x: x["created_at"], reverse=True)
-
+        result = await run_in_stage("io", list_history, "chunking", limit, offset, order)
         return {
-            "total": len(history),
-            "history": history
+            "total": result["total"],
+            "history": result["history"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -68,7 +49,7 @@ async def get_chunking_history():
 async def get_chunking_detail(chunk_id: str):
     """获取指定分块记录的详细信息"""
     try:
-        result = load_result("chunking", chunk_id)
+        result = await run_in_stage("io", load_result, "chunking", chunk_id)
         if not result:
             raise HTTPException(status_code=404, detail=f"未找到chunk_id: {chunk_id}的记录")
         return result
@@ -1,16 +1,26 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from typing import Optional
-import os
+from typing import List, Optional
 from backend.services.embedding_service import EmbeddingService
-from backend.utils.storage import list_results, load_result
+from backend.services.model_registry import model_registry
+from backend.utils.config import LOCAL_EMBEDDING_MODEL, EMBEDDING_ALLOWED_MODELS
+from backend.utils.storage import list_history, load_result
+from backend.utils.vector_store import load_embedding_vectors, dequantize_rows
+from backend.utils.executor import run_in_stage
 
 router = APIRouter()
-embedding_service = EmbeddingService()
 
 
 class EmbedRequest(BaseModel):
     chunk_id: str
+    streaming: bool = False  # 流式嵌入（超大分块集合，支持断点续传）
+    model: Optional[str] = None  # 默认为LOCAL_EMBEDDING_MODEL，可选模型见EMBEDDING_ALLOWED_MODELS
+
+
+class ParityRequest(BaseModel):
+    texts: Optional[List[str]] = None
+    model: Optional[str] = None
+    reference_backend: str = "torch"
 
 
 @router.post("/embed")
@@ -19,63 +29,80 @@ async def embed_chunks(request: EmbedRequest):
     
     Args:
         chunk_id: 分块ID
+        model: embedding模型（可选，默认为LOCAL_EMBEDDING_MODEL）
+        streaming: 流式嵌入，逐批写入并记录断点，中断后重新提交会从断点继续
     """
     try:
-        result = embedding_service.embed_chunks(request.chunk_id)
+        result = await run_in_stage(
+            "inference", EmbeddingService(request.model).embed_chunks, request.chunk_id, request.streaming
+        )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
-@router.get("/history")
-async def get_embedding_history():
-    """获取历史嵌入记录列表"""
+@router.post("/parity")
+async def check_backend_parity(request: ParityRequest):
+    """对比当前推理后端（EMBEDDING_BACKEND）与参考后端的向量余弦偏差和编码速度"""
     try:
-        results = list_results("embedding")
-        history = []
-        errors = []
-
-        for item in results:
-            embedding_id = item["file_id"]
-            try:
-                result_data = load_result("embedding", embedding_id)
-
-                if result_data:
-                    file_path = item["file_path"]
-                    file_mtime = os.path.getmtime(file_path) if os.path.exists(file_path) else 0
-
-                    history.append({
-                        "embedding_id": result_data.get("embedding_id", embedding_id),
-                        "chunk_id": result_data.get("chunk_id", ""),
-                        "model": result_data.get("embedding_model", result_data.get("model", "")),
-                        "embedding_dim": result_data.get("embedding_dim", 0),
-                        "total_embeddings": result_data.get("total_embeddings", result_data.get("total_chunks", 0)),
-                        "created_at": file_mtime,
-                        "status": result_data.get("status", "unknown")
-                    })
-            except Exception as e:
-                # 跳过损坏的文件，记录错误但不中断整个流程
-                errors.append(f"跳过损坏的文件 {embedding_id}: {str(e)}")
-                continue
-
-        history.sort(key=lambda x: x["created_at"], reverse=True)
+        result = await run_in_stage(
+            "inference", EmbeddingService(request.model).check_backend_parity,
+            request.texts, request.reference_backend
+        )
+        return result
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/models")
+async def list_models():
+    """可选的embedding模型、已加载的模型及加载/淘汰事件"""
+    return {
+        "default": LOCAL_EMBEDDING_MODEL,
+        "allowed": [LOCAL_EMBEDDING_MODEL] + EMBEDDING_ALLOWED_MODELS,
+        **model_registry.stats()
+    }
 
+
+@router.get("/history")
+async def get_embedding_history(limit: Optional[int] = None, offset: int = 0, order: str = "desc"):
+    """获取历史嵌入记录列表（从结果目录查询，支持分页和按创建时间排序）"""
+    try:
+        result = await run_in_stage("io", list_history, "embedding", limit, offset, order)
         return {
-            "total": len(history),
-            "history": history,
-            "errors": errors if errors else None
+            "total": result["total"],
+            "history": result["history"],
+            "errors": result["errors"] or None
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _with_vectors(result: dict) -> dict:
+    """在清单的每个分块上附带向量：所有行一次取出并还原，再逐行转换为列表"""
+    vectors, scales = load_embedding_vectors(result)
+    chunks = list(EmbeddingService.iter_embedded_chunks(result))
+    rows = [chunk.get("vector_index", i) for i, chunk in enumerate(chunks)]
+    embeddings = dequantize_rows(vectors, scales, rows) if rows else []
+    result = dict(result)
+    result["embedded_chunks"] = [dict(chunk, embedding=row.tolist()) for chunk, row in zip(chunks, embeddings)]
+    return result
+
+
 @router.get("/history/{embedding_id}")
-async def get_embedding_detail(embedding_id: str):
-    """获取指定嵌入记录的详细信息"""
+async def get_embedding_detail(embedding_id: str, include_vectors: bool = False):
+    """获取指定嵌入记录的详细信息
+
+    Args:
+        embedding_id: 嵌入ID
+        include_vectors: 是否在返回结果中附带向量（默认只返回清单）
+    """
     try:
-        result = load_result("embedding", embedding_id)
+        result = await run_in_stage("io", load_result, "embedding", embedding_id)
         if not result:
             raise HTTPException(status_code=404, detail=f"未找到embedding_id: {embedding_id}的记录")
+        if include_vectors and result.get("vector_file"):
+            result = await run_in_stage("io", _with_vectors, result)
         return result
     except HTTPException:
         raise
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import os
+from typing import Optional
 from backend.services.filtering_service import FilteringService
-from backend.utils.storage import list_results, load_result
+from backend.utils.storage import list_history, load_result
+from backend.utils.executor import run_in_stage
 
 router = APIRouter()
 
@@ -16,7 +17,9 @@ class FilterRequest(BaseModel):
 async def filter_and_sort(request: FilterRequest):
     """过滤和排序搜索结果"""
     try:
-        result = FilteringService.filter_and_sort(
+        result = await run_in_stage(
+            "io",
+            FilteringService.filter_and_sort,
             request.search_results,
             request.min_score,
             request.max_score,
@@ -27,35 +30,13 @@ async def filter_and_sort(request: FilterRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/history")
-async def get_filtering_history():
-    """获取历史过滤记录列表"""
+async def get_filtering_history(limit: Optional[int] = None, offset: int = 0, order: str = "desc"):
+    """获取历史过滤记录列表（从结果目录查询，支持分页和按创建时间排序）"""
     try:
-        results = list_results("filtering")
-        history = []
-        
-        for item in results:
-            filter_id = item["file_id"]
-            result_data = load_result("filtering", filter_id)
-            
-            if result_data:
-                file_path = item["file_path"]
-                file_mtime = os.path.getmtime(file_path) if os.path.exists(file_path) else 0
-                
-                history.append({
-                    "filter_id": result_data.get("filter_id", filter_id),
-                    "total_results": result_data.get("total_results", 0),
-                    "filtered_count": result_data.get("filtered_count", 0),
-                    "min_score": result_data.get("min_score", 0),
-                    "max_score": result_data.get("max_score", 1),
-                    "created_at": file_mtime,
-                    "status": result_data.get("status", "unknown")
-                })
-        
-        history.sort(key=lambda x: x["created_at"], reverse=True)
-        
+        result = await run_in_stage("io", list_history, "filtering", limit, offset, order)
         return {
-            "total": len(history),
-            "history": history
+            "total": result["total"],
+            "history": result["history"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -64,7 +45,7 @@ async def get_filtering_history():
 async def get_filtering_detail(filter_id: str):
     """获取指定过滤记录的详细信息"""
     try:
-        result = load_result("filtering", filter_id)
+        result = await run_in_stage("io", load_result, "filtering", filter_id)
         if not result:
             raise HTTPException(status_code=404, detail=f"未找到filter_id: {filter_id}的记录")
         return result
@@ -1,9 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 from typing import List, Optional
-import os
 from backend.services.generation_service import GenerationService
-from backend.utils.storage import list_results, load_result
+from backend.utils.storage import list_history, load_result
+from backend.utils.executor import run_in_stage
 
 router = APIRouter()
 generation_service = GenerationService()
@@ -23,7 +23,9 @@ async def generate_text(request: GenerateRequest):
     try:
         if request.filter_id:
             # 从过滤结果生成
-            result = generation_service.generate_from_filtered_results(
+            result = await run_in_stage(
+                "io",
+                generation_service.generate_from_filtered_results,
                 request.filter_id,
                 request.query,
                 request.max_context_docs,
@@ -31,7 +33,9 @@ async def generate_text(request: GenerateRequest):
             )
         elif request.context_documents:
             # 从提供的上下文生成
-            result = generation_service.generate_with_context(
+            result = await run_in_stage(
+                "io",
+                generation_service.generate_with_context,
                 request.query,
                 request.context_documents,
                 request.max_tokens
@@ -44,33 +48,13 @@ async def generate_text(request: GenerateRequest):
 
 
 @router.get("/history")
-async def get_generation_history():
-    """获取历史生成记录列表"""
+async def get_generation_history(limit: Optional[int] = None, offset: int = 0, order: str = "desc"):
+    """获取历史生成记录列表（从结果目录查询，支持分页和按创建时间排序）"""
     try:
-        results = list_results("generation")
-        history = []
-
-        for item in results:
-            generation_id = item["file_id"]
-            result_data = load_result("generation", generation_id)
-
-            if result_data:
-                file_path = item["file_path"]
-                file_mtime = os.path.getmtime(file_path) if os.path.exists(file_path) else 0
-
-                history.append({
-                    "generation_id": result_data.get("generation_id", generation_id),
-                    "query": result_data.get("query", ""),
-                    "filter_id": result_data.get("filter_id", ""),
-                    "created_at": file_mtime,
-                    "status": result_data.get("status", "unknown")
-                })
-
-        history.sort(key=lambda x: x["created_at"], reverse=True)
-
+        result = await run_in_stage("io", list_history, "generation", limit, offset, order)
         return {
-            "total": len(history),
-            "history": history
+            "total": result["total"],
+            "history": result["history"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -80,7 +64,7 @@ async def get_generation_history():
 async def get_generation_detail(generation_id: str):
     """获取指定生成记录的详细信息"""
     try:
-        result = load_result("generation", generation_id)
+        result = await run_in_stage("io", load_result, "generation", generation_id)
         if not result:
             raise HTTPException(status_code=404, detail=f"未找到generation_id: {generation_id}的记录")
         return result
@@ -1,33 +1,60 @@
-import os
+import asyncio
+import time
 
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Response
 from pydantic import BaseModel
+from typing import Any, Dict, List, Optional
 
 from backend.services.embedding_service import EmbeddingService
 from backend.services.indexing_service import IndexingService
-from backend.utils.storage import list_results, load_result
+from backend.services.query_batcher import get_query_batcher, QueryQueueFullError
+from backend.services.search_cache import search_cache_key, cache_search_result, search_result_cache
+from backend.utils.storage import list_history, load_result
+from backend.utils.executor import run_in_stage
+from backend.utils.config import SEARCH_BATCH_MAX_QUERIES
 
 router = APIRouter()
 indexing_service = IndexingService()
-embedding_service = EmbeddingService()
 
 
 class IndexRequest(BaseModel):
     embedding_id: str
     collection_name: str
+    document_key: Optional[str] = None  # 文档标识（同一标识再次索引时按新版本增量更新），默认为来源文件名
 
 
 class SearchRequest(BaseModel):
     collection_name: str
     query_text: str
     n_results: int = 5
+    model: Optional[str] = None  # 集合未记录embedding模型时使用，默认为LOCAL_EMBEDDING_MODEL
+    mode: str = "vector"  # vector, lexical（BM25，不调用模型）, hybrid（RRF融合）
+    # 元数据过滤条件（Chroma的where语法），例如 {"file_id": {"$in": [...]}, "page_start": {"$gte": 3}}
+    where: Optional[Dict[str, Any]] = None
+
+
+class BatchSearchQuery(BaseModel):
+    query_text: str
+    collection_name: Optional[str] = None  # 不指定时使用请求级别的collection_name
+
+
+class BatchSearchRequest(BaseModel):
+    queries: List[BatchSearchQuery]
+    collection_name: Optional[str] = None
+    n_results: int = 5
+    model: Optional[str] = None  # 集合未记录embedding模型时使用，默认为LOCAL_EMBEDDING_MODEL
+    mode: str = "vector"  # vector, lexical（BM25，不调用模型）, hybrid（RRF融合）
+    # 元数据过滤条件（Chroma的where语法），例如 {"file_id": {"$in": [...]}, "page_start": {"$gte": 3}}
+    where: Optional[Dict[str, Any]] = None
 
 
 @router.post("/create-collection")
-async def create_collection(collection_name: str, embedding_dim: int = 768):
-    """创建集合"""
+async def create_collection(collection_name: str, embedding_dim: int = 768, model: Optional[str] = None):
+    """创建集合（可指定集合使用的embedding模型）"""
     try:
-        result = indexing_service.create_collection(collection_name, embedding_dim)
+        result = await run_in_stage(
+            "io", indexing_service.create_collection, collection_name, embedding_dim, model
+        )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -37,7 +64,10 @@ async def create_collection(collection_name: str, embedding_dim: int = 768):
 async def index_embeddings(request: IndexRequest):
     """索引嵌入向量"""
     try:
-        result = indexing_service.index_embeddings(request.embedding_id, request.collection_name)
+        result = await run_in_stage(
+            "io", indexing_service.index_embeddings, request.embedding_id, request.collection_name,
+            request.document_key
+        )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -45,17 +75,129 @@ async def index_embeddings(request: IndexRequest):
 
 @router.post("/search")
 async def similarity_search(request: SearchRequest):
-    """相似度搜索"""
+    """相似度搜索（相同的查询在集合未变化时直接返回缓存结果）"""
     try:
-        # 先创建查询文本的嵌入向量（使用默认模型）
-        query_embedding = embedding_service.create_embeddings([request.query_text])[0]
-        result = indexing_service.similarity_search(
-            request.collection_name,
-            request.query_text,
-            query_embedding,
-            request.n_results
+        if not search_result_cache.enabled:
+            return await _similarity_search(request)
+
+        cache_key = await run_in_stage(
+            "io", search_cache_key, request.collection_name, request.query_text, request.n_results,
+            request.mode, request.where, request.model
         )
-        return result
+        body = search_result_cache.get(cache_key)
+        if body is None:
+            result = await _similarity_search(request)
+            body = await run_in_stage("io", cache_search_result, cache_key, result)
+        return Response(content=body, media_type="application/json")
+    except QueryQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+async def _similarity_search(request: SearchRequest):
+    """执行搜索（不经过缓存）"""
+    if request.mode == "lexical":
+        return await run_in_stage(
+            "io", indexing_service.similarity_search, request.collection_name,
+            request.query_text, None, request.n_results, request.mode, request.where
+        )
+    # 查询必须使用与集合相同的embedding模型（集合未记录时使用请求指定的模型或默认模型）
+    model_name = await run_in_stage("io", indexing_service.collection_model, request.collection_name)
+    if model_name and request.model and request.model != model_name:
+        raise ValueError(f"集合 {request.collection_name} 使用的embedding模型为 {model_name}，与请求的 {request.model} 不一致")
+    # 创建查询文本的嵌入向量（并发查询在短窗口内合并为一批编码）
+    query_embedding = await get_query_batcher(model_name or request.model).embed(request.query_text)
+    return await run_in_stage(
+        "io",
+        indexing_service.similarity_search,
+        request.collection_name,
+        request.query_text,
+        query_embedding,
+        request.n_results,
+        request.mode,
+        request.where
+    )
+
+
+@router.post("/search/batch")
+async def batch_similarity_search(request: BatchSearchRequest):
+    """批量相似度搜索：同一模型的查询一次编码，同一集合的查询一次检索，结果按查询顺序返回"""
+    try:
+        if len(request.queries) > SEARCH_BATCH_MAX_QUERIES:
+            raise ValueError(f"单次批量搜索最多 {SEARCH_BATCH_MAX_QUERIES} 个查询，当前为 {len(request.queries)} 个")
+
+        # 按集合分组（保留每个查询在请求中的位置）
+        groups = {}
+        for position, query in enumerate(request.queries):
+            collection_name = query.collection_name or request.collection_name
+            if not collection_name:
+                raise ValueError(f"第 {position} 个查询未指定collection_name")
+            groups.setdefault(collection_name, []).append(position)
+
+        # 确定每个集合的embedding模型，再按模型分组编码
+        collection_names = list(groups)
+        model_names = await asyncio.gather(*(
+            run_in_stage("io", indexing_service.collection_model, name) for name in collection_names
+        ))
+        model_groups = {}
+        for collection_name, model_name in zip(collection_names, model_names):
+            if model_name and request.model and request.model != model_name:
+                raise ValueError(f"集合 {collection_name} 使用的embedding模型为 {model_name}，与请求的 {request.model} 不一致")
+            model_groups.setdefault(model_name or request.model, []).extend(groups[collection_name])
+
+        embeddings = {}
+        timings = [{} for _ in request.queries]
+        # 词法检索不需要查询向量
+        for model_name, positions in (model_groups.items() if request.mode != "lexical" else []):
+            positions = sorted(set(positions))
+            started = time.perf_counter()
+            vectors = await run_in_stage(
+                "query", EmbeddingService(model_name).embed_queries,
+                [request.queries[position].query_text for position in positions]
+            )
+            # 一次前向计算的耗时平摊到该批的每个查询
+            elapsed_ms = (time.perf_counter() - started) * 1000 / len(positions)
+            for position, vector in zip(positions, vectors):
+                embeddings[position] = vector
+                timings[position]["embedding_ms"] = round(elapsed_ms, 3)
+
+        # 各集合的向量检索并发执行，每个集合只发起一次查询
+        async def search_collection(collection_name: str, positions: List[int]):
+            started = time.perf_counter()
+            results = await run_in_stage(
+                "io",
+                indexing_service.batch_similarity_search,
+                collection_name,
+                [request.queries[position].query_text for position in positions],
+                [embeddings[position] for position in positions] if embeddings else None,
+                request.n_results,
+                request.mode,
+                request.where
+            )
+            elapsed_ms = (time.perf_counter() - started) * 1000 / len(positions)
+            for position in positions:
+                timings[position]["search_ms"] = round(elapsed_ms, 3)
+            return results
+
+        started = time.perf_counter()
+        grouped_results = await asyncio.gather(*(
+            search_collection(name, positions) for name, positions in groups.items()
+        ))
+        search_ms = (time.perf_counter() - started) * 1000
+
+        ordered = [None] * len(request.queries)
+        for positions, results in zip(groups.values(), grouped_results):
+            for position, result in zip(positions, results):
+                result["timing"] = timings[position]
+                ordered[position] = result
+
+        return {
+            "total_queries": len(ordered),
+            "collections": collection_names,
+            "search_ms": round(search_ms, 3),
+            "results": ordered
+        }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -64,7 +206,7 @@ async def similarity_search(request: SearchRequest):
 async def list_collections():
     """列出所有集合"""
     try:
-        result = indexing_service.list_collections()
+        result = await run_in_stage("io", indexing_service.list_collections)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -74,41 +216,20 @@ async def list_collections():
 async def delete_collection(collection_name: str):
     """删除集合"""
     try:
-        result = indexing_service.delete_collection(collection_name)
+        result = await run_in_stage("io", indexing_service.delete_collection, collection_name)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/history")
-async def get_indexing_history():
-    """获取历史索引记录列表"""
+async def get_indexing_history(limit: Optional[int] = None, offset: int = 0, order: str = "desc"):
+    """获取历史索引记录列表（从结果目录查询，支持分页和按创建时间排序）"""
     try:
-        results = list_results("indexing")
-        history = []
-
-        for item in results:
-            index_id = item["file_id"]
-            result_data = load_result("indexing", index_id)
-
-            if result_data:
-                file_path = item["file_path"]
-                file_mtime = os.path.getmtime(file_path) if os.path.exists(file_path) else 0
-
-                history.append({
-                    "index_id": result_data.get("index_id", index_id),
-                    "embedding_id": result_data.get("embedding_id", ""),
-                    "collection_name": result_data.get("collection_name", ""),
-                    "total_documents": result_data.get("total_documents", 0),
-                    "created_at": file_mtime,
-                    "status": result_data.get("status", "unknown")
-                })
-
-        history.sort(key=lambda x: x["created_at"], reverse=True)
-
+        result = await run_in_stage("io", list_history, "indexing", limit, offset, order)
         return {
-            "total": len(history),
-            "history": history
+            "total": result["total"],
+            "history": result["history"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -118,7 +239,7 @@ async def get_indexing_history():
 async def get_indexing_detail(index_id: str):
     """获取指定索引记录的详细信息"""
     try:
-        result = load_result("indexing", index_id)
+        result = await run_in_stage("io", load_result, "indexing", index_id)
         if not result:
             raise HTTPException(status_code=404, detail=f"未找到index_id: {index_id}的记录")
         return result
@@ -0,0 +1,99 @@
+from fastapi import APIRouter, UploadFile, File, Form, HTTPException
+from pydantic import BaseModel
+from typing import Optional
+from backend.routers.loading import get_default_method_by_extension
+from backend.services.job_service import JobService
+from backend.utils.executor import run_in_stage
+from backend.utils.upload import save_upload_file, UploadTooLargeError
+
+router = APIRouter()
+
+
+class JobRequest(BaseModel):
+    # 从文件开始，或从已有的某个阶段结果继续（例如只传chunk_id表示仅执行嵌入和索引）
+    file_path: Optional[str] = None
+    file_id: Optional[str] = None
+    chunk_id: Optional[str] = None
+    embedding_id: Optional[str] = None
+    method: str = "pymupdf"  # pymupdf, pypdf, unstructured
+    streaming: bool = False  # 流式加载（超大文档）
+    chunking_strategy: str = "by_size"  # by_size, by_sentence, by_paragraph
+    chunk_size: int = 1000
+    overlap: int = 200
+    embedding_model: Optional[str] = None  # 默认为LOCAL_EMBEDDING_MODEL
+    collection_name: Optional[str] = None  # 不指定时不执行索引阶段
+    document_key: Optional[str] = None  # 文档标识（同一标识再次摄取时按新版本增量更新）
+
+
+@router.post("/upload")
+async def submit_upload_job(file: UploadFile = File(...),
+                            method: Optional[str] = Form(None),
+                            streaming: bool = Form(False),
+                            chunking_strategy: str = Form("by_size"),
+                            chunk_size: int = Form(1000),
+                            overlap: int = Form(200),
+                            embedding_model: Optional[str] = Form(None),
+                            collection_name: Optional[str] = Form(None),
+                            document_key: Optional[str] = Form(None)):
+    """上传文件并提交摄取任务，立即返回job_id"""
+    try:
+        if method is None:
+            method = get_default_method_by_extension(file.filename)
+        file_path, content_hash = await save_upload_file(file)
+        job = await run_in_stage("io", JobService.submit_job, {
+            "file_path": file_path,
+            "content_hash": content_hash,
+            "source_name": file.filename,
+            "method": method,
+            "streaming": streaming,
+            "chunking_strategy": chunking_strategy,
+            "chunk_size": chunk_size,
+            "overlap": overlap,
+            "embedding_model": embedding_model,
+            "collection_name": collection_name,
+            "document_key": document_key
+        })
+        return job
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("")
+async def submit_job(request: JobRequest):
+    """提交摄取任务（加载→分块→嵌入→索引），立即返回job_id"""
+    try:
+        params = request.dict(exclude={"file_id", "chunk_id", "embedding_id"})
+        artifacts = {
+            "file_id": request.file_id,
+            "chunk_id": request.chunk_id,
+            "embedding_id": request.embedding_id
+        }
+        job = await run_in_stage("io", JobService.submit_job, params, artifacts)
+        return job
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("")
+async def list_jobs(status: Optional[str] = None, limit: int = 50, offset: int = 0):
+    """列出任务（可按状态过滤：queued, running, succeeded, failed）"""
+    try:
+        return await run_in_stage("io", JobService.list_jobs, status, limit, offset)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str):
+    """查询任务状态、进度、当前阶段和各阶段耗时"""
+    try:
+        job = await run_in_stage("io", JobService.get_job, job_id)
+        if not job:
+            raise HTTPException(status_code=404, detail=f"未找到job_id: {job_id}的任务")
+        return job
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
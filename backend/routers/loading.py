@@ -2,10 +2,10 @@ from fastapi import APIRouter, UploadFile, File, HTTPException
 from pydantic import BaseModel
 from typing import Optional, List
 import os
-import uuid
-from pathlib import Path
 from backend.services.loading_service import LoadingService
-from backend.utils.storage import list_results, load_result
+from backend.utils.storage import list_history, load_result
+from backend.utils.executor import run_in_stage
+from backend.utils.upload import save_upload_file, UploadTooLargeError
 
 router = APIRouter()
 
@@ -28,10 +28,12 @@ def get_default_method_by_extension(filename: str) -> str:
 class LoadFileRequest(BaseModel):
     file_path: Optional[str] = None
     method: str = "pymupdf"  # pymupdf, pypdf, unstructured
+    streaming: bool = False  # 流式加载（超大文档），结果写入JSONL，只返回统计信息和预览
 
 
 @router.post("/upload")
-async def upload_file(file: UploadFile = File(...), method: Optional[str] = None):
+async def upload_file(file: UploadFile = File(...), method: Optional[str] = None,
+                      streaming: bool = False):
     """上传并加载文件
     
     Args:
@@ -39,32 +41,24 @@ async def upload_file(file: UploadFile = File(...), method: Optional[str] = None
         method: 加载方法，可选。如果不指定，会根据文件扩展名自动选择：
             - PDF文件 -> "pymupdf"（默认）
             - DOCX/DOC/TXT/HTML/PPTX/XLSX等 -> "unstructured"（默认）
+        streaming: 是否流式加载（超大文档），结果写入JSONL，只返回统计信息和预览
     """
     try:
         # 如果没有指定method，根据文件扩展名自动选择
         if method is None:
             method = get_default_method_by_extension(file.filename)
 
-        # 创建上传文件保存目录
-        backend_dir = Path(__file__).parent.parent
-        upload_dir = os.path.join(str(backend_dir), "data", "upload")
-        os.makedirs(upload_dir, exist_ok=True)
-
-        # 生成唯一文件名：UUID + 原文件扩展名
-        file_ext = os.path.splitext(file.filename)[1] if file.filename else ""
-        file_id = str(uuid.uuid4())
-        saved_filename = f"{file_id}{file_ext}"
-        file_path = os.path.join(upload_dir, saved_filename)
-
         # 保存上传的文件到项目目录
-        content = await file.read()
-        with open(file_path, "wb") as f:
-            f.write(content)
+        file_path, content_hash = await save_upload_file(file)
 
-        # 加载文件
-        result = LoadingService.load_file(str(file_path), method)
+        # 加载文件（相同内容、相同加载方法的结果会直接复用）
+        result = await run_in_stage(
+            "cpu", LoadingService.load_file, file_path, method, content_hash, streaming, file.filename
+        )
 
         return result
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -75,45 +69,23 @@ async def load_file(request: LoadFileRequest):
     try:
         if not request.file_path:
             raise ValueError("file_path不能为空")
-        result = LoadingService.load_file(request.file_path, request.method)
+        result = await run_in_stage(
+            "cpu", LoadingService.load_file, request.file_path, request.method,
+            streaming=request.streaming
+        )
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/history")
-async def get_loading_history():
-    """获取历史加载记录列表"""
+async def get_loading_history(limit: Optional[int] = None, offset: int = 0, order: str = "desc"):
+    """获取历史加载记录列表（从结果目录查询，支持分页和按创建时间排序）"""
     try:
-        results = list_results("loading")
-        history = []
-
-        for item in results:
-            file_id = item["file_id"]
-            result_data = load_result("loading", file_id)
-
-            if result_data:
-                # 获取文件修改时间
-                file_path = item["file_path"]
-                file_mtime = os.path.getmtime(file_path) if os.path.exists(file_path) else 0
-
-                history.append({
-                    "file_id": file_id,
-                    "file_name": result_data.get("file_name", ""),
-                    "file_path": result_data.get("file_path", ""),
-                    "loading_method": result_data.get("loading_method", ""),
-                    "total_pages": result_data.get("result", {}).get("total_pages", 0),
-                    "total_chunks": result_data.get("result", {}).get("total_chunks", 0),
-                    "created_at": file_mtime,
-                    "status": result_data.get("status", "unknown")
-                })
-
-        # 按创建时间倒序排列（最新的在前）
-        history.sort(key=lambda x: x["created_at"], reverse=True)
-
+        result = await run_in_stage("io", list_history, "loading", limit, offset, order)
         return {
-            "total": len(history),
-            "history": history
+            "total": result["total"],
+            "history": result["history"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -123,7 +95,7 @@ async def get_loading_history():
 async def get_loading_detail(file_id: str):
     """获取指定加载记录的详细信息"""
     try:
-        result = load_result("loading", file_id)
+        result = await run_in_stage("io", load_result, "loading", file_id)
         if not result:
             raise HTTPException(status_code=404, detail=f"未找到file_id: {file_id}的记录")
         return result
@@ -1,8 +1,9 @@
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-import os
+from typing import Optional
 from backend.services.parsing_service import ParsingService
-from backend.utils.storage import list_results, load_result
+from backend.utils.storage import list_history, load_result
+from backend.utils.executor import run_in_stage
 
 router = APIRouter()
 
@@ -17,48 +18,29 @@ async def parse_document(request: ParseRequest):
     """解析文档"""
     try:
         if request.parse_type == "full_text":
-            result = ParsingService.parse_full_text(request.file_id)
+            parse_func = ParsingService.parse_full_text
         elif request.parse_type == "by_page":
-            result = ParsingService.parse_by_page(request.file_id)
+            parse_func = ParsingService.parse_by_page
         elif request.parse_type == "by_title":
-            result = ParsingService.parse_by_title(request.file_id)
+            parse_func = ParsingService.parse_by_title
         elif request.parse_type == "mixed":
-            result = ParsingService.parse_mixed_tables_text(request.file_id)
+            parse_func = ParsingService.parse_mixed_tables_text
         else:
             raise ValueError(f"不支持的解析类型: {request.parse_type}")
+        result = await run_in_stage("cpu", parse_func, request.file_id)
         return result
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
 @router.get("/history")
-async def get_parsing_history():
-    """获取历史解析记录列表"""
+async def get_parsing_history(limit: Optional[int] = None, offset: int = 0, order: str = "desc"):
+    """获取历史解析记录列表（从结果目录查询，支持分页和按创建时间排序）"""
     try:
-        results = list_results("parsing")
-        history = []
-
-        for item in results:
-            parse_id = item["file_id"]
-            result_data = load_result("parsing", parse_id)
-
-            if result_data:
-                file_path = item["file_path"]
-                file_mtime = os.path.getmtime(file_path) if os.path.exists(file_path) else 0
-
-                history.append({
-                    "parse_id": result_data.get("parse_id", parse_id),
-                    "file_id": result_data.get("file_id", ""),
-                    "parse_type": result_data.get("parse_type", ""),
-                    "created_at": file_mtime,
-                    "status": result_data.get("status", "unknown")
-                })
-
-        history.sort(key=lambda x: x["created_at"], reverse=True)
-
+        result = await run_in_stage("io", list_history, "parsing", limit, offset, order)
         return {
-            "total": len(history),
-            "history": history
+            "total": result["total"],
+            "history": result["history"]
         }
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -68,7 +50,7 @@ async def get_parsing_history():
 async def get_parsing_detail(parse_id: str):
     """获取指定解析记录的详细信息"""
     try:
-        result = load_result("parsing", parse_id)
+        result = await run_in_stage("io", load_result, "parsing", parse_id)
         if not result:
             raise HTTPException(status_code=404, detail=f"未找到parse_id: {parse_id}的记录")
         return result
@@ -0,0 +1,37 @@
+from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from backend.services.embedding_service import EmbeddingService
+from backend.services.model_registry import model_registry
+from backend.services.query_batcher import query_batcher_stats
+from backend.services.search_cache import search_cache_stats
+from backend.utils.executor import executor_stats
+from backend.utils.startup import readiness, startup_report
+from backend.utils.storage import result_cache_stats
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+async def get_metrics():
+    """运行状态指标：结果缓存与搜索缓存命中情况、各阶段执行器配置、embedding模型注册表与编码进程池、查询批处理"""
+    return {
+        "result_cache": result_cache_stats(),
+        "search_cache": search_cache_stats(),
+        "executors": executor_stats(),
+        "embedding_models": model_registry.stats(),
+        "embedding_pool": [service.pool_stats() for service in EmbeddingService.instances()],
+        "query_batcher": query_batcher_stats()
+    }
+
+
+@router.get("/ready")
+async def get_readiness():
+    """就绪检查：后台预热（embedding模型、向量数据库）全部完成前返回503"""
+    result = readiness()
+    return JSONResponse(status_code=200 if result["ready"] else 503, content=result)
+
+
+@router.get("/startup")
+async def get_startup_report():
+    """启动耗时报告：各模块首次导入耗时与预热组件状态"""
+    return startup_report()
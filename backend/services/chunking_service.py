@@ -1,6 +1,7 @@
 import uuid
 from typing import List, Dict, Optional
-from backend.utils.storage import save_result, load_result
+from backend.services.document_text_service import DocumentTextService
+from backend.utils.storage import save_result, load_result, find_result_by_content
 
 
 class ChunkingService:
@@ -102,23 +103,26 @@ class ChunkingService:
             overlap: 重叠大小（用于by_size策略）
         
         Returns:
-            包含分块结果的字典
+            包含分块结果的字典；同一文件、相同策略和参数的分块直接返回已有结果（cached为True）
         """
-        # 从加载结果中获取文档内容
-        loading_result = load_result("loading", file_id)
-        if not loading_result:
-            raise ValueError(f"未找到文件ID: {file_id} 的加载结果")
-
-        # 提取文本内容
-        text_content = ""
-        if loading_result["result"]["method"] in ["pymupdf", "pypdf"]:
-            # 合并所有页面的文本
-            for page in loading_result["result"]["pages"]:
-                text_content += page["text"] + "\n"
-        elif loading_result["result"]["method"] == "unstructured":
-            # 合并所有chunks的文本
-            for chunk in loading_result["result"]["chunks"]:
-                text_content += chunk["text"] + "\n"
+        content_key = f"{file_id}:{chunking_strategy}:{chunk_size}:{overlap}"
+        cached_id = find_result_by_content("chunking", content_key)
+        if cached_id:
+            cached = load_result("chunking", cached_id)
+            if cached:
+                return {
+                    "chunk_id": cached_id,
+                    "file_id": file_id,
+                    "strategy": chunking_strategy,
+                    "total_chunks": cached["total_chunks"],
+                    "status": "success",
+                    "cached": True,
+                    "chunks": cached["chunks"][:10]
+                }
+
+        # 获取文档全文（每个file_id只构建一次，多种分块配置共用）
+        document = DocumentTextService.get_document_text(file_id)
+        text_content = document["text"]
 
         # 根据策略进行分块
         if chunking_strategy == "by_size":
@@ -130,19 +134,26 @@ class ChunkingService:
         else:
             raise ValueError(f"不支持的分块策略: {chunking_strategy}")
 
+        # 根据页面偏移表标注每个chunk覆盖的页码范围
+        for chunk in chunks:
+            chunk["page_start"], chunk["page_end"] = DocumentTextService.page_range(
+                document, chunk["start"], chunk["end"]
+            )
+
         # 保存结果
         chunk_id = str(uuid.uuid4())
         result_data = {
             "chunk_id": chunk_id,
             "file_id": file_id,
-            "original_file": loading_result["file_name"],
+            "original_file": document["file_name"],
             "chunking_strategy": chunking_strategy,
             "total_chunks": len(chunks),
             "chunks": chunks,
             "parameters": {
                 "chunk_size": chunk_size,
                 "overlap": overlap
-            }
+            },
+            "content_key": content_key
         }
 
         save_result("chunking", chunk_id, result_data)
@@ -153,5 +164,6 @@ class ChunkingService:
             "strategy": chunking_strategy,
             "total_chunks": len(chunks),
             "status": "success",
+            "cached": False,
             "chunks": chunks[:10]  # 只返回前10个chunks作为预览
         }
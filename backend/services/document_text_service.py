@@ -0,0 +1,113 @@
+import bisect
+import json
+import os
+from functools import lru_cache
+from typing import Dict, Tuple
+
+from backend.services.loading_service import LoadingService
+from backend.utils.config import DATA_DIR, DOCUMENT_TEXT_CACHE_SIZE
+from backend.utils.storage import load_result
+
+DOCUMENT_TEXT_DIR = os.path.join(DATA_DIR, "document_text")
+
+
+def _cache_paths(file_id: str) -> Tuple[str, str]:
+    return (
+        os.path.join(DOCUMENT_TEXT_DIR, f"{file_id}.txt"),
+        os.path.join(DOCUMENT_TEXT_DIR, f"{file_id}.json")
+    )
+
+
+def _write_atomic(file_path: str, content: str):
+    temp_path = f"{file_path}.tmp"
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+        os.replace(temp_path, file_path)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+
+def _build_document_text(file_id: str) -> Dict:
+    """从加载结果构建文档全文和页面偏移表，并写入磁盘缓存"""
+    loading_result = load_result("loading", file_id)
+    if not loading_result:
+        raise ValueError(f"未找到文件ID: {file_id} 的加载结果")
+
+    parts = []
+    unit_starts = []
+    page_numbers = []
+    position = 0
+    for index, unit in enumerate(LoadingService.iter_document_units(loading_result)):
+        # 与原来的拼接方式一致：每个页面/元素的文本后追加一个换行
+        part = unit["text"] + "\n"
+        unit_starts.append(position)
+        page_numbers.append(
+            unit.get("page_number") or unit.get("metadata", {}).get("page_number") or index + 1
+        )
+        parts.append(part)
+        position += len(part)
+    text = "".join(parts)
+
+    meta = {
+        "file_id": file_id,
+        "file_name": loading_result["file_name"],
+        "method": loading_result["result"]["method"],
+        "length": len(text),
+        "unit_starts": unit_starts,
+        "page_numbers": page_numbers
+    }
+
+    os.makedirs(DOCUMENT_TEXT_DIR, exist_ok=True)
+    text_path, meta_path = _cache_paths(file_id)
+    # 先写文本再写元数据，元数据存在即表示缓存完整
+    _write_atomic(text_path, text)
+    _write_atomic(meta_path, json.dumps(meta, ensure_ascii=False))
+
+    return dict(meta, text=text)
+
+
+@lru_cache(maxsize=DOCUMENT_TEXT_CACHE_SIZE)
+def _get_document_text(file_id: str) -> Dict:
+    text_path, meta_path = _cache_paths(file_id)
+    if os.path.exists(meta_path) and os.path.exists(text_path):
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        with open(text_path, "r", encoding="utf-8") as f:
+            text = f.read()
+        if len(text) == meta["length"]:
+            return dict(meta, text=text)
+    return _build_document_text(file_id)
+
+
+class DocumentTextService:
+    """文档全文访问服务
+
+    加载结果按file_id不可变，因此合并后的全文和页面偏移表对每个file_id只构建一次，
+    缓存在 data/document_text/ 下并在进程内做LRU缓存，分块和解析的各种策略共用。
+    """
+
+    @staticmethod
+    def get_document_text(file_id: str) -> Dict:
+        """获取文档全文
+
+        Returns:
+            {"file_id", "file_name", "method", "length", "text",
+             "unit_starts": 每个页面/元素在全文中的起始偏移,
+             "page_numbers": 每个页面/元素对应的页码}
+            返回的字典在多个调用方之间共享，不要修改。
+        """
+        return _get_document_text(file_id)
+
+    @staticmethod
+    def page_range(document: Dict, start: int, end: int) -> Tuple[int, int]:
+        """根据全文中的字符区间 [start, end) 计算覆盖的起止页码"""
+        unit_starts = document["unit_starts"]
+        page_numbers = document["page_numbers"]
+        if not unit_starts:
+            return 0, 0
+        first = max(bisect.bisect_right(unit_starts, start) - 1, 0)
+        last = max(bisect.bisect_right(unit_starts, max(end - 1, start)) - 1, 0)
+        return page_numbers[first], page_numbers[last]
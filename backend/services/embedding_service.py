@@ -1,162 +1,743 @@
+import json
+import math
+import os
+import re
+import threading
+import time
 import uuid
-from typing import List, Dict
+from itertools import islice
+from typing import TYPE_CHECKING, Iterator, List, Dict, Optional, Tuple
 
-from openai import AzureOpenAI
-# 导入本地embedding库
-from sentence_transformers import SentenceTransformer
+import numpy as np
 
 from backend.utils.config import (
     AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT,
     AZURE_OPENAI_API_VERSION,
-    LOCAL_EMBEDDING_MODEL
+    LOCAL_EMBEDDING_MODEL, EMBEDDING_CACHE_ENABLED, DATA_DIR,
+    EMBEDDING_BACKEND, EMBEDDING_ONNX_QUANTIZATION, VECTOR_STORAGE_PRECISION,
+    EMBEDDING_BATCH_SIZE, EMBEDDING_MAX_SEQ_LENGTH,
+    EMBEDDING_POOL_WORKERS, EMBEDDING_POOL_MIN_TEXTS, EMBEDDING_POOL_IDLE_SECONDS,
+    EMBEDDING_ALLOWED_MODELS, EMBEDDING_STREAM_BATCH_SIZE
 )
-from backend.utils.storage import save_result, load_result
+from backend.services.model_registry import model_registry
+from backend.utils import embedding_cache
+from backend.utils.embedding_cache import text_hash
+from backend.utils.storage import (
+    save_result, load_result, find_result_by_content, iter_result_stream, stream_file_name,
+    load_result_header, iter_result_items, result_lock
+)
+from backend.utils.startup import timed_import
+from backend.utils.vector_store import save_vectors, vector_file_name, scales_file_name, VectorStreamWriter
+
+if TYPE_CHECKING:
+    from sentence_transformers import SentenceTransformer
+
+EMBEDDING_BACKENDS = ("torch", "onnx", "onnx-int8")
+# 本地导出的量化ONNX模型目录
+ONNX_MODEL_DIR = os.path.join(DATA_DIR, "onnx_models")
+# 后端一致性检查的默认样本
+PARITY_SAMPLE_TEXTS = [
+    "检索增强生成（RAG）先从知识库中检索相关文档，再交给大模型生成答案。",
+    "文档分块的大小和重叠长度会影响检索的召回率。",
+    "向量数据库通过近似最近邻搜索快速找到语义相似的文本。",
+    "The quick brown fox jumps over the lazy dog.",
+    "Sentence embeddings map text to dense vectors for semantic search.",
+    "ONNX Runtime can run quantized transformer models efficiently on CPU.",
+]
+
+
+def embedding_model_key(model_name: str = LOCAL_EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND,
+                        max_seq_length: int = EMBEDDING_MAX_SEQ_LENGTH) -> str:
+    """模型标识，用于embedding缓存和结果复用
+
+    截断长度不同时同一文本的向量也不同，因此配置了 max_seq_length 时一并计入标识；
+    torch后端且使用模型默认长度时保持原模型名，兼容已有缓存。
+    """
+    key = model_name if backend == "torch" else f"{model_name}@{backend}"
+    return f"{key}#seq{max_seq_length}" if max_seq_length > 0 else key
+
+
+def load_local_model(model_name: str = LOCAL_EMBEDDING_MODEL, backend: str = EMBEDDING_BACKEND) -> "SentenceTransformer":
+    """按推理后端加载本地embedding模型
+
+    onnx-int8 优先加载模型仓库中已有的量化文件，不存在时先导出ONNX模型，
+    再做动态int8量化，保存到 ONNX_MODEL_DIR 供下次直接加载。
+    """
+    # sentence-transformers（及torch）导入耗时较长，只在真正加载模型时导入
+    SentenceTransformer = timed_import("sentence_transformers").SentenceTransformer
+    if backend == "torch":
+        return SentenceTransformer(model_name)
+    if backend == "onnx":
+        return SentenceTransformer(model_name, backend="onnx")
+    if backend != "onnx-int8":
+        raise ValueError(f"不支持的embedding推理后端: {backend}，可选: {', '.join(EMBEDDING_BACKENDS)}")
+
+    file_name = f"onnx/model_qint8_{EMBEDDING_ONNX_QUANTIZATION}.onnx"
+    export_dir = os.path.join(ONNX_MODEL_DIR, re.sub(r"[^0-9A-Za-z._-]+", "_", model_name))
+    if os.path.exists(os.path.join(export_dir, file_name)):
+        return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
+    try:
+        return SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": file_name})
+    except Exception:
+        pass
+
+    from sentence_transformers import export_dynamic_quantized_onnx_model
+    model = SentenceTransformer(model_name, backend="onnx")
+    model.save(export_dir)
+    export_dynamic_quantized_onnx_model(
+        model, EMBEDDING_ONNX_QUANTIZATION, export_dir, file_suffix=f"qint8_{EMBEDDING_ONNX_QUANTIZATION}"
+    )
+    print(f"✓ 已导出int8量化ONNX模型: {os.path.join(export_dir, file_name)}")
+    return SentenceTransformer(export_dir, backend="onnx", model_kwargs={"file_name": file_name})
+
+
+def resolve_model_name(model_name: Optional[str] = None) -> str:
+    """校验并返回embedding模型名称（未指定时使用默认模型）"""
+    model_name = (model_name or "").strip() or LOCAL_EMBEDDING_MODEL
+    allowed = [LOCAL_EMBEDDING_MODEL] + EMBEDDING_ALLOWED_MODELS
+    if model_name not in allowed:
+        raise ValueError(f"不支持的embedding模型: {model_name}，可选: {', '.join(allowed)}")
+    return model_name
 
 
 class EmbeddingService:
-    _instance = None
-    _initialized = False
+    """本地embedding服务，每个（模型, 推理后端）对应一个实例
+
+    模型本身由 model_registry 管理：首次使用时加载，在内存预算内按LRU淘汰，
+    被淘汰的模型下次使用时重新加载。
+    """
+    _instances = {}
+    _instance_lock = threading.Lock()
 
-    def __new__(cls):
-        """单例模式：确保整个应用只有一个实例"""
-        if cls._instance is None:
-            cls._instance = super(EmbeddingService, cls).__new__(cls)
-        return cls._instance
+    def __new__(cls, model_name: Optional[str] = None, backend: Optional[str] = None):
+        """每个（模型, 推理后端）只创建一个实例"""
+        model_key = embedding_model_key(resolve_model_name(model_name), backend or EMBEDDING_BACKEND)
+        instance = cls._instances.get(model_key)
+        if instance is None:
+            with cls._instance_lock:
+                instance = cls._instances.get(model_key)
+                if instance is None:
+                    instance = super(EmbeddingService, cls).__new__(cls)
+                    instance._initialized = False
+                    cls._instances[model_key] = instance
+        return instance
 
-    def __init__(self):
+    def __init__(self, model_name: Optional[str] = None, backend: Optional[str] = None):
         # 如果已经初始化过，直接返回
-        if EmbeddingService._initialized:
+        if self._initialized:
             return
-        
-        EmbeddingService._initialized = True
-        self.client = None
-        self.local_model = None
-        
 
+        with EmbeddingService._instance_lock:
+            if self._initialized:
+                return
+            # 模型和Azure OpenAI客户端都在首次使用（或后台预热）时才加载，不阻塞服务启动
+            self._client = None
+            self._client_created = False
+            self.model_name = resolve_model_name(model_name)
+            self.backend = backend or EMBEDDING_BACKEND
+            self.model_key = embedding_model_key(self.model_name, self.backend)
+            # 多进程编码池（按需启动，空闲超时后关闭）
+            self._pool = None
+            self._pool_model = None
+            self._pool_lock = threading.Lock()
+            self._pool_timer = None
+            self._initialized = True
+
+    @classmethod
+    def instances(cls) -> List["EmbeddingService"]:
+        """已创建的全部实例"""
+        return list(cls._instances.values())
+
+    @property
+    def local_model(self):
+        """本地embedding模型（由注册表按需加载；加载失败时抛出异常）"""
+        return self.load_model()
+
+    @property
+    def model_loaded(self) -> bool:
+        return model_registry.is_loaded(self.model_key)
+
+    def load_model(self):
+        """从注册表获取模型，未加载时加载（供后台预热和请求调用），加载失败时抛出异常"""
+        return model_registry.get(self.model_key, self._load)
+
+    def _load(self):
         try:
-            local_model_name = LOCAL_EMBEDDING_MODEL
-            self.local_model = SentenceTransformer(local_model_name)
-            print(f"✓ 已加载本地embedding模型: {local_model_name}")
+            model = load_local_model(self.model_name, self.backend)
+            if EMBEDDING_MAX_SEQ_LENGTH > 0:
+                model.max_seq_length = EMBEDDING_MAX_SEQ_LENGTH
         except Exception as e:
             print(f"警告: 本地embedding模型加载失败: {e}")
-            self.local_model = None
             print("错误: 已启用本地模型但加载失败，请检查sentence-transformers是否正确安装")
-        
-        # 初始化Azure OpenAI客户端（作为备选）
-        if AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
+            raise
+        print(f"✓ 已加载本地embedding模型: {self.model_name}（推理后端: {self.backend}）")
+        return model
+
+    @property
+    def client(self):
+        """Azure OpenAI客户端（作为备选，首次访问时创建）"""
+        if not self._client_created and AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
             try:
-                self.client = AzureOpenAI(
+                self._client = timed_import("openai").AzureOpenAI(
                     api_key=AZURE_OPENAI_API_KEY,
                     api_version=AZURE_OPENAI_API_VERSION,
                     azure_endpoint=AZURE_OPENAI_ENDPOINT
                 )
             except Exception as e:
                 print(f"警告: Azure OpenAI客户端初始化失败: {e}")
+        self._client_created = True
+        return self._client
 
-    def create_embeddings(self, texts: List[str]) -> List[List[float]]:
+    def create_embeddings(self, texts: List[str]) -> np.ndarray:
         """创建文本嵌入向量（批量处理）
         
         Args:
             texts: 文本列表
         
         Returns:
-            嵌入向量列表
+            嵌入向量矩阵 (float32, 形状为 [len(texts), dim])
+        """
+        embeddings, _ = self._encode_with_cache(texts)
+        return embeddings
+
+    def embed_queries(self, texts: List[str]) -> np.ndarray:
+        """编码查询文本（不经过持久化缓存：查询文本很少重复，逐条写入只会让缓存不断增长）
+
+        Returns:
+            嵌入向量矩阵 (float32, 形状为 [len(texts), dim])
         """
         if not texts:
-            return []
+            return np.zeros((0, 0), dtype=np.float32)
+        embeddings, _ = self._encode(texts)
+        return embeddings
+
+    def _encode_with_cache(self, texts: List[str]) -> Tuple[np.ndarray, Dict]:
+        """先查持久化缓存，只把未命中的文本交给模型，再按原顺序合并
+
+        Returns:
+            (嵌入向量矩阵, 统计信息 {"cache": 缓存命中情况, "throughput": 模型编码吞吐})
+        """
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32), {
+                "cache": {"total": 0, "hits": 0, "misses": 0, "hit_ratio": 0.0},
+                "throughput": self._throughput_stats(0, 0, 0.0, 0)
+            }
+
+        if not EMBEDDING_CACHE_ENABLED:
+            embeddings, throughput = self._encode(texts)
+            return embeddings, {
+                "cache": {"total": len(texts), "hits": 0, "misses": len(texts), "hit_ratio": 0.0},
+                "throughput": throughput
+            }
+
+        hashes = [text_hash(text) for text in texts]
+        try:
+            vectors = embedding_cache.lookup(self.model_key, hashes)
+        except Exception as e:
+            print(f"警告: embedding缓存读取失败，将全部重新计算: {e}")
+            vectors = {}
+        hits = sum(1 for hash_value in hashes if hash_value in vectors)
 
-        # 使用本地模型
-        if not self.local_model:
+        # 未命中的文本去重后再编码
+        missing = {}
+        for hash_value, text in zip(hashes, texts):
+            if hash_value not in vectors and hash_value not in missing:
+                missing[hash_value] = text
+        throughput = self._throughput_stats(0, 0, 0.0, 0)
+        if missing:
+            new_vectors, throughput = self._encode(list(missing.values()))
+            try:
+                embedding_cache.store(self.model_key, list(missing.keys()), new_vectors)
+            except Exception as e:
+                print(f"警告: embedding缓存写入失败: {e}")
+            vectors.update(zip(missing.keys(), new_vectors))
+
+        embeddings = np.stack([vectors[hash_value] for hash_value in hashes]).astype(np.float32, copy=False)
+        return embeddings, {
+            "cache": {
+                "total": len(texts),
+                "hits": hits,
+                "misses": len(texts) - hits,
+                "hit_ratio": round(hits / len(texts), 4)
+            },
+            "throughput": throughput
+        }
+
+    @staticmethod
+    def _token_lengths(texts: List[str], model) -> List[int]:
+        """每条文本的token数（截断到模型最大序列长度）；没有分词器时退化为字符数"""
+        tokenizer = getattr(model, "tokenizer", None)
+        max_length = getattr(model, "max_seq_length", None)
+        if tokenizer is None:
+            return [len(text) for text in texts]
+        encoded = tokenizer(texts, add_special_tokens=True, truncation=max_length is not None,
+                            max_length=max_length)
+        return [len(ids) for ids in encoded["input_ids"]]
+
+    @staticmethod
+    def _throughput_stats(chunks: int, tokens: int, seconds: float, batches: int) -> Dict:
+        return {
+            "chunks": chunks,
+            "tokens": tokens,
+            "batches": batches,
+            "batch_size": EMBEDDING_BATCH_SIZE,
+            "seconds": round(seconds, 4),
+            "chunks_per_second": round(chunks / seconds, 2) if seconds > 0 else 0.0,
+            "tokens_per_second": round(tokens / seconds, 2) if seconds > 0 else 0.0
+        }
+
+    def _encode(self, texts: List[str]) -> Tuple[np.ndarray, Dict]:
+        """使用本地模型编码文本
+
+        先按token长度排序，相近长度的文本分到同一批，减少padding浪费；
+        每批 EMBEDDING_BATCH_SIZE 条，编码后再恢复原顺序。
+
+        Returns:
+            (嵌入向量矩阵, 吞吐统计)
+        """
+        # 使用本地模型：整个编码过程只从注册表取一次，避免编码中途被淘汰后反复重新加载
+        try:
+            model = self.load_model()
+        except Exception as e:
             raise ValueError(
-                "本地embedding模型未加载。请检查：\n"
+                "本地embedding模型加载失败: {}。请检查：\n"
                 "1. 是否已安装sentence-transformers: pip install sentence-transformers\n"
                 "2. 模型名称是否正确（当前配置: {})\n"
-                "3. 网络连接是否正常（首次使用需要从Hugging Face下载模型）".format(LOCAL_EMBEDDING_MODEL)
-            )
+                "3. 网络连接是否正常（首次使用需要从Hugging Face下载模型）".format(e, self.model_name)
+            ) from e
 
         try:
-            # 使用 convert_to_numpy=True 确保返回 numpy 数组，然后转换为列表
+            started = time.perf_counter()
+            lengths = self._token_lengths(texts, model)
+            order = np.argsort(lengths, kind="stable")
+
+            embeddings = None
+            batches = 0
             """
-                这里的 local_model 是一个 SentenceTransformer 实例。
+                这里的 model 是一个 SentenceTransformer 实例。
                 encode 方法将文本转换为固定长度的向量，用于后续的相似度计算和检索，返回的向量用于构建向量数据库中的索引。
             """
-            embeddings = self.local_model.encode(texts, convert_to_numpy=True)
-            # 转换为 Python 列表（支持 JSON 序列化）
-            if hasattr(embeddings, 'tolist'):
-                return embeddings.tolist()
-            # 如果是列表，直接返回
-            return list(embeddings) if not isinstance(embeddings, list) else embeddings
+            if EMBEDDING_POOL_WORKERS > 1 and len(texts) >= EMBEDDING_POOL_MIN_TEXTS:
+                # 大任务：排好序的文本分片到多个进程编码，结果按分片顺序收集后写回原位置
+                sorted_embeddings = self._encode_with_pool([texts[i] for i in order], model)
+                embeddings = np.empty((len(texts), sorted_embeddings.shape[1]), dtype=np.float32)
+                embeddings[order] = sorted_embeddings
+                batches = math.ceil(len(texts) / EMBEDDING_BATCH_SIZE)
+            else:
+                for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+                    batch_indices = order[start:start + EMBEDDING_BATCH_SIZE]
+                    # 使用 convert_to_numpy=True 确保返回 numpy 数组
+                    batch_embeddings = model.encode(
+                        [texts[i] for i in batch_indices],
+                        batch_size=len(batch_indices),
+                        convert_to_numpy=True
+                    )
+                    if embeddings is None:
+                        embeddings = np.empty((len(texts), batch_embeddings.shape[1]), dtype=np.float32)
+                    # 写回原位置，恢复输入顺序
+                    embeddings[batch_indices] = batch_embeddings
+                    batches += 1
+
+            elapsed = time.perf_counter() - started
+            # 保持为 float32 矩阵，由 vector_store 以二进制形式落盘，避免 JSON 浮点文本
+            return embeddings, self._throughput_stats(len(texts), int(sum(lengths)), elapsed, batches)
         except Exception as e:
             raise ValueError(f"本地模型生成embedding失败: {str(e)}")
 
-    def embed_chunks(self, chunk_id: str) -> Dict:
+    def _encode_with_pool(self, texts: List[str], model) -> np.ndarray:
+        """使用多进程编码池编码（同一时间只允许一个任务使用进程池）"""
+        with self._pool_lock:
+            if self._pool_timer is not None:
+                self._pool_timer.cancel()
+                self._pool_timer = None
+            if self._pool is None:
+                # 记住启动进程池的模型，关闭时不依赖注册表（模型可能已被淘汰）
+                self._pool_model = model
+                self._pool = self._pool_model.start_multi_process_pool(
+                    target_devices=["cpu"] * EMBEDDING_POOL_WORKERS
+                )
+                print(f"✓ 已启动embedding编码进程池: {EMBEDDING_POOL_WORKERS}个进程")
+            try:
+                # 分片略小于平均值，让先完成的进程继续领取，负载更均衡
+                chunk_size = max(EMBEDDING_BATCH_SIZE, math.ceil(len(texts) / (EMBEDDING_POOL_WORKERS * 4)))
+                embeddings = self._pool_model.encode_multi_process(
+                    texts, self._pool, batch_size=EMBEDDING_BATCH_SIZE, chunk_size=chunk_size
+                )
+            finally:
+                self._pool_timer = threading.Timer(EMBEDDING_POOL_IDLE_SECONDS, self.stop_pool)
+                self._pool_timer.daemon = True
+                self._pool_timer.start()
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def stop_pool(self):
+        """关闭多进程编码池（空闲超时或应用退出时调用）"""
+        with self._pool_lock:
+            if self._pool_timer is not None:
+                self._pool_timer.cancel()
+                self._pool_timer = None
+            if self._pool is not None:
+                self._pool_model.stop_multi_process_pool(self._pool)
+                self._pool = None
+                self._pool_model = None
+                print("✓ 已关闭空闲的embedding编码进程池")
+
+    def pool_stats(self) -> Dict:
+        """多进程编码池的配置与状态"""
+        return {
+            "model": self.model_key,
+            "workers": EMBEDDING_POOL_WORKERS,
+            "min_texts": EMBEDDING_POOL_MIN_TEXTS,
+            "idle_timeout_seconds": EMBEDDING_POOL_IDLE_SECONDS,
+            "running": getattr(self, "_pool", None) is not None
+        }
+
+    def check_backend_parity(self, texts: Optional[List[str]] = None,
+                             reference_backend: str = "torch") -> Dict:
+        """一致性检查：对比当前推理后端与参考后端的向量余弦偏差和编码速度
+
+        Args:
+            texts: 样本文本（默认使用内置样本）
+            reference_backend: 参考后端，默认为PyTorch全精度
+
+        Returns:
+            余弦相似度/偏差（1 - 余弦相似度）统计及两个后端的编码耗时
+        """
+        candidate_model = self.load_model()
+        texts = texts or PARITY_SAMPLE_TEXTS
+        reference_model = load_local_model(self.model_name, reference_backend)
+        reference_model.max_seq_length = candidate_model.max_seq_length
+
+        timings = {}
+        outputs = {}
+        for name, model in (("reference", reference_model), ("candidate", candidate_model)):
+            started = time.perf_counter()
+            outputs[name] = np.asarray(
+                model.encode(texts, batch_size=EMBEDDING_BATCH_SIZE, convert_to_numpy=True), dtype=np.float32
+            )
+            timings[name] = time.perf_counter() - started
+
+        reference, candidate = outputs["reference"], outputs["candidate"]
+        norms = np.linalg.norm(reference, axis=1) * np.linalg.norm(candidate, axis=1)
+        cosine = np.sum(reference * candidate, axis=1) / np.maximum(norms, 1e-12)
+        drift = 1.0 - cosine
+        return {
+            "model": self.model_name,
+            "backend": self.backend,
+            "reference_backend": reference_backend,
+            "samples": len(texts),
+            "cosine": {"mean": float(cosine.mean()), "min": float(cosine.min())},
+            "drift": {"mean": float(drift.mean()), "max": float(drift.max())},
+            "seconds": {name: round(value, 4) for name, value in timings.items()},
+            "speedup": round(timings["reference"] / timings["candidate"], 2) if timings["candidate"] > 0 else None
+        }
+
+    def embed_chunks(self, chunk_id: str, streaming: bool = False) -> Dict:
         """对分块后的文档创建嵌入向量
         
         Args:
             chunk_id: 分块阶段生成的chunk_id
+            streaming: 流式嵌入，按批编码并逐批追加写入向量文件和JSONL清单，
+                每批完成后记录断点；中断后再次调用会从最后完成的批次继续，适用于超大分块集合
         
         Returns:
             包含嵌入结果的字典
         """
         # 清理 chunk_id，去除首尾空白字符（包括制表符、换行符等）
         chunk_id = chunk_id.strip() if chunk_id else chunk_id
-        
+
+        # 同一分块结果、同一模型（及推理后端）已嵌入过则直接复用
+        content_key = f"{chunk_id}:{self.model_key}:stream" if streaming else f"{chunk_id}:{self.model_key}"
+        cached = self._cached_embedding(chunk_id, content_key)
+        if cached:
+            return cached
+
+        if streaming:
+            # 流式嵌入只读取分块结果的清单字段，分块本身在编码时逐批读取
+            chunking_header = load_result_header("chunking", chunk_id, "chunks")
+            if not chunking_header:
+                raise self._chunk_not_found(chunk_id)
+            embedding_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"embedding:{content_key}"))
+            # 同一分块结果的流式嵌入同时只能有一个在执行（多个进程会写同一个断点和向量文件）
+            with result_lock("embedding", embedding_id):
+                # 等待锁期间另一个请求可能已经完成
+                cached = self._cached_embedding(chunk_id, content_key)
+                if cached:
+                    return cached
+                return self._embed_chunks_streaming(chunk_id, chunking_header, content_key, embedding_id)
+
         # 从分块结果中获取chunks
         chunking_result = load_result("chunking", chunk_id)
         if not chunking_result:
-            # 提供更详细的错误信息，包括可用的 chunk_id 列表
-            from backend.utils.storage import list_results
-            available_chunks = list_results("chunking")
-            available_ids = [item["file_id"] for item in available_chunks]
-            raise ValueError(
-                f"未找到chunk_id: '{chunk_id}' 的分块结果。\n"
-                f"可用的chunk_id列表: {available_ids}"
-            )
+            raise self._chunk_not_found(chunk_id)
 
         chunks = chunking_result["chunks"]
         texts = [chunk["text"] for chunk in chunks]
 
-        # 创建嵌入向量
-        embeddings = self.create_embeddings(texts)
+        # 创建嵌入向量（已缓存的文本直接复用）
+        embeddings, encode_stats = self._encode_with_cache(texts)
         
         # 确定实际使用的模型名称
-        if not self.local_model:
-            raise ValueError("本地embedding模型未加载")
-        
-        model_name = LOCAL_EMBEDDING_MODEL
-        dim = self.local_model.get_sentence_embedding_dimension() if hasattr(self.local_model, 'get_sentence_embedding_dimension') else len(embeddings[0]) if embeddings else 'unknown'
-        actual_model = f"local:{model_name.split('/')[-1]}({dim}维)"
-
-        # 准备结果数据
-        embedded_chunks = []
-        for i, (chunk, embedding) in enumerate(zip(chunks, embeddings)):
-            embedded_chunks.append({
-                "chunk_id": chunk["chunk_id"],
-                "text": chunk["text"],
-                "embedding": embedding,
-                "embedding_dim": len(embedding),
-                "metadata": {
-                    "start": chunk.get("start"),
-                    "end": chunk.get("end"),
-                    "length": chunk.get("length")
-                }
-            })
+        embedding_dim = int(embeddings.shape[1]) if len(embeddings) else 0
+        actual_model = self._display_model_name(embedding_dim)
+
+        # 准备结果数据（向量本身单独存入 .npy 文件，清单中只记录其在矩阵中的行号）
+        embedded_chunks = [
+            self._embedded_chunk(chunk, i, embedding_dim) for i, chunk in enumerate(chunks)
+        ]
 
-        # 保存结果
+        # 保存结果：先写向量文件，再写JSON清单，保证清单可见时向量已完整
         embedding_id = str(uuid.uuid4())
-        result_data = {
+        save_vectors("embedding", embedding_id, embeddings)
+        result_data = self._result_manifest(
+            embedding_id, chunk_id, chunking_result["file_id"], actual_model,
+            len(embedded_chunks), embedding_dim, encode_stats, content_key
+        )
+        result_data["embedded_chunks"] = embedded_chunks
+
+        save_result("embedding", embedding_id, result_data)
+
+        return {
             "embedding_id": embedding_id,
             "chunk_id": chunk_id,
-            "file_id": chunking_result["file_id"],
-            "embedding_model": actual_model,
+            "status": "success",
+            "cached": False,
             "total_chunks": len(embedded_chunks),
-            "embedding_dim": len(embeddings[0]) if embeddings else 0,
-            "embedded_chunks": embedded_chunks
+            "embedding_dim": embedding_dim,
+            "model": actual_model,
+            "embedding_cache": encode_stats["cache"],
+            "throughput": encode_stats["throughput"],
+            "preview": self._preview_chunks(embedded_chunks)
+        }
+
+    def _cached_embedding(self, chunk_id: str, content_key: str) -> Optional[Dict]:
+        """已有相同内容键的嵌入结果时返回复用结果，否则返回None"""
+        cached_id = find_result_by_content("embedding", content_key)
+        if not cached_id:
+            return None
+        cached = load_result("embedding", cached_id)
+        if not cached:
+            return None
+        return {
+            "embedding_id": cached_id,
+            "chunk_id": chunk_id,
+            "status": "success",
+            "cached": True,
+            "total_chunks": cached["total_chunks"],
+            "embedding_dim": cached["embedding_dim"],
+            "model": cached["embedding_model"],
+            "preview": self._preview_chunks(list(islice(self.iter_embedded_chunks(cached), 3)))
+        }
+
+    @staticmethod
+    def _chunk_not_found(chunk_id: str) -> ValueError:
+        # 提供更详细的错误信息，包括可用的 chunk_id 列表
+        from backend.utils.storage import list_results
+        available_chunks = list_results("chunking")
+        available_ids = [item["file_id"] for item in available_chunks]
+        return ValueError(
+            f"未找到chunk_id: '{chunk_id}' 的分块结果。\n"
+            f"可用的chunk_id列表: {available_ids}"
+        )
+
+    def _embed_chunks_streaming(self, chunk_id: str, chunking_header: Dict, content_key: str,
+                                embedding_id: str) -> Dict:
+        """流式嵌入：从分块结果文件中逐批读取 EMBEDDING_STREAM_BATCH_SIZE 条分块，编码后写入预分配的向量文件，
+        清单逐批追加到 embedding/{embedding_id}.jsonl，再记录断点
+
+        embedding_id 由内容键确定，中断后再次执行同一请求会找到断点文件并从下一批继续；
+        内存中只保留当前批次的分块和向量，与分块总数无关。调用方需持有该 embedding_id 的 result_lock。
+        """
+        total = chunking_header.get("total_chunks")
+        if total is None:
+            # 清单字段写在分块之后（手工生成的结果文件）：先数一遍分块
+            total = sum(1 for _ in iter_result_items("chunking", chunk_id, "chunks"))
+        module_dir = os.path.join(DATA_DIR, "embedding")
+        os.makedirs(module_dir, exist_ok=True)
+        checkpoint_path = os.path.join(module_dir, f"{embedding_id}.checkpoint.json")
+        stream_path = os.path.join(module_dir, f"{stream_file_name(embedding_id)}.partial")
+
+        checkpoint = self._load_checkpoint(checkpoint_path, content_key, total)
+        if checkpoint and not (os.path.exists(stream_path) and VectorStreamWriter.partial_exists("embedding", embedding_id)):
+            checkpoint = None
+        completed = checkpoint["completed"] if checkpoint else 0
+        embedding_dim = checkpoint["embedding_dim"] if checkpoint else 0
+        encode_stats = checkpoint["encode_stats"] if checkpoint else {
+            "cache": {"total": 0, "hits": 0, "misses": 0, "hit_ratio": 0.0},
+            "throughput": self._throughput_stats(0, 0, 0.0, 0)
         }
+        if completed:
+            print(f"✓ 从断点继续嵌入: {embedding_id}（已完成 {completed}/{total}）")
+
+        writer = None
+        if checkpoint:
+            writer = VectorStreamWriter("embedding", embedding_id, total, embedding_dim, resume=True)
+        preview = []
+        chunks = islice(iter_result_items("chunking", chunk_id, "chunks"), completed, None)
+        # 续传时截断到断点位置，丢弃最后一个未完成批次写入的半截内容
+        with open(stream_path, "r+" if checkpoint else "w", encoding="utf-8") as stream:
+            stream.seek(checkpoint["stream_offset"] if checkpoint else 0)
+            stream.truncate()
+            for start in range(completed, total, EMBEDDING_STREAM_BATCH_SIZE):
+                batch = list(islice(chunks, EMBEDDING_STREAM_BATCH_SIZE))
+                if not batch:
+                    raise ValueError(f"分块结果 {chunk_id} 中的分块数少于清单记录的 {total} 个")
+                embeddings, batch_stats = self._encode_with_cache([chunk["text"] for chunk in batch])
+                if writer is None:
+                    embedding_dim = int(embeddings.shape[1])
+                    writer = VectorStreamWriter("embedding", embedding_id, total, embedding_dim)
+                writer.write(start, embeddings)
 
+                for i, chunk in enumerate(batch, start):
+                    record = self._embedded_chunk(chunk, i, embedding_dim)
+                    if len(preview) < 3:
+                        preview.append(record)
+                    stream.write(json.dumps(record, ensure_ascii=False))
+                    stream.write("\n")
+
+                # 先把向量和清单刷到磁盘，再记录断点
+                writer.flush()
+                stream.flush()
+                os.fsync(stream.fileno())
+                encode_stats = self._merge_encode_stats(encode_stats, batch_stats)
+                self._save_checkpoint(checkpoint_path, {
+                    "content_key": content_key,
+                    "total": total,
+                    "completed": start + len(batch),
+                    "embedding_dim": embedding_dim,
+                    "stream_offset": stream.tell(),
+                    "encode_stats": encode_stats
+                })
+
+        if writer is None:
+            # 没有任何分块：写一个空的向量文件
+            save_vectors("embedding", embedding_id, np.zeros((0, 0), dtype=np.float32))
+        else:
+            writer.finish()
+        os.replace(stream_path, os.path.join(module_dir, stream_file_name(embedding_id)))
+
+        actual_model = self._display_model_name(embedding_dim)
+        result_data = self._result_manifest(
+            embedding_id, chunk_id, chunking_header.get("file_id"), actual_model,
+            total, embedding_dim, encode_stats, content_key
+        )
+        result_data["streamed"] = True
+        result_data["stream_file"] = stream_file_name(embedding_id)
         save_result("embedding", embedding_id, result_data)
+        os.remove(checkpoint_path)
 
-        # 准备预览数据（不包含embedding向量）
+        if not preview:
+            preview = list(islice(iter_result_stream("embedding", embedding_id), 3))
+        return {
+            "embedding_id": embedding_id,
+            "chunk_id": chunk_id,
+            "status": "success",
+            "cached": False,
+            "resumed_from": completed,
+            "total_chunks": total,
+            "embedding_dim": embedding_dim,
+            "model": actual_model,
+            "embedding_cache": encode_stats["cache"],
+            "throughput": encode_stats["throughput"],
+            "preview": self._preview_chunks(preview)
+        }
+
+    @staticmethod
+    def _load_checkpoint(checkpoint_path: str, content_key: str, total: int) -> Optional[Dict]:
+        """读取断点（与当前请求不匹配或文件损坏时忽略）"""
+        if not os.path.exists(checkpoint_path):
+            return None
+        try:
+            with open(checkpoint_path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"警告: 断点文件读取失败，将重新嵌入: {e}")
+            return None
+        if checkpoint.get("content_key") != content_key or checkpoint.get("total") != total:
+            return None
+        return checkpoint
+
+    @staticmethod
+    def _save_checkpoint(checkpoint_path: str, checkpoint: Dict):
+        temp_path = f"{checkpoint_path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, ensure_ascii=False)
+        os.replace(temp_path, checkpoint_path)
+
+    @staticmethod
+    def _merge_encode_stats(total: Dict, batch: Dict) -> Dict:
+        """累加各批次的缓存命中和吞吐统计"""
+        cache = {key: total["cache"][key] + batch["cache"][key] for key in ("total", "hits", "misses")}
+        cache["hit_ratio"] = round(cache["hits"] / cache["total"], 4) if cache["total"] else 0.0
+        throughput = {
+            key: total["throughput"][key] + batch["throughput"][key]
+            for key in ("chunks", "tokens", "batches", "seconds")
+        }
+        return {
+            "cache": cache,
+            "throughput": EmbeddingService._throughput_stats(
+                throughput["chunks"], throughput["tokens"], throughput["seconds"], throughput["batches"]
+            )
+        }
+
+    def _display_model_name(self, embedding_dim: int) -> str:
+        """结果中展示的模型名称，例如 local:bert-base-uncased(768维)"""
+        model = self.load_model()
+        dim = model.get_sentence_embedding_dimension() if hasattr(model, 'get_sentence_embedding_dimension') else embedding_dim or 'unknown'
+        actual_model = f"local:{self.model_name.split('/')[-1]}({dim}维)"
+        if self.backend != "torch":
+            actual_model = f"{actual_model}[{self.backend}]"
+        return actual_model
+
+    @staticmethod
+    def _embedded_chunk(chunk: Dict, vector_index: int, embedding_dim: int) -> Dict:
+        return {
+            "chunk_id": chunk["chunk_id"],
+            "text": chunk["text"],
+            "vector_index": vector_index,
+            "embedding_dim": embedding_dim,
+            "metadata": {
+                "start": chunk.get("start"),
+                "end": chunk.get("end"),
+                "length": chunk.get("length"),
+                "page_start": chunk.get("page_start"),
+                "page_end": chunk.get("page_end")
+            }
+        }
+
+    def _result_manifest(self, embedding_id: str, chunk_id: str, file_id: str, actual_model: str,
+                         total_chunks: int, embedding_dim: int, encode_stats: Dict, content_key: str) -> Dict:
+        result_data = {
+            "embedding_id": embedding_id,
+            "chunk_id": chunk_id,
+            "file_id": file_id,
+            "embedding_model": actual_model,
+            "model_name": self.model_name,
+            "total_chunks": total_chunks,
+            "embedding_dim": embedding_dim,
+            "embedding_backend": self.backend,
+            "vector_file": vector_file_name(embedding_id),
+            "vector_dtype": VECTOR_STORAGE_PRECISION,
+            "embedding_cache": encode_stats["cache"],
+            "throughput": encode_stats["throughput"],
+            "content_key": content_key
+        }
+        if VECTOR_STORAGE_PRECISION == "int8":
+            result_data["vector_scales_file"] = scales_file_name(embedding_id)
+        return result_data
+
+    @staticmethod
+    def iter_embedded_chunks(embedding_result: Dict) -> Iterator[Dict]:
+        """惰性遍历嵌入结果中的分块清单
+
+        流式嵌入的清单从JSONL文件逐行读取，普通结果直接遍历JSON中的列表。
+        """
+        if embedding_result.get("streamed"):
+            return iter_result_stream("embedding", embedding_result["embedding_id"])
+        return iter(embedding_result.get("embedded_chunks", []))
+
+    @staticmethod
+    def _preview_chunks(embedded_chunks: List[Dict]) -> List[Dict]:
+        """准备预览数据（不包含embedding向量）"""
         preview_chunks = []
         for chunk in embedded_chunks[:3]:
             preview_chunks.append({
@@ -165,13 +746,4 @@ class EmbeddingService:
                 "embedding_dim": chunk["embedding_dim"],
                 "metadata": chunk["metadata"]
             })
-
-        return {
-            "embedding_id": embedding_id,
-            "chunk_id": chunk_id,
-            "status": "success",
-            "total_chunks": len(embedded_chunks),
-            "embedding_dim": len(embeddings[0]) if embeddings else 0,
-            "model": actual_model,
-            "preview": preview_chunks
-        }
+        return preview_chunks
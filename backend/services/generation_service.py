@@ -1,10 +1,10 @@
 import uuid
 from typing import List, Dict, Optional
-from openai import AzureOpenAI
 from backend.utils.config import (
     AZURE_OPENAI_API_KEY, AZURE_OPENAI_ENDPOINT,
     AZURE_OPENAI_API_VERSION, AZURE_OPENAI_CHAT_DEPLOYMENT
 )
+from backend.utils.startup import timed_import
 from backend.utils.storage import save_result, load_result
 
 
@@ -12,13 +12,18 @@ class GenerationService:
     """文本生成服务，使用Azure OpenAI"""
 
     def __init__(self):
-        self.client = None
-        if AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
-            self.client = AzureOpenAI(
+        self._client = None
+
+    @property
+    def client(self):
+        """Azure OpenAI客户端（首次访问时导入openai并创建）"""
+        if self._client is None and AZURE_OPENAI_API_KEY and AZURE_OPENAI_ENDPOINT:
+            self._client = timed_import("openai").AzureOpenAI(
                 api_key=AZURE_OPENAI_API_KEY,
                 api_version=AZURE_OPENAI_API_VERSION,
                 azure_endpoint=AZURE_OPENAI_ENDPOINT
             )
+        return self._client
 
     def generate_with_context(self, query: str, context_documents: List[str],
                               max_tokens: int = 500) -> Dict:
@@ -1,27 +1,63 @@
+import hashlib
+import threading
 import uuid
-import chromadb
+from collections import Counter
 from typing import List, Dict, Optional
-from chromadb.config import Settings
-from backend.utils.config import CHROMA_DB_PATH
-from backend.utils.storage import load_result, save_result
+from backend.utils.config import (
+    LOCAL_EMBEDDING_MODEL, EMBEDDING_BACKEND, INDEX_UPSERT_BATCH_SIZE, HYBRID_RRF_K, HYBRID_CANDIDATES
+)
+from backend.services.embedding_service import EmbeddingService
+from backend.services.lexical_index import LexicalIndex, get_lexical_index, drop_lexical_index
+from backend.services.search_cache import bump_collection_version
+from backend.services.vector_backends import (
+    VectorBackend, get_vector_backend, backend_name_for_collection, configured_backend_names, normalize_where
+)
+from backend.utils.embedding_cache import text_hash
+from backend.utils.storage import load_result, save_result, find_result_by_content, forget_content_key
+from backend.utils.vector_store import load_embedding_vectors, dequantize_rows
+
+# 以整数保存的分块元数据字段（旧版本索引中这些字段是字符串，重新索引时会按元数据变化更新）
+INTEGER_METADATA_FIELDS = ("start", "end", "length", "page_start", "page_end")
+
+# 检索模式：vector（向量检索）、lexical（BM25词法检索，不调用模型）、hybrid（两者按RRF融合）
+SEARCH_MODES = ("vector", "lexical", "hybrid")
+
+_lexical_backfill_lock = threading.Lock()
 
 
 class IndexingService:
-    """向量索引服务，使用Chroma数据库"""
+    """向量索引服务，每个集合可以使用不同的向量索引后端（Chroma、NumPy精确检索、HNSW图索引），
+    并在旁边维护一份BM25词法索引，支持词法检索和混合检索"""
 
-    def __init__(self):
-        self.client = chromadb.PersistentClient(
-            path=CHROMA_DB_PATH,
-            settings=Settings(anonymized_telemetry=False)
-        )
+    @staticmethod
+    def _backend(collection_name: str) -> VectorBackend:
+        """集合使用的向量索引后端（见 VECTOR_BACKEND / VECTOR_COLLECTION_BACKENDS），首次使用时才创建"""
+        return get_vector_backend(backend_name_for_collection(collection_name))
+
+    @staticmethod
+    def _all_collections() -> List:
+        collections = []
+        for backend_name in configured_backend_names():
+            backend = get_vector_backend(backend_name)
+            collections.extend((backend_name, col) for col in backend.list_collections())
+        return collections
 
-    def create_collection(self, collection_name: str, embedding_dim: int = 768) -> Dict:
-        """创建或获取集合"""
+    def warm_up(self):
+        """创建配置中用到的全部后端并打开数据库（启动时在后台调用）"""
+        self._all_collections()
+
+    def create_collection(self, collection_name: str, embedding_dim: int = 768,
+                          model_name: Optional[str] = None) -> Dict:
+        """创建或获取集合（指定model_name时在集合元数据中记录所用的embedding模型）"""
         try:
-            collection = self.client.get_or_create_collection(
-                name=collection_name,
-                metadata={"embedding_dim": embedding_dim}
+            metadata = {"embedding_dim": embedding_dim}
+            if model_name:
+                metadata["embedding_model"] = model_name
+            collection = self._backend(collection_name).get_or_create_collection(
+                collection_name, metadata=metadata
             )
+            if model_name:
+                self._bind_collection_model(collection, model_name, EMBEDDING_BACKEND)
             return {
                 "collection_name": collection_name,
                 "status": "success",
@@ -30,48 +66,158 @@ class IndexingService:
         except Exception as e:
             raise ValueError(f"创建集合失败: {str(e)}")
 
-    def index_embeddings(self, embedding_id: str, collection_name: str) -> Dict:
+    @staticmethod
+    def _bind_collection_model(collection, model_name: str, backend: str):
+        """在集合元数据中记录所用的embedding模型
+
+        集合已记录其他模型时拒绝写入，避免同一集合混用不同的编码器；
+        推理后端只作记录（同一模型的不同后端向量一致，可以互换）。
+        """
+        metadata = dict(collection.metadata or {})
+        recorded = metadata.get("embedding_model")
+        if recorded:
+            if recorded != model_name:
+                raise ValueError(
+                    f"集合 {collection.name} 使用的embedding模型为 {recorded}，"
+                    f"不能写入由 {model_name} 生成的向量"
+                )
+            return
+        # hnsw:* 等索引参数不允许修改，只合并其余字段
+        metadata = {key: value for key, value in metadata.items() if not key.startswith("hnsw:")}
+        metadata.update(embedding_model=model_name, embedding_backend=backend)
+        collection.modify(metadata=metadata)
+
+    def _lexical_index(self, collection_name: str, collection=None) -> LexicalIndex:
+        """集合的词法索引；本功能上线前已写入的集合在首次使用时从集合中的文档补建"""
+        index = get_lexical_index(collection_name)
+        if index.exists():
+            return index
+        with _lexical_backfill_lock:
+            if not index.exists():
+                collection = collection or self._backend(collection_name).get_collection(collection_name)
+                existing = collection.get(include=["documents"])
+                index.add(existing["ids"], existing["documents"] or [])
+                # 空集合也创建索引文件，之后不再尝试补建
+                index.create()
+        return index
+
+    def collection_model(self, collection_name: str) -> Optional[str]:
+        """集合记录的embedding模型（旧集合未记录时为None）"""
+        collection = self._backend(collection_name).get_collection(collection_name)
+        return (collection.metadata or {}).get("embedding_model")
+
+    def index_embeddings(self, embedding_id: str, collection_name: str,
+                         document_key: Optional[str] = None) -> Dict:
         """将嵌入向量索引到Chroma数据库
         
         Args:
             embedding_id: 嵌入阶段生成的embedding_id
             collection_name: Chroma集合名称
+            document_key: 调用方指定的文档标识。同一标识再次索引时视为该文档的新版本，
+                未改动的分块保留、不再出现的分块删除；不指定时按来源文件名识别文档（同一集合中同名文件视为同一文档的不同版本）
         
         Returns:
             包含索引结果的字典
         """
+        # 同一嵌入结果已写入过该集合（且集合仍存在）则直接复用
+        content_key = f"{embedding_id}:{collection_name}"
+        if document_key:
+            content_key = f"{content_key}:{document_key}"
+        cached_id = find_result_by_content("indexing", content_key)
+        if cached_id and collection_name in self._collection_names():
+            cached = load_result("indexing", cached_id)
+            if cached:
+                return {
+                    "index_id": cached_id,
+                    "collection_name": collection_name,
+                    "status": "success",
+                    "cached": True,
+                    "total_documents": cached["total_documents"]
+                }
+
         # 从嵌入结果中获取数据
         embedding_result = load_result("embedding", embedding_id)
         if not embedding_result:
             raise ValueError(f"未找到embedding_id: {embedding_id} 的嵌入结果")
 
-        embedded_chunks = embedding_result["embedded_chunks"]
+        embedded_chunks = list(EmbeddingService.iter_embedded_chunks(embedding_result))
+        # 向量以内存映射方式读取，不再解析JSON中的浮点列表；量化存储的向量在写入时按批还原
+        vectors, scales = load_embedding_vectors(embedding_result)
 
-        # 获取或创建集合
-        collection = self.client.get_or_create_collection(name=collection_name)
+        # 获取或创建集合，并记录（校验）集合使用的embedding模型
+        collection = self._backend(collection_name).get_or_create_collection(collection_name)
+        self._bind_collection_model(
+            collection,
+            embedding_result.get("model_name", LOCAL_EMBEDDING_MODEL),
+            embedding_result.get("embedding_backend", "torch")
+        )
 
-        # 准备数据
-        ids = [f"chunk_{chunk['chunk_id']}" for chunk in embedded_chunks]
-        embeddings = [chunk["embedding"] for chunk in embedded_chunks]
-        documents = [chunk["text"] for chunk in embedded_chunks]
-        metadatas = [
-            {
+        # 准备数据：ID由文档标识和分块内容决定，同一文档重新摄取（内容已修改）时未改动的分块ID不变。
+        # 文档标识默认为来源文件名，不同文档同名时需要由调用方指定document_key区分
+        source_name = self._source_name(embedding_result["file_id"])
+        source_key = f"key:{document_key}" if document_key else f"name:{source_name}"
+        source_id = hashlib.sha256(source_key.encode("utf-8")).hexdigest()[:16]
+        ids = []
+        metadatas = []
+        occurrences = Counter()
+        for chunk in embedded_chunks:
+            chunk_hash = text_hash(chunk["text"])
+            occurrences[chunk_hash] += 1
+            # 同一文件中重复出现的相同文本按出现次序区分
+            ids.append(f"{source_id}:{chunk_hash[:32]}:{occurrences[chunk_hash]}")
+            metadata = {
                 "chunk_id": str(chunk["chunk_id"]),
                 "file_id": embedding_result["file_id"],
-                "start": str(chunk["metadata"].get("start", "")),
-                "end": str(chunk["metadata"].get("end", "")),
-                "length": str(chunk["metadata"].get("length", ""))
+                "source_id": source_id,
+                "source_name": source_name
             }
-            for chunk in embedded_chunks
+            # 位置和页码保留整数类型，检索时可以按范围过滤（缺失的字段不写入，Chroma不接受None）
+            for key in INTEGER_METADATA_FIELDS:
+                value = chunk["metadata"].get(key)
+                if value is not None and value != "":
+                    metadata[key] = int(value)
+            metadatas.append(metadata)
+
+        lexical_index = self._lexical_index(collection_name, collection)
+
+        # 与集合中该来源已有的分块对比：新增的写入向量，位置变化的只更新元数据，
+        # 内容和位置都没变的跳过，本次不再出现的（文件已修改）删除
+        existing = collection.get(where={"source_id": source_id}, include=["metadatas"])
+        existing_metadata = dict(zip(existing["ids"], existing["metadatas"] or []))
+        added = [i for i, doc_id in enumerate(ids) if doc_id not in existing_metadata]
+        updated = [
+            i for i, doc_id in enumerate(ids)
+            if doc_id in existing_metadata
+            and self._stable_metadata(existing_metadata[doc_id]) != self._stable_metadata(metadatas[i])
         ]
+        new_ids = set(ids)
+        stale = [doc_id for doc_id in existing_metadata if doc_id not in new_ids]
 
-        # 添加到集合
-        collection.add(
-            ids=ids,
-            embeddings=embeddings,
-            documents=documents,
-            metadatas=metadatas
-        )
+        for start in range(0, len(added), INDEX_UPSERT_BATCH_SIZE):
+            batch = added[start:start + INDEX_UPSERT_BATCH_SIZE]
+            collection.upsert(
+                ids=[ids[i] for i in batch],
+                embeddings=dequantize_rows(vectors, scales, batch),
+                documents=[embedded_chunks[i]["text"] for i in batch],
+                metadatas=[metadatas[i] for i in batch]
+            )
+            lexical_index.add([ids[i] for i in batch], [embedded_chunks[i]["text"] for i in batch])
+        for start in range(0, len(updated), INDEX_UPSERT_BATCH_SIZE):
+            batch = updated[start:start + INDEX_UPSERT_BATCH_SIZE]
+            collection.update(ids=[ids[i] for i in batch], metadatas=[metadatas[i] for i in batch])
+        for start in range(0, len(stale), INDEX_UPSERT_BATCH_SIZE):
+            collection.delete(ids=stale[start:start + INDEX_UPSERT_BATCH_SIZE])
+            lexical_index.delete(stale[start:start + INDEX_UPSERT_BATCH_SIZE])
+
+        changes = {
+            "added": len(added),
+            "updated": len(updated),
+            "unchanged": len(ids) - len(added) - len(updated),
+            "deleted": len(stale)
+        }
+        if added or updated or stale:
+            # 集合内容已变化，之前缓存的搜索结果不再使用
+            bump_collection_version(collection_name)
 
         # 保存索引信息
         index_id = str(uuid.uuid4())
@@ -79,9 +225,13 @@ class IndexingService:
             "index_id": index_id,
             "embedding_id": embedding_id,
             "file_id": embedding_result["file_id"],
+            "source_name": source_name,
+            "document_key": document_key,
             "collection_name": collection_name,
             "total_documents": len(ids),
-            "status": "indexed"
+            "changes": changes,
+            "status": "indexed",
+            "content_key": content_key
         }
 
         save_result("indexing", index_id, result_data)
@@ -90,57 +240,171 @@ class IndexingService:
             "index_id": index_id,
             "collection_name": collection_name,
             "status": "success",
-            "total_documents": len(ids)
+            "cached": False,
+            "total_documents": len(ids),
+            "changes": changes
         }
 
+    @staticmethod
+    def _stable_metadata(metadata: Dict) -> Dict:
+        """比较时忽略每次摄取都会变化的file_id/chunk_id，否则重新摄取会改写全部分块"""
+        return {key: value for key, value in (metadata or {}).items() if key not in ("file_id", "chunk_id")}
+
+    @staticmethod
+    def _source_name(file_id: str) -> str:
+        """分块所属文件的来源名称（上传时的原文件名）"""
+        loading_result = load_result("loading", file_id)
+        if not loading_result:
+            return file_id
+        return loading_result.get("source_name") or loading_result.get("file_name") or file_id
+
     def similarity_search(self, collection_name: str, query_text: str,
-                          query_embedding: List[float], n_results: int = 5) -> Dict:
+                          query_embedding: Optional[List[float]] = None, n_results: int = 5,
+                          mode: str = "vector", where: Optional[Dict] = None) -> Dict:
         """相似度搜索
         
         Args:
             collection_name: 集合名称
             query_text: 查询文本
-            query_embedding: 查询文本的嵌入向量
+            query_embedding: 查询文本的嵌入向量（lexical模式不需要）
             n_results: 返回结果数量
+            mode: 检索模式（vector, lexical, hybrid）
+            where: 元数据过滤条件（Chroma的where语法，例如
+                {"file_id": {"$in": [...]}, "page_start": {"$gte": 3, "$lte": 8}}），在索引中过滤
         
         Returns:
             搜索结果
         """
-        collection = self.client.get_collection(name=collection_name)
+        query_embeddings = [query_embedding] if query_embedding is not None else None
+        return self.batch_similarity_search(
+            collection_name, [query_text], query_embeddings, n_results, mode, where
+        )[0]
 
-        results = collection.query(
-            query_embeddings=[query_embedding],
-            n_results=n_results
-        )
+    def batch_similarity_search(self, collection_name: str, query_texts: List[str],
+                                query_embeddings=None, n_results: int = 5,
+                                mode: str = "vector", where: Optional[Dict] = None) -> List[Dict]:
+        """批量相似度搜索：同一集合的多个查询在一次向量检索中完成
+
+        Args:
+            collection_name: 集合名称
+            query_texts: 查询文本列表
+            query_embeddings: 查询向量（与query_texts一一对应，lexical模式不需要）
+            n_results: 每个查询返回的结果数量
+            mode: 检索模式（vector, lexical, hybrid）
+            where: 元数据过滤条件（见 similarity_search），对所有查询生效
+
+        Returns:
+            与查询顺序一致的搜索结果列表
+        """
+        if mode not in SEARCH_MODES:
+            raise ValueError(f"不支持的检索模式: {mode}，可选: {', '.join(SEARCH_MODES)}")
+        if mode != "lexical" and query_embeddings is None:
+            raise ValueError(f"{mode}检索需要查询向量")
+        where = normalize_where(where)
+        collection = self._backend(collection_name).get_collection(collection_name)
+        candidates = n_results if mode != "hybrid" else max(n_results, HYBRID_CANDIDATES)
+
+        vector_hits = [[] for _ in query_texts]
+        if mode != "lexical":
+            results = collection.query(
+                query_embeddings=[list(map(float, embedding)) for embedding in query_embeddings],
+                n_results=candidates,
+                where=where
+            )
+            for q in range(len(query_texts)):
+                if results["ids"] and len(results["ids"][q]) > 0:
+                    for i in range(len(results["ids"][q])):
+                        vector_hits[q].append({
+                            "id": results["ids"][q][i],
+                            "document": results["documents"][q][i],
+                            "distance": results["distances"][q][i] if results.get("distances") else None,
+                            "metadata": results["metadatas"][q][i] if results.get("metadatas") else {}
+                        })
+
+        lexical_hits = [[] for _ in query_texts]
+        if mode != "vector":
+            # 先在集合中按元数据过滤出候选文档，再只在这些文档中做BM25打分
+            allowed_ids = collection.get(where=where, include=[])["ids"] if where else None
+            lexical_hits = self._lexical_index(collection_name, collection).search(
+                query_texts, candidates, allowed_ids
+            )
 
         # 格式化结果
-        search_results = []
-        if results["ids"] and len(results["ids"][0]) > 0:
-            for i in range(len(results["ids"][0])):
-                search_results.append({
-                    "id": results["ids"][0][i],
-                    "document": results["documents"][0][i],
-                    "distance": results["distances"][0][i] if "distances" in results else None,
-                    "metadata": results["metadatas"][0][i] if "metadatas" in results else {}
-                })
+        batch_results = []
+        for q, query_text in enumerate(query_texts):
+            if mode == "vector":
+                search_results = vector_hits[q]
+            elif mode == "lexical":
+                search_results = [
+                    {"id": doc_id, "document": None, "distance": None, "bm25_score": score, "metadata": {}}
+                    for doc_id, score in lexical_hits[q]
+                ]
+            else:
+                search_results = self._fuse_rankings(vector_hits[q], lexical_hits[q], n_results)
+            batch_results.append({
+                "query_text": query_text,
+                "collection_name": collection_name,
+                "mode": mode,
+                "results_count": len(search_results),
+                "results": search_results
+            })
+        if mode != "vector":
+            self._fill_documents(collection, batch_results)
+        return batch_results
 
-        return {
-            "query_text": query_text,
-            "collection_name": collection_name,
-            "results_count": len(search_results),
-            "results": search_results
+    @staticmethod
+    def _fuse_rankings(vector_hits: List[Dict], lexical_hits: List, n_results: int) -> List[Dict]:
+        """倒数排名融合（RRF）：score = Σ 1 / (HYBRID_RRF_K + 排名)，两种检索的分数量纲不同，只使用排名"""
+        fused = {}
+        for rank, hit in enumerate(vector_hits, start=1):
+            fused[hit["id"]] = dict(hit, bm25_score=None, hybrid_score=1.0 / (HYBRID_RRF_K + rank))
+        for rank, (doc_id, score) in enumerate(lexical_hits, start=1):
+            hit = fused.setdefault(doc_id, {
+                "id": doc_id, "document": None, "distance": None, "metadata": {}, "hybrid_score": 0.0
+            })
+            hit["bm25_score"] = score
+            hit["hybrid_score"] += 1.0 / (HYBRID_RRF_K + rank)
+        return sorted(fused.values(), key=lambda hit: hit["hybrid_score"], reverse=True)[:n_results]
+
+    @staticmethod
+    def _fill_documents(collection, batch_results: List[Dict]):
+        """只由词法检索命中的结果从集合中补充文档内容和元数据（一次批量读取）"""
+        missing = list(dict.fromkeys(
+            hit["id"] for result in batch_results for hit in result["results"] if hit["document"] is None
+        ))
+        if not missing:
+            return
+        records = collection.get(ids=missing, include=["documents", "metadatas"])
+        found = {
+            doc_id: (document, metadata)
+            for doc_id, document, metadata in zip(records["ids"], records["documents"], records["metadatas"])
         }
+        for result in batch_results:
+            hits = []
+            for hit in result["results"]:
+                if hit["document"] is None:
+                    # 词法索引与集合短暂不一致（并发删除）时跳过该结果
+                    if hit["id"] not in found:
+                        continue
+                    hit["document"], hit["metadata"] = found[hit["id"]][0], found[hit["id"]][1] or {}
+                hits.append(hit)
+            result["results"] = hits
+            result["results_count"] = len(hits)
+
+    def _collection_names(self) -> List[str]:
+        """当前存在的集合名称"""
+        return [col.name for _, col in self._all_collections()]
 
     def list_collections(self) -> Dict:
-        """列出所有集合"""
-        collections = self.client.list_collections()
+        """列出所有集合（包括各后端中的集合）"""
         collection_list = [
             {
                 "name": col.name,
+                "backend": backend_name,
                 "count": col.count(),
                 "metadata": col.metadata
             }
-            for col in collections
+            for backend_name, col in self._all_collections()
         ]
         return {
             "collections": collection_list,
@@ -150,7 +414,11 @@ class IndexingService:
     def delete_collection(self, collection_name: str) -> Dict:
         """删除集合"""
         try:
-            self.client.delete_collection(name=collection_name)
+            self._backend(collection_name).delete_collection(collection_name)
+            drop_lexical_index(collection_name)
+            bump_collection_version(collection_name)
+            # 集合删除后，写入该集合的索引记录不能再被复用
+            forget_content_key("indexing", collection_name=collection_name)
             return {
                 "collection_name": collection_name,
                 "status": "deleted"
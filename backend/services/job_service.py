@@ -0,0 +1,364 @@
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from contextlib import closing
+from typing import Dict, List, Optional
+
+from backend.utils.config import (
+    JOBS_DB_PATH, JOB_POLL_INTERVAL, JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS, JOB_RETRY_BACKOFF_SECONDS
+)
+from backend.utils.executor import run_in_stage_sync
+from backend.utils.storage import load_result
+
+# 摄取流水线的阶段顺序，以及每个阶段产出的结果ID（即 save_result 的模块名和ID字段）
+PIPELINE_STAGES = ["load", "chunk", "embed", "index"]
+STAGE_ARTIFACTS = {
+    "load": ("loading", "file_id"),
+    "chunk": ("chunking", "chunk_id"),
+    "embed": ("embedding", "embedding_id"),
+    "index": ("indexing", "index_id"),
+}
+# 每个阶段使用的执行器（与对应的路由一致），任务线程只负责调度和续租；
+# 嵌入在文档嵌入的inference线程池执行，搜索查询的编码在单独的query线程池，不会被摄取任务阻塞
+STAGE_EXECUTORS = {
+    "load": "cpu",
+    "chunk": "cpu",
+    "embed": "inference",
+    "index": "io",
+}
+
+_db_lock = threading.Lock()
+_db_ready = False
+
+
+def _connect() -> sqlite3.Connection:
+    """打开任务队列数据库（首次调用时建表）"""
+    global _db_ready
+    # isolation_level=None：由代码显式控制事务，领取任务时使用 BEGIN IMMEDIATE 加写锁
+    conn = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+    conn.row_factory = sqlite3.Row
+    if not _db_ready:
+        with _db_lock:
+            if not _db_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS jobs (
+                        job_id TEXT PRIMARY KEY,
+                        status TEXT NOT NULL,
+                        stage TEXT,
+                        params TEXT NOT NULL,
+                        artifacts TEXT NOT NULL,
+                        stage_timings TEXT NOT NULL,
+                        progress REAL NOT NULL DEFAULT 0,
+                        error TEXT,
+                        attempts INTEGER NOT NULL DEFAULT 0,
+                        worker_id TEXT,
+                        lease_expires REAL,
+                        next_attempt_at REAL,
+                        created_at REAL NOT NULL,
+                        updated_at REAL NOT NULL
+                    )
+                    """
+                )
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}
+                if "next_attempt_at" not in columns:
+                    conn.execute("ALTER TABLE jobs ADD COLUMN next_attempt_at REAL")
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_jobs_status_created ON jobs (status, created_at)"
+                )
+                _db_ready = True
+    return conn
+
+
+def _row_to_job(row: sqlite3.Row) -> Dict:
+    job = dict(row)
+    job["params"] = json.loads(job["params"])
+    job["artifacts"] = json.loads(job["artifacts"])
+    job["stage_timings"] = json.loads(job["stage_timings"])
+    return job
+
+
+def _planned_stages(params: Dict) -> List[str]:
+    """任务需要执行的阶段（未指定集合名称时跳过索引阶段）"""
+    stages = list(PIPELINE_STAGES)
+    if not params.get("collection_name"):
+        stages.remove("index")
+    return stages
+
+
+class _LeaseHeartbeat:
+    """阶段执行期间定期续租，避免耗时较长的阶段被其他worker误接管"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(JOB_LEASE_SECONDS / 3):
+            try:
+                JobService._update_job(self.job_id, lease_expires=time.time() + JOB_LEASE_SECONDS)
+            except Exception as e:
+                print(f"警告: 任务 {self.job_id} 续租失败: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+class JobService:
+    """异步摄取任务队列（SQLite持久化），覆盖加载、分块、嵌入、索引四个阶段
+
+    每个阶段完成后把产出的结果ID写回任务记录，因此服务重启或worker崩溃后，
+    任务会从最后一个已完成的阶段继续，复用已有的 save_result 结果。
+    """
+
+    @staticmethod
+    def submit_job(params: Dict, artifacts: Optional[Dict] = None) -> Dict:
+        """提交任务
+
+        Args:
+            params: 任务参数（file_path, method, chunking_strategy, chunk_size,
+                overlap, embedding_model, collection_name, document_key）
+            artifacts: 已有的阶段结果ID，例如只传 chunk_id 表示从嵌入阶段开始
+
+        Returns:
+            任务信息
+        """
+        artifacts = {key: value for key, value in (artifacts or {}).items() if value}
+        if not params.get("file_path") and not artifacts:
+            raise ValueError("必须提供file_path或已有的file_id/chunk_id/embedding_id")
+
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        with closing(_connect()) as conn:
+            conn.execute(
+                "INSERT INTO jobs (job_id, status, stage, params, artifacts, stage_timings, "
+                "progress, created_at, updated_at) VALUES (?, 'queued', NULL, ?, ?, '{}', 0, ?, ?)",
+                (job_id, json.dumps(params, ensure_ascii=False),
+                 json.dumps(artifacts, ensure_ascii=False), now, now)
+            )
+        return JobService.get_job(job_id)
+
+    @staticmethod
+    def get_job(job_id: str) -> Optional[Dict]:
+        """查询任务状态、进度和各阶段耗时"""
+        with closing(_connect()) as conn:
+            row = conn.execute("SELECT * FROM jobs WHERE job_id = ?", (job_id,)).fetchone()
+        return _row_to_job(row) if row else None
+
+    @staticmethod
+    def list_jobs(status: Optional[str] = None, limit: int = 50, offset: int = 0) -> Dict:
+        """分页列出任务（按创建时间倒序）"""
+        where, args = ("WHERE status = ?", [status]) if status else ("", [])
+        with closing(_connect()) as conn:
+            total = conn.execute(f"SELECT COUNT(*) FROM jobs {where}", args).fetchone()[0]
+            rows = conn.execute(
+                f"SELECT * FROM jobs {where} ORDER BY created_at DESC LIMIT ? OFFSET ?",
+                args + [limit, offset]
+            ).fetchall()
+        return {
+            "total": total,
+            "jobs": [_row_to_job(row) for row in rows]
+        }
+
+    @staticmethod
+    def claim_job(worker_id: str) -> Optional[Dict]:
+        """领取一个待执行的任务（已到重试时间的排队任务，或租约已过期的运行中任务）"""
+        now = time.time()
+        with closing(_connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT * FROM jobs WHERE (status = 'queued' AND (next_attempt_at IS NULL OR next_attempt_at <= ?)) "
+                    "OR (status = 'running' AND lease_expires < ?) "
+                    "ORDER BY created_at LIMIT 1",
+                    (now, now)
+                ).fetchone()
+                if row is None:
+                    conn.execute("COMMIT")
+                    return None
+
+                if row["attempts"] >= JOB_MAX_ATTEMPTS:
+                    conn.execute(
+                        "UPDATE jobs SET status = 'failed', error = ?, updated_at = ? WHERE job_id = ?",
+                        (f"任务已重试{row['attempts']}次仍未完成", now, row["job_id"])
+                    )
+                    conn.execute("COMMIT")
+                    return None
+
+                conn.execute(
+                    "UPDATE jobs SET status = 'running', worker_id = ?, lease_expires = ?, "
+                    "attempts = attempts + 1, updated_at = ? WHERE job_id = ?",
+                    (worker_id, now + JOB_LEASE_SECONDS, now, row["job_id"])
+                )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        return JobService.get_job(row["job_id"])
+
+    @staticmethod
+    def _update_job(job_id: str, **fields):
+        fields["updated_at"] = time.time()
+        for key in ("artifacts", "stage_timings"):
+            if key in fields:
+                fields[key] = json.dumps(fields[key], ensure_ascii=False)
+        assignments = ", ".join(f"{key} = ?" for key in fields)
+        with closing(_connect()) as conn:
+            conn.execute(
+                f"UPDATE jobs SET {assignments} WHERE job_id = ?",
+                list(fields.values()) + [job_id]
+            )
+
+    @staticmethod
+    def _run_stage(stage: str, params: Dict, artifacts: Dict) -> str:
+        """在该阶段的执行器中执行单个阶段，返回该阶段产出的结果ID"""
+        executor_stage = STAGE_EXECUTORS[stage]
+        if stage == "load":
+            from backend.services.loading_service import LoadingService
+            result = run_in_stage_sync(
+                executor_stage, LoadingService.load_file,
+                params["file_path"], params.get("method", "pymupdf"), params.get("content_hash"),
+                params.get("streaming", False), params.get("source_name")
+            )
+            return result["file_id"]
+        if stage == "chunk":
+            from backend.services.chunking_service import ChunkingService
+            result = run_in_stage_sync(
+                executor_stage, ChunkingService.chunk_document,
+                file_id=artifacts["file_id"],
+                chunking_strategy=params.get("chunking_strategy", "by_size"),
+                chunk_size=params.get("chunk_size", 1000),
+                overlap=params.get("overlap", 200)
+            )
+            return result["chunk_id"]
+        if stage == "embed":
+            from backend.services.embedding_service import EmbeddingService
+            # 流式任务的嵌入阶段同样流式执行，worker崩溃后重试时从断点继续
+            result = run_in_stage_sync(
+                executor_stage, EmbeddingService(params.get("embedding_model")).embed_chunks,
+                artifacts["chunk_id"], params.get("streaming", False)
+            )
+            return result["embedding_id"]
+        if stage == "index":
+            from backend.services.indexing_service import IndexingService
+            result = run_in_stage_sync(
+                executor_stage, IndexingService().index_embeddings,
+                artifacts["embedding_id"], params["collection_name"], params.get("document_key")
+            )
+            return result["index_id"]
+        raise ValueError(f"不支持的任务阶段: {stage}")
+
+    @staticmethod
+    def run_job(job: Dict) -> Dict:
+        """执行（或继续执行）任务，跳过结果已存在的阶段"""
+        job_id = job["job_id"]
+        params = job["params"]
+        artifacts = dict(job["artifacts"])
+        stage_timings = dict(job["stage_timings"])
+        stages = _planned_stages(params)
+
+        for position, stage in enumerate(stages):
+            module_name, artifact_key = STAGE_ARTIFACTS[stage]
+            # 已完成且结果文件仍存在的阶段直接跳过
+            if artifacts.get(artifact_key) and load_result(module_name, artifacts[artifact_key]):
+                continue
+
+            JobService._update_job(
+                job_id, stage=stage,
+                lease_expires=time.time() + JOB_LEASE_SECONDS
+            )
+            started = time.time()
+            try:
+                with _LeaseHeartbeat(job_id):
+                    artifacts[artifact_key] = JobService._run_stage(stage, params, artifacts)
+            except Exception as e:
+                JobService._stage_failed(job, f"{stage}阶段失败: {str(e)}", artifacts, stage_timings)
+                return JobService.get_job(job_id)
+
+            stage_timings[stage] = round(time.time() - started, 3)
+            JobService._update_job(
+                job_id, artifacts=artifacts, stage_timings=stage_timings,
+                progress=round((position + 1) / len(stages), 3)
+            )
+
+        JobService._update_job(
+            job_id, status="succeeded", stage=None, progress=1.0,
+            error=None, lease_expires=None, next_attempt_at=None
+        )
+        return JobService.get_job(job_id)
+
+    @staticmethod
+    def _stage_failed(job: Dict, error: str, artifacts: Dict, stage_timings: Dict):
+        """阶段失败：未达到 JOB_MAX_ATTEMPTS 时按指数退避重新排队，否则标记为失败
+
+        已完成阶段的结果ID会保留，重试时从失败的阶段继续。
+        """
+        job_id = job["job_id"]
+        attempts = job["attempts"]
+        if attempts < JOB_MAX_ATTEMPTS:
+            delay = JOB_RETRY_BACKOFF_SECONDS * 2 ** max(attempts - 1, 0)
+            print(f"警告: 任务 {job_id} {error}，{delay:g}秒后重试（已尝试{attempts}/{JOB_MAX_ATTEMPTS}次）")
+            JobService._update_job(
+                job_id, status="queued", error=error, artifacts=artifacts, stage_timings=stage_timings,
+                worker_id=None, lease_expires=None, next_attempt_at=time.time() + delay
+            )
+            return
+        JobService._update_job(
+            job_id, status="failed", error=error, artifacts=artifacts, stage_timings=stage_timings,
+            lease_expires=None
+        )
+
+    @staticmethod
+    def work_loop(stop_event: threading.Event, worker_id: Optional[str] = None):
+        """持续从队列中领取并执行任务，直到 stop_event 被设置"""
+        worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+        while not stop_event.is_set():
+            try:
+                job = JobService.claim_job(worker_id)
+            except Exception as e:
+                print(f"警告: 领取任务失败: {e}")
+                job = None
+            if job is None:
+                stop_event.wait(JOB_POLL_INTERVAL)
+                continue
+            try:
+                JobService.run_job(job)
+            except Exception as e:
+                # 例如更新任务状态时数据库被锁：记录后继续领取任务，该任务在租约过期后会被重新领取
+                print(f"警告: 执行任务 {job['job_id']} 时出错: {e}")
+                stop_event.wait(JOB_POLL_INTERVAL)
+
+
+_worker_threads = []
+_stop_event = threading.Event()
+
+
+def start_job_workers(count: int):
+    """在当前进程中启动任务处理线程"""
+    _stop_event.clear()
+    for i in range(count):
+        thread = threading.Thread(
+            target=JobService.work_loop, args=(_stop_event,),
+            name=f"job-worker-{i}", daemon=True
+        )
+        thread.start()
+        _worker_threads.append(thread)
+
+
+def stop_job_workers(timeout: float = 5.0):
+    """通知任务处理线程退出（正在执行的阶段会在租约过期后由其他worker接管）"""
+    _stop_event.set()
+    for thread in _worker_threads:
+        thread.join(timeout=timeout)
+    _worker_threads.clear()
@@ -0,0 +1,321 @@
+import math
+import os
+import re
+import sqlite3
+import threading
+import unicodedata
+from collections import Counter
+from contextlib import closing
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from backend.utils.config import LEXICAL_INDEX_PATH, BM25_K1, BM25_B
+
+# 英文/数字词（保留 ERR-404、v1.2.3 这类编号的整体，同时拆出各部分）和连续的中日韩文字
+_TOKEN = re.compile(r"[0-9a-z]+(?:[-_.:/#][0-9a-z]+)*|[㐀-䶿一-鿿豈-﫿]+")
+_TOKEN_SEPARATOR = re.compile(r"[-_.:/#]")
+
+
+def tokenize(text: str) -> List[str]:
+    """词法检索分词：NFKC规范化（全角转半角）并转小写，中文按二元组（bigram）切分"""
+    tokens = []
+    for token in _TOKEN.findall(unicodedata.normalize("NFKC", text or "").lower()):
+        if token[0] >= "㐀":
+            if len(token) == 1:
+                tokens.append(token)
+            else:
+                tokens.extend(token[i:i + 2] for i in range(len(token) - 1))
+            continue
+        tokens.append(token)
+        parts = _TOKEN_SEPARATOR.split(token)
+        if len(parts) > 1:
+            tokens.extend(part for part in parts if part)
+    return tokens
+
+
+def encode_postings(doc_nums: np.ndarray, tfs: np.ndarray) -> bytes:
+    """倒排表压缩：文档编号差分（delta）后与词频交替写成varint（每字节7位，最高位表示后面还有字节）"""
+    doc_nums = np.asarray(doc_nums, dtype=np.uint64)
+    values = np.empty(len(doc_nums) * 2, dtype=np.uint64)
+    values[0::2] = np.diff(doc_nums, prepend=np.uint64(0))
+    values[1::2] = np.asarray(tfs, dtype=np.uint64)
+
+    sizes = np.ones(len(values), dtype=np.int64)
+    rest = values >> np.uint64(7)
+    while rest.any():
+        sizes += rest > 0
+        rest >>= np.uint64(7)
+    # 每个输出字节对应的数值及其在该数值中的字节序号
+    owners = np.repeat(np.arange(len(values)), sizes)
+    byte_index = np.arange(int(sizes.sum())) - np.repeat(np.cumsum(sizes) - sizes, sizes)
+    payload = (values[owners] >> (np.uint64(7) * byte_index.astype(np.uint64))) & np.uint64(0x7F)
+    more = byte_index < sizes[owners] - 1
+    return (payload | np.where(more, np.uint64(0x80), np.uint64(0))).astype(np.uint8).tobytes()
+
+
+def decode_postings(data: bytes) -> Tuple[np.ndarray, np.ndarray]:
+    """解码 encode_postings 的结果，返回 (文档编号, 词频)"""
+    raw = np.frombuffer(data, dtype=np.uint8)
+    if not len(raw):
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    ends = np.flatnonzero(raw < 0x80)
+    starts = np.concatenate([[0], ends[:-1] + 1])
+    sizes = ends - starts + 1
+    byte_index = np.arange(len(raw)) - np.repeat(starts, sizes)
+    shifted = (raw & 0x7F).astype(np.uint64) << (np.uint64(7) * byte_index.astype(np.uint64))
+    values = np.add.reduceat(shifted, starts).astype(np.int64)
+    return np.cumsum(values[0::2]), values[1::2]
+
+
+class LexicalIndex:
+    """集合的BM25倒排索引（SQLite持久化，LEXICAL_INDEX_PATH/{集合名}.db）
+
+    每个文档分配一个递增的整数编号，倒排表按词保存为一个压缩的BLOB（见 encode_postings）。
+    写入和删除只改写涉及到的词的倒排表；检索时倒排表解码后按版本号缓存在进程内，
+    集合未变化时查询只做内存中的打分，不访问模型。
+    """
+
+    def __init__(self, name: str, path: str):
+        self.name = name
+        self.path = path
+        self._lock = threading.Lock()
+        self._reader = None
+        self._snapshot = None  # (version, 文档数, 平均长度, 各编号的文档长度, 各编号的文档ID)
+        self._postings = {}  # 当前版本已解码的倒排表及BM25权重 {词: (文档编号, 各文档的得分)}
+        self._num_by_id = None  # 当前版本的 {文档ID: 文档编号}（按元数据过滤时才构建）
+
+    def exists(self) -> bool:
+        return os.path.exists(self.path)
+
+    def _connect(self) -> sqlite3.Connection:
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS docs (num INTEGER PRIMARY KEY, id TEXT NOT NULL UNIQUE, "
+            "length INTEGER NOT NULL, terms TEXT NOT NULL)"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS postings (term TEXT PRIMARY KEY, df INTEGER NOT NULL, data BLOB NOT NULL)")
+        conn.executemany(
+            "INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+            [("version", "0"), ("next_num", "0")]
+        )
+        return conn
+
+    # ---- 写入 ----
+
+    def create(self):
+        """创建（空的）索引文件"""
+        with closing(self._connect()):
+            pass
+
+    def add(self, ids: List[str], documents: List[str]):
+        """写入文档（ID已存在时替换原文档）"""
+        if not ids:
+            return
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = self._remove(conn, ids)
+                next_num = int(conn.execute("SELECT value FROM meta WHERE key = 'next_num'").fetchone()[0])
+                added = {}
+                rows = []
+                for offset, (doc_id, document) in enumerate(zip(ids, documents)):
+                    num = next_num + offset
+                    counts = Counter(tokenize(document))
+                    rows.append((num, doc_id, sum(counts.values()), " ".join(counts)))
+                    for term, tf in counts.items():
+                        added.setdefault(term, []).append((num, tf))
+                conn.executemany("INSERT INTO docs (num, id, length, terms) VALUES (?, ?, ?, ?)", rows)
+                self._rewrite_postings(conn, removed, added)
+                conn.execute("UPDATE meta SET value = ? WHERE key = 'next_num'", (str(next_num + len(ids)),))
+                conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def delete(self, ids: List[str]):
+        if not ids:
+            return
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                removed = self._remove(conn, ids)
+                self._rewrite_postings(conn, removed, {})
+                conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    @staticmethod
+    def _remove(conn: sqlite3.Connection, ids: List[str]) -> Dict[str, List[int]]:
+        """删除文档记录，返回 {词: 需要从倒排表中移除的文档编号}"""
+        removed = {}
+        unique = list(dict.fromkeys(ids))
+        # 分批查询，避免超出SQLite的参数个数限制
+        for start in range(0, len(unique), 500):
+            batch = unique[start:start + 500]
+            placeholders = ", ".join("?" for _ in batch)
+            for num, terms in conn.execute(f"SELECT num, terms FROM docs WHERE id IN ({placeholders})", batch):
+                for term in terms.split():
+                    removed.setdefault(term, []).append(num)
+            conn.execute(f"DELETE FROM docs WHERE id IN ({placeholders})", batch)
+        return removed
+
+    @staticmethod
+    def _rewrite_postings(conn: sqlite3.Connection, removed: Dict[str, List[int]],
+                          added: Dict[str, List[Tuple[int, int]]]):
+        """只改写涉及到的词：解码原倒排表，去掉删除的文档，追加新文档（编号递增，顺序不变）"""
+        for term in set(removed) | set(added):
+            row = conn.execute("SELECT data FROM postings WHERE term = ?", (term,)).fetchone()
+            doc_nums, tfs = decode_postings(row[0]) if row else (np.zeros(0, np.int64), np.zeros(0, np.int64))
+            if term in removed:
+                keep = ~np.isin(doc_nums, removed[term])
+                doc_nums, tfs = doc_nums[keep], tfs[keep]
+            if term in added:
+                new_nums, new_tfs = zip(*added[term])
+                doc_nums = np.concatenate([doc_nums, np.asarray(new_nums, dtype=np.int64)])
+                tfs = np.concatenate([tfs, np.asarray(new_tfs, dtype=np.int64)])
+            if len(doc_nums):
+                conn.execute(
+                    "INSERT OR REPLACE INTO postings (term, df, data) VALUES (?, ?, ?)",
+                    (term, len(doc_nums), encode_postings(doc_nums, tfs))
+                )
+            else:
+                conn.execute("DELETE FROM postings WHERE term = ?", (term,))
+
+    # ---- 检索 ----
+
+    def _load_snapshot(self):
+        """当前版本的文档长度和ID（调用方持有 self._lock 并已在 self._reader 上开启读事务），
+        版本变化时丢弃已解码的倒排表"""
+        version = int(self._reader.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0])
+        if self._snapshot is not None and self._snapshot[0] == version:
+            return self._snapshot
+        rows = self._reader.execute("SELECT num, id, length FROM docs").fetchall()
+        size = max((row[0] for row in rows), default=-1) + 1
+        lengths = np.zeros(size, dtype=np.float32)
+        doc_ids = np.empty(size, dtype=object)
+        for num, doc_id, length in rows:
+            lengths[num] = length
+            doc_ids[num] = doc_id
+        average_length = float(lengths.sum()) / len(rows) if rows else 0.0
+        self._snapshot = (version, len(rows), average_length, lengths, doc_ids)
+        self._postings = {}
+        self._num_by_id = None
+        return self._snapshot
+
+    def _term_postings(self, term: str) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """词的 (文档编号, BM25得分)；得分只与文档有关，解码时一次算好，查询时直接累加"""
+        if term not in self._postings:
+            row = self._reader.execute("SELECT data FROM postings WHERE term = ?", (term,)).fetchone()
+            if row is None:
+                self._postings[term] = None
+            else:
+                _, doc_count, average_length, lengths, _ = self._snapshot
+                doc_nums, tfs = decode_postings(row[0])
+                idf = math.log(1 + (doc_count - len(doc_nums) + 0.5) / (len(doc_nums) + 0.5))
+                norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths[doc_nums] / max(average_length, 1e-9))
+                weights = (idf * tfs * (BM25_K1 + 1) / (tfs + norm)).astype(np.float32)
+                self._postings[term] = (doc_nums, weights)
+        return self._postings[term]
+
+    def search(self, query_texts: Iterable[str], n_results: int = 10,
+               allowed_ids: Optional[Iterable[str]] = None) -> List[List[Tuple[str, float]]]:
+        """BM25检索，返回每个查询的 [(文档ID, 分数)]（按分数降序）
+
+        allowed_ids 不为None时只在这些文档中检索（元数据过滤的结果），在打分时直接屏蔽其他文档
+        """
+        with self._lock:
+            if self._reader is None:
+                self._reader = self._connect()
+            # 版本号、文档长度和倒排表在同一个读事务中读取，避免并发写入后读到不属于当前快照的文档编号
+            self._reader.execute("BEGIN")
+            try:
+                results = self._search(query_texts, n_results, allowed_ids)
+            finally:
+                self._reader.execute("COMMIT")
+        return results
+
+    def _search(self, query_texts: Iterable[str], n_results: int,
+                allowed_ids: Optional[Iterable[str]]) -> List[List[Tuple[str, float]]]:
+        """在读事务内检索（调用方持有 self._lock）"""
+        results = []
+        _, _, _, lengths, doc_ids = self._load_snapshot()
+        allowed = None
+        if allowed_ids is not None:
+            if self._num_by_id is None:
+                self._num_by_id = {doc_id: num for num, doc_id in enumerate(doc_ids) if doc_id is not None}
+            allowed = np.zeros(len(lengths), dtype=bool)
+            allowed[[self._num_by_id[doc_id] for doc_id in allowed_ids if doc_id in self._num_by_id]] = True
+        for query_text in query_texts:
+            matched = [
+                (query_tf, postings) for term, query_tf in Counter(tokenize(query_text)).items()
+                if (postings := self._term_postings(term)) is not None
+            ]
+            if not matched:
+                results.append([])
+                continue
+            if len(matched) == 1:
+                # 单个词直接在其倒排表上取前k个
+                query_tf, (candidates, weights) = matched[0]
+                totals = weights * query_tf
+                if allowed is not None:
+                    keep = allowed[candidates]
+                    candidates, totals = candidates[keep], totals[keep]
+            else:
+                # 多个词在按文档编号索引的稠密数组上累加（同一倒排表内文档编号不重复）
+                totals = np.zeros(len(lengths), dtype=np.float32)
+                for query_tf, (doc_nums, weights) in matched:
+                    totals[doc_nums] += weights * query_tf
+                if allowed is not None:
+                    totals[~allowed] = 0
+                candidates = np.flatnonzero(totals)
+                totals = totals[candidates]
+            k = min(n_results, len(candidates))
+            if k <= 0:
+                results.append([])
+                continue
+            top = np.argpartition(-totals, k - 1)[:k]
+            top = top[np.argsort(-totals[top])]
+            results.append([(doc_ids[candidates[i]], float(totals[i])) for i in top])
+        return results
+
+    def close(self):
+        with self._lock:
+            if self._reader is not None:
+                self._reader.close()
+                self._reader = None
+            self._snapshot = None
+            self._postings = {}
+
+
+_indexes: Dict[str, LexicalIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_lexical_index(collection_name: str) -> LexicalIndex:
+    """获取集合的词法索引（索引文件在首次写入时创建）"""
+    with _indexes_lock:
+        index = _indexes.get(collection_name)
+        if index is None:
+            index = _indexes[collection_name] = LexicalIndex(
+                collection_name, os.path.join(LEXICAL_INDEX_PATH, f"{collection_name}.db")
+            )
+        return index
+
+
+def drop_lexical_index(collection_name: str):
+    """删除集合的词法索引文件"""
+    with _indexes_lock:
+        index = _indexes.pop(collection_name, None)
+    if index is None:
+        index = LexicalIndex(collection_name, os.path.join(LEXICAL_INDEX_PATH, f"{collection_name}.db"))
+    index.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.exists(index.path + suffix):
+            os.remove(index.path + suffix)
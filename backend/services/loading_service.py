@@ -1,32 +1,146 @@
+import multiprocessing
 import os
+import threading
 import uuid
-from typing import List, Dict, Optional
-import fitz  # PyMuPDF
-from pypdf import PdfReader
-from unstructured.partition.auto import partition
-from backend.utils.storage import save_result
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from itertools import islice
+from typing import Iterator, List, Dict, Optional
+from backend.utils.config import PARALLEL_LOADING_WORKERS, PARALLEL_LOADING_PAGE_THRESHOLD
+from backend.utils.hashing import file_sha256
+from backend.utils.startup import timed_import
+from backend.utils.storage import (
+    save_result, load_result, find_result_by_content,
+    save_result_stream, iter_result_stream, stream_file_name
+)
 
+# 流式加载时在响应中返回的预览条数
+STREAM_PREVIEW_SIZE = 3
 
-class LoadingService:
-    """文档加载服务，支持PyMuPDF、PyPDF和Unstructured"""
 
-    @staticmethod
-    def load_with_pymupdf(file_path: str) -> Dict:
-        """使用PyMuPDF加载PDF文档"""
-        doc = fitz.open(file_path)
-        pages = []
-        for page_num in range(len(doc)):
+def _iter_pymupdf_pages(file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Dict]:
+    """使用PyMuPDF逐页提取 [start, end) 范围内的页面（每个进程各自打开文档）"""
+    fitz = timed_import("fitz")  # PyMuPDF，首次使用时才导入
+    with fitz.open(file_path) as doc:
+        end = len(doc) if end is None else end
+        for page_num in range(start, end):
             page = doc[page_num]
             text = page.get_text()
-            pages.append({
+            yield {
                 "page_number": page_num + 1,
                 "text": text,
                 "metadata": {
                     "width": page.rect.width,
                     "height": page.rect.height
                 }
-            })
-        doc.close()
+            }
+
+
+def _iter_pypdf_pages(file_path: str, start: int = 0, end: Optional[int] = None) -> Iterator[Dict]:
+    """使用PyPDF逐页提取 [start, end) 范围内的页面（每个进程各自打开文档）"""
+    reader = timed_import("pypdf").PdfReader(file_path)
+    end = len(reader.pages) if end is None else end
+    for page_num in range(start, end):
+        page = reader.pages[page_num]
+        text = page.extract_text()
+        # 转为普通的int/float列表，便于跨进程传递，JSON输出与原对象一致
+        media_box = [
+            int(value) if isinstance(value, int) else float(value)
+            for value in page.mediabox
+        ] if hasattr(page, 'mediabox') else None
+        yield {
+            "page_number": page_num + 1,
+            "text": text,
+            "metadata": {
+                "media_box": media_box
+            }
+        }
+
+
+def _iter_unstructured_elements(file_path: str) -> Iterator[Dict]:
+    """使用Unstructured逐个转换文档元素"""
+    partition = timed_import("unstructured.partition.auto").partition
+    for elem in partition(filename=file_path):
+        yield {
+            "type": elem.category if hasattr(elem, 'category') else "unknown",
+            "text": str(elem),
+            "metadata": elem.metadata.to_dict() if hasattr(elem, 'metadata') else {}
+        }
+
+
+def _pymupdf_pages(file_path: str, start: int, end: int) -> List[Dict]:
+    return list(_iter_pymupdf_pages(file_path, start, end))
+
+
+def _pypdf_pages(file_path: str, start: int, end: int) -> List[Dict]:
+    return list(_iter_pypdf_pages(file_path, start, end))
+
+
+# 并行提取页面的进程池：每个进程只创建一次并在多次加载之间复用（加载本身通常运行在cpu阶段的子进程中）
+_page_pool = None
+_page_pool_lock = threading.Lock()
+
+
+def _get_page_pool() -> ProcessPoolExecutor:
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is None:
+            # 使用spawn启动子进程，避免在多线程的进程中fork
+            _page_pool = ProcessPoolExecutor(
+                max_workers=PARALLEL_LOADING_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _page_pool
+
+
+def _discard_page_pool(pool: ProcessPoolExecutor):
+    global _page_pool
+    with _page_pool_lock:
+        if _page_pool is pool:
+            _page_pool = None
+    pool.shutdown(wait=False)
+
+
+def shutdown_page_pool(wait: bool = True):
+    """关闭并行提取页面的进程池（应用退出时调用）"""
+    global _page_pool
+    with _page_pool_lock:
+        pool, _page_pool = _page_pool, None
+    if pool is not None:
+        pool.shutdown(wait=wait)
+
+
+def _extract_pages(extract_func, file_path: str, page_count: int) -> List[Dict]:
+    """提取所有页面：页数达到阈值时按页范围拆分到进程池并行提取，再按页码顺序合并"""
+    workers = min(PARALLEL_LOADING_WORKERS, page_count)
+    if workers <= 1 or page_count < PARALLEL_LOADING_PAGE_THRESHOLD:
+        return extract_func(file_path, 0, page_count)
+
+    # 连续的页范围，保证合并后页序与串行提取一致
+    step = -(-page_count // workers)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+    pool = _get_page_pool()
+    try:
+        futures = [pool.submit(extract_func, file_path, start, end) for start, end in ranges]
+        pages = []
+        for future in futures:
+            pages.extend(future.result())
+    except BrokenProcessPool:
+        # 子进程异常退出后进程池不可再用，丢弃以便下次重建
+        _discard_page_pool(pool)
+        raise ValueError("并行加载的工作进程异常退出，请重试")
+    return pages
+
+
+class LoadingService:
+    """文档加载服务，支持PyMuPDF、PyPDF和Unstructured"""
+
+    @staticmethod
+    def load_with_pymupdf(file_path: str) -> Dict:
+        """使用PyMuPDF加载PDF文档"""
+        with timed_import("fitz").open(file_path) as doc:
+            page_count = len(doc)
+        pages = _extract_pages(_pymupdf_pages, file_path, page_count)
         return {
             "method": "pymupdf",
             "total_pages": len(pages),
@@ -36,17 +150,8 @@ class LoadingService:
     @staticmethod
     def load_with_pypdf(file_path: str) -> Dict:
         """使用PyPDF加载PDF文档"""
-        reader = PdfReader(file_path)
-        pages = []
-        for page_num, page in enumerate(reader.pages):
-            text = page.extract_text()
-            pages.append({
-                "page_number": page_num + 1,
-                "text": text,
-                "metadata": {
-                    "media_box": page.mediabox if hasattr(page, 'mediabox') else None
-                }
-            })
+        page_count = len(timed_import("pypdf").PdfReader(file_path).pages)
+        pages = _extract_pages(_pypdf_pages, file_path, page_count)
         return {
             "method": "pypdf",
             "total_pages": len(pages),
@@ -56,14 +161,7 @@ class LoadingService:
     @staticmethod
     def load_with_unstructured(file_path: str) -> Dict:
         """使用Unstructured加载文档"""
-        elements = partition(filename=file_path)
-        chunks = []
-        for elem in elements:
-            chunks.append({
-                "type": elem.category if hasattr(elem, 'category') else "unknown",
-                "text": str(elem),
-                "metadata": elem.metadata.to_dict() if hasattr(elem, 'metadata') else {}
-            })
+        chunks = list(_iter_unstructured_elements(file_path))
         return {
             "method": "unstructured",
             "total_chunks": len(chunks),
@@ -71,21 +169,76 @@ class LoadingService:
         }
 
     @staticmethod
-    def load_file(file_path: str, method: str = "pymupdf") -> Dict:
+    def iter_units(file_path: str, method: str) -> Iterator[Dict]:
+        """逐个产出页面（PDF）或元素（Unstructured），用于流式加载"""
+        if method == "pymupdf":
+            return _iter_pymupdf_pages(file_path)
+        if method == "pypdf":
+            return _iter_pypdf_pages(file_path)
+        if method == "unstructured":
+            return _iter_unstructured_elements(file_path)
+        raise ValueError(f"不支持的加载方法: {method}")
+
+    @staticmethod
+    def iter_document_units(loading_result: Dict) -> Iterator[Dict]:
+        """惰性遍历加载结果中的页面/元素
+
+        流式加载的结果从JSONL文件逐行读取，普通结果直接遍历内存中的列表，
+        下游的分块和解析阶段统一通过这里读取加载结果。
+        """
+        result = loading_result["result"]
+        if result.get("streamed"):
+            return iter_result_stream("loading", loading_result["file_id"])
+        if result["method"] == "unstructured":
+            return iter(result.get("chunks", []))
+        return iter(result.get("pages", []))
+
+    @staticmethod
+    def load_file(file_path: str, method: str = "pymupdf", content_hash: Optional[str] = None,
+                  streaming: bool = False, source_name: Optional[str] = None) -> Dict:
         """加载文件
         
         Args:
             file_path: 文件路径
             method: 加载方法 (pymupdf, pypdf, unstructured)
+            content_hash: 文件内容的SHA-256（上传时已计算则直接传入，否则在此计算）
+            streaming: 流式加载，页面/元素边提取边追加写入JSONL文件，
+                返回结果中只包含统计信息和前几项预览，适用于超大文档
+            source_name: 文件的来源名称（上传时的原始文件名，默认为文件名），
+                索引阶段据此识别同一文件的重新摄取
         
         Returns:
-            包含加载结果的字典
+            包含加载结果的字典；相同内容、相同加载方法的文件直接返回已有结果（cached为True）
         """
         if not os.path.exists(file_path):
             raise FileNotFoundError(f"文件不存在: {file_path}")
 
+        content_hash = content_hash or file_sha256(file_path)
+        content_key = f"{content_hash}:{method}:stream" if streaming else f"{content_hash}:{method}"
+        cached_id = find_result_by_content("loading", content_key)
+        if cached_id:
+            cached = load_result("loading", cached_id)
+            if cached:
+                response = {
+                    "file_id": cached_id,
+                    "file_name": cached["file_name"],
+                    "method": method,
+                    "status": "success",
+                    "cached": True,
+                    "result": cached["result"]
+                }
+                if streaming:
+                    response["preview"] = list(islice(LoadingService.iter_document_units(cached), STREAM_PREVIEW_SIZE))
+                return response
+
         file_id = str(uuid.uuid4())
         file_name = os.path.basename(file_path)
+        source_name = source_name or file_name
+
+        if streaming:
+            return LoadingService._load_file_streaming(
+                file_path, method, file_id, file_name, content_hash, content_key, source_name
+            )
 
         if method == "pymupdf":
             result = LoadingService.load_with_pymupdf(file_path)
@@ -101,7 +254,10 @@ class LoadingService:
             "file_id": file_id,
             "file_name": file_name,
             "file_path": file_path,
+            "source_name": source_name,
             "loading_method": method,
+            "content_hash": content_hash,
+            "content_key": content_key,
             "result": result
         }
 
@@ -112,5 +268,49 @@ class LoadingService:
             "file_name": file_name,
             "method": method,
             "status": "success",
+            "cached": False,
             "result": result
         }
+
+    @staticmethod
+    def _load_file_streaming(file_path: str, method: str, file_id: str, file_name: str,
+                             content_hash: str, content_key: str, source_name: str) -> Dict:
+        """流式加载：页面/元素逐个写入 loading/{file_id}.jsonl，JSON结果中只保存统计信息"""
+        preview = []
+
+        def units():
+            for unit in LoadingService.iter_units(file_path, method):
+                if len(preview) < STREAM_PREVIEW_SIZE:
+                    preview.append(unit)
+                yield unit
+
+        total = save_result_stream("loading", file_id, units())
+        result = {
+            "method": method,
+            "streamed": True,
+            "stream_file": stream_file_name(file_id)
+        }
+        result["total_chunks" if method == "unstructured" else "total_pages"] = total
+
+        result_data = {
+            "file_id": file_id,
+            "file_name": file_name,
+            "file_path": file_path,
+            "source_name": source_name,
+            "loading_method": method,
+            "content_hash": content_hash,
+            "content_key": content_key,
+            "result": result
+        }
+
+        save_result("loading", file_id, result_data)
+
+        return {
+            "file_id": file_id,
+            "file_name": file_name,
+            "method": method,
+            "status": "success",
+            "cached": False,
+            "result": result,
+            "preview": preview
+        }
@@ -0,0 +1,144 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List
+
+from backend.utils.config import EMBEDDING_MODEL_MEMORY_MB
+
+# 保留最近的加载/淘汰事件条数
+MAX_EVENTS = 200
+
+
+def _current_rss() -> int:
+    """当前进程常驻内存（字节），无法获取时返回0"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+def _model_size(model, rss_delta: int) -> int:
+    """估算模型占用的内存：PyTorch模型按参数字节数计算，其余（如ONNX）使用加载前后的内存增量"""
+    try:
+        size = sum(param.numel() * param.element_size() for param in model.parameters())
+    except Exception:
+        size = 0
+    return size or max(rss_delta, 0)
+
+
+class EmbeddingModelRegistry:
+    """已加载embedding模型的注册表
+
+    模型按需加载，按最近使用顺序（LRU）在内存预算内淘汰；
+    加载、淘汰和加载失败事件都会记录下来，供 /api/system/metrics 查看。
+    正在编码中的调用方仍持有模型引用，淘汰只是让注册表不再保留它。
+    """
+
+    def __init__(self, budget_mb: int = EMBEDDING_MODEL_MEMORY_MB):
+        self.budget_bytes = budget_mb * 1024 * 1024
+        self._models = OrderedDict()  # model_key -> {"model", "size", "loaded_at", "last_used", "uses"}
+        self._lock = threading.Lock()
+        self._loading_locks = {}
+        self._events = deque(maxlen=MAX_EVENTS)
+
+    def get(self, model_key: str, loader: Callable[[], object]):
+        """获取模型，未加载时调用 loader 加载（同一模型只会被加载一次）"""
+        with self._lock:
+            entry = self._touch(model_key)
+            if entry is not None:
+                return entry["model"]
+            loading_lock = self._loading_locks.setdefault(model_key, threading.Lock())
+
+        with loading_lock:
+            with self._lock:
+                entry = self._touch(model_key)
+                if entry is not None:
+                    return entry["model"]
+
+            started = time.perf_counter()
+            rss_before = _current_rss()
+            try:
+                model = loader()
+            except Exception as e:
+                self._record("load_failed", model_key, error=str(e))
+                raise
+            seconds = time.perf_counter() - started
+            size = _model_size(model, _current_rss() - rss_before)
+
+            with self._lock:
+                self._evict_for(size)
+                now = time.time()
+                self._models[model_key] = {
+                    "model": model, "size": size, "loaded_at": now, "last_used": now, "uses": 1
+                }
+                self._record("load", model_key, size=size, seconds=seconds)
+        return model
+
+    def is_loaded(self, model_key: str) -> bool:
+        with self._lock:
+            return model_key in self._models
+
+    def evict(self, model_key: str) -> bool:
+        """手动淘汰模型"""
+        with self._lock:
+            entry = self._models.pop(model_key, None)
+            if entry is not None:
+                self._record("evict", model_key, size=entry["size"], reason="manual")
+            return entry is not None
+
+    def _touch(self, model_key: str):
+        entry = self._models.get(model_key)
+        if entry is not None:
+            self._models.move_to_end(model_key)
+            entry["last_used"] = time.time()
+            entry["uses"] += 1
+        return entry
+
+    def _evict_for(self, size: int):
+        """淘汰最久未使用的模型，直到能放下新模型（单个模型超出预算时清空其余模型后仍然加载）"""
+        used = sum(entry["size"] for entry in self._models.values())
+        while self._models and used + size > self.budget_bytes:
+            model_key, entry = self._models.popitem(last=False)
+            used -= entry["size"]
+            self._record("evict", model_key, size=entry["size"], reason="memory_budget")
+        if size > self.budget_bytes:
+            print(f"警告: embedding模型占用内存({size / 1024 / 1024:.0f}MB)超出预算({self.budget_bytes / 1024 / 1024:.0f}MB)")
+
+    def _record(self, event: str, model_key: str, size: int = 0, seconds: float = None,
+                reason: str = None, error: str = None):
+        record = {"event": event, "model": model_key, "time": time.time()}
+        if size:
+            record["size_mb"] = round(size / 1024 / 1024, 2)
+        if seconds is not None:
+            record["seconds"] = round(seconds, 3)
+        if reason:
+            record["reason"] = reason
+        if error:
+            record["error"] = error
+        self._events.append(record)
+        print(f"embedding模型{event}: {model_key}" + (f"（{reason}）" if reason else ""))
+
+    def stats(self, events: int = 50) -> Dict:
+        with self._lock:
+            models: List[Dict] = [
+                {
+                    "model": model_key,
+                    "size_mb": round(entry["size"] / 1024 / 1024, 2),
+                    "loaded_at": entry["loaded_at"],
+                    "last_used": entry["last_used"],
+                    "uses": entry["uses"]
+                }
+                for model_key, entry in reversed(self._models.items())
+            ]
+            recent_events = list(self._events)[-events:]
+        return {
+            "budget_mb": round(self.budget_bytes / 1024 / 1024, 2),
+            "used_mb": round(sum(model["size_mb"] for model in models), 2),
+            "models": models,
+            "events": recent_events
+        }
+
+
+model_registry = EmbeddingModelRegistry()
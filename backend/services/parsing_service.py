@@ -1,5 +1,7 @@
 import uuid
 from typing import List, Dict, Optional
+from backend.services.document_text_service import DocumentTextService
+from backend.services.loading_service import LoadingService
 from backend.utils.storage import save_result, load_result
 
 
@@ -9,17 +11,7 @@ class ParsingService:
     @staticmethod
     def parse_full_text(file_id: str) -> Dict:
         """全文解析"""
-        loading_result = load_result("loading", file_id)
-        if not loading_result:
-            raise ValueError(f"未找到文件ID: {file_id} 的加载结果")
-
-        full_text = ""
-        if loading_result["result"]["method"] in ["pymupdf", "pypdf"]:
-            for page in loading_result["result"]["pages"]:
-                full_text += page["text"] + "\n"
-        elif loading_result["result"]["method"] == "unstructured":
-            for chunk in loading_result["result"]["chunks"]:
-                full_text += chunk["text"] + "\n"
+        full_text = DocumentTextService.get_document_text(file_id)["text"]
 
         parse_id = str(uuid.uuid4())
         result_data = {
@@ -50,7 +42,7 @@ class ParsingService:
             raise ValueError("按页解析仅支持PDF文档")
 
         pages = []
-        for page_data in loading_result["result"]["pages"]:
+        for page_data in LoadingService.iter_document_units(loading_result):
             pages.append({
                 "page_number": page_data["page_number"],
                 "text": page_data["text"],
@@ -79,18 +71,8 @@ class ParsingService:
     @staticmethod
     def parse_by_title(file_id: str) -> Dict:
         """按标题解析（简单实现，可根据需要扩展）"""
-        loading_result = load_result("loading", file_id)
-        if not loading_result:
-            raise ValueError(f"未找到文件ID: {file_id} 的加载结果")
-
-        # 提取文本
-        text = ""
-        if loading_result["result"]["method"] in ["pymupdf", "pypdf"]:
-            for page in loading_result["result"]["pages"]:
-                text += page["text"] + "\n"
-        elif loading_result["result"]["method"] == "unstructured":
-            for chunk in loading_result["result"]["chunks"]:
-                text += chunk["text"] + "\n"
+        # 提取文本（共用缓存的文档全文）
+        text = DocumentTextService.get_document_text(file_id)["text"]
 
         # 简单的标题识别（根据行首的特殊格式）
         import re
@@ -148,7 +130,7 @@ class ParsingService:
 
         # 使用unstructured的方法，它可以更好地识别表格
         if loading_result["result"]["method"] == "unstructured":
-            elements = loading_result["result"]["chunks"]
+            elements = LoadingService.iter_document_units(loading_result)
             tables = []
             texts = []
 
@@ -0,0 +1,137 @@
+import asyncio
+from collections import Counter
+from typing import Callable, Dict, List, Optional
+
+import numpy as np
+
+from backend.utils.config import QUERY_BATCH_WINDOW_MS, QUERY_BATCH_MAX_SIZE, QUERY_BATCH_MAX_QUEUE
+from backend.utils.executor import run_in_stage
+
+
+class QueryQueueFullError(ValueError):
+    """等待编码的查询数超过队列上限"""
+
+
+class QueryEmbeddingBatcher:
+    """查询embedding微批处理器
+
+    短时间窗口内并发到达的查询合并为一次 embed_queries 调用（一次前向计算），
+    再把各自的向量分发给对应的调用方。只能在事件循环中使用。
+    """
+
+    def __init__(self, encode: Callable[[List[str]], np.ndarray],
+                 window_ms: float = QUERY_BATCH_WINDOW_MS,
+                 max_batch_size: int = QUERY_BATCH_MAX_SIZE,
+                 max_queue: int = QUERY_BATCH_MAX_QUEUE):
+        self.encode = encode
+        self.window_ms = window_ms
+        self.max_batch_size = max(1, max_batch_size)
+        self.max_queue = max_queue
+        self._pending = []  # [(query_text, future)]
+        self._outstanding = 0  # 等待中和正在编码的查询数
+        self._tasks = set()  # 正在执行的批次任务（保留引用，避免任务被垃圾回收）
+        self._timer = None
+        self._batches = 0
+        self._queries = 0
+        self._rejected = 0
+        self._max_queue_depth = 0
+        self._batch_sizes = Counter()
+
+    async def embed(self, query_text: str) -> List[float]:
+        """获取单条查询的向量（与同一窗口内的其他查询合并编码）"""
+        if self.window_ms <= 0 or self.max_batch_size <= 1:
+            embeddings = await self._encode_batch([query_text])
+            return embeddings[0].tolist()
+
+        # 已提交但查询编码线程尚未处理完的批次同样计入队列深度
+        if self._outstanding >= self.max_queue:
+            self._rejected += 1
+            raise QueryQueueFullError(f"查询队列已满（{self.max_queue}），请稍后重试")
+
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((query_text, future))
+        self._outstanding += 1
+        self._max_queue_depth = max(self._max_queue_depth, self._outstanding)
+
+        if len(self._pending) >= self.max_batch_size:
+            self._flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.window_ms / 1000, self._flush)
+        return await future
+
+    def _flush(self):
+        """取出等待中的查询（每批最多 max_batch_size 条）提交编码"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        while self._pending:
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            task = asyncio.ensure_future(self._run_batch(batch))
+            self._tasks.add(task)
+            task.add_done_callback(self._batch_done)
+
+    def _batch_done(self, task: asyncio.Task):
+        self._tasks.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"警告: 查询批次编码任务异常: {task.exception()}")
+
+    async def _run_batch(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = await self._encode_batch(texts)
+            for (_, future), embedding in zip(batch, embeddings):
+                if not future.done():
+                    future.set_result(embedding.tolist())
+        except asyncio.CancelledError:
+            for _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+        finally:
+            self._outstanding -= len(batch)
+
+    async def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        self._batches += 1
+        self._queries += len(texts)
+        self._batch_sizes[len(texts)] += 1
+        return await run_in_stage("query", self.encode, texts)
+
+    def stats(self) -> Dict:
+        """批处理配置与观测到的批大小分布"""
+        return {
+            "window_ms": self.window_ms,
+            "max_batch_size": self.max_batch_size,
+            "max_queue": self.max_queue,
+            "queue_depth": self._outstanding,
+            "pending": len(self._pending),
+            "in_flight_batches": len(self._tasks),
+            "max_queue_depth": self._max_queue_depth,
+            "batches": self._batches,
+            "queries": self._queries,
+            "rejected": self._rejected,
+            "avg_batch_size": round(self._queries / self._batches, 3) if self._batches else 0.0,
+            "batch_sizes": {str(size): count for size, count in sorted(self._batch_sizes.items())}
+        }
+
+
+# 模型标识 -> 批处理器（不同模型的查询分别合并）
+_query_batchers: Dict[str, QueryEmbeddingBatcher] = {}
+
+
+def get_query_batcher(model_name: Optional[str] = None, backend: Optional[str] = None) -> QueryEmbeddingBatcher:
+    """获取指定embedding模型的查询批处理器（未指定时使用默认模型）"""
+    from backend.services.embedding_service import EmbeddingService
+    service = EmbeddingService(model_name, backend)
+    batcher = _query_batchers.get(service.model_key)
+    if batcher is None:
+        batcher = _query_batchers[service.model_key] = QueryEmbeddingBatcher(service.embed_queries)
+    return batcher
+
+
+def query_batcher_stats() -> Dict:
+    """各模型批处理器的指标"""
+    return {model_key: batcher.stats() for model_key, batcher in _query_batchers.items()}
@@ -0,0 +1,86 @@
+import json
+import sqlite3
+import threading
+from typing import Dict, Optional
+
+from backend.utils.config import COLLECTION_VERSIONS_DB_PATH, SEARCH_CACHE_MAX_MB, SEARCH_CACHE_TTL_SECONDS
+from backend.utils.lru_cache import ByteLRUCache
+
+
+class CollectionVersions:
+    """集合版本号（SQLite持久化，API进程和worker进程共享）
+
+    集合的内容每次变化（写入、删除）版本号加1。搜索缓存的键包含查询开始时读到的版本号，
+    版本号变化后旧条目不会再被命中。
+    """
+
+    def __init__(self, path: str = COLLECTION_VERSIONS_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        self._reader = None
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("CREATE TABLE IF NOT EXISTS versions (collection_name TEXT PRIMARY KEY, version INTEGER NOT NULL)")
+        return conn
+
+    def get(self, collection_name: str) -> int:
+        # 复用同一个只读连接，查询一次版本号只需要几十微秒
+        with self._lock:
+            if self._reader is None:
+                self._reader = self._connect()
+            row = self._reader.execute(
+                "SELECT version FROM versions WHERE collection_name = ?", (collection_name,)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def bump(self, collection_name: str) -> int:
+        conn = self._connect()
+        try:
+            conn.execute(
+                "INSERT INTO versions (collection_name, version) VALUES (?, 1) "
+                "ON CONFLICT(collection_name) DO UPDATE SET version = version + 1",
+                (collection_name,)
+            )
+            return conn.execute(
+                "SELECT version FROM versions WHERE collection_name = ?", (collection_name,)
+            ).fetchone()[0]
+        finally:
+            conn.close()
+
+
+collection_versions = CollectionVersions()
+# 搜索结果缓存：值为结果的JSON字节（不可变，命中时直接作为响应体返回，调用方之间不共享可变对象）
+search_result_cache = ByteLRUCache(SEARCH_CACHE_MAX_MB * 1024 * 1024, SEARCH_CACHE_TTL_SECONDS)
+
+
+def search_cache_key(collection_name: str, query_text: str, n_results: int, mode: str = "vector",
+                     where: Optional[Dict] = None, model: Optional[str] = None) -> tuple:
+    """缓存键：(集合名, 集合版本号, 查询参数)
+
+    版本号在查询之前读取：查询期间集合被改写时，结果记在旧版本下，不会再被命中。
+    需要读取SQLite，应在io线程池中调用。
+    """
+    return (
+        collection_name, collection_versions.get(collection_name), query_text, n_results, mode,
+        json.dumps(where, sort_keys=True, ensure_ascii=False) if where else None, model
+    )
+
+
+def cache_search_result(key: tuple, result: Dict) -> bytes:
+    """将结果序列化为JSON字节并存入缓存，返回序列化后的字节（应在io线程池中调用）"""
+    body = json.dumps(result, ensure_ascii=False, default=str).encode("utf-8")
+    search_result_cache.put(key, body, len(body))
+    return body
+
+
+def bump_collection_version(collection_name: str) -> int:
+    """集合内容变化后调用：版本号加1，并释放本进程中该集合的缓存条目"""
+    version = collection_versions.bump(collection_name)
+    search_result_cache.invalidate_where(lambda key: key[0] == collection_name)
+    return version
+
+
+def search_cache_stats() -> Dict:
+    return search_result_cache.stats()
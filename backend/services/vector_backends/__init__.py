@@ -0,0 +1,60 @@
+"""向量索引后端
+
+chroma:      Chroma持久化数据库（默认）
+numpy:       NumPy进程内精确检索（内存映射float32矩阵，分块矩阵乘 + argpartition）
+numpy-hnsw:  与numpy相同的存储，使用 hnswlib 图索引做近似检索（需要安装hnswlib）
+
+每个集合使用的后端由 VECTOR_BACKEND（默认）和 VECTOR_COLLECTION_BACKENDS（按集合指定）配置。
+"""
+import threading
+from typing import Dict, List
+
+from backend.utils.config import VECTOR_BACKEND, VECTOR_COLLECTION_BACKENDS
+from backend.services.vector_backends.base import VectorBackend, VectorCollection, normalize_where
+from backend.services.vector_backends.chroma_backend import ChromaBackend
+from backend.services.vector_backends.numpy_backend import NumpyBackend, NumpyCollection
+
+VECTOR_BACKENDS = {
+    "chroma": ChromaBackend,
+    "numpy": lambda: NumpyBackend(hnsw=False),
+    "numpy-hnsw": lambda: NumpyBackend(hnsw=True),
+}
+
+_backends: Dict[str, VectorBackend] = {}
+_lock = threading.Lock()
+
+
+def get_vector_backend(name: str = VECTOR_BACKEND) -> VectorBackend:
+    """获取（必要时创建）指定名称的向量索引后端"""
+    if name not in VECTOR_BACKENDS:
+        raise ValueError(f"不支持的向量索引后端: {name}，可选: {', '.join(VECTOR_BACKENDS)}")
+    backend = _backends.get(name)
+    if backend is None:
+        with _lock:
+            backend = _backends.get(name)
+            if backend is None:
+                backend = _backends[name] = VECTOR_BACKENDS[name]()
+    return backend
+
+
+def backend_name_for_collection(collection_name: str) -> str:
+    """集合使用的后端名称"""
+    return VECTOR_COLLECTION_BACKENDS.get(collection_name, VECTOR_BACKEND)
+
+
+def configured_backend_names() -> List[str]:
+    """配置中用到的全部后端（列出集合时逐个查询）
+
+    numpy 和 numpy-hnsw 共用同一存储目录，只保留其中一个，避免同一集合被列出两次。
+    """
+    names = list(dict.fromkeys([VECTOR_BACKEND] + list(VECTOR_COLLECTION_BACKENDS.values())))
+    if "numpy" in names and "numpy-hnsw" in names:
+        names.remove("numpy-hnsw")
+    return names
+
+
+__all__ = [
+    "VectorBackend", "VectorCollection", "ChromaBackend", "NumpyBackend", "NumpyCollection",
+    "VECTOR_BACKENDS", "get_vector_backend", "backend_name_for_collection", "configured_backend_names",
+    "normalize_where",
+]
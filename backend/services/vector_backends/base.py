@@ -0,0 +1,105 @@
+from abc import ABC, abstractmethod
+from typing import Dict, List, Optional
+
+# 元数据过滤条件支持的运算符（与Chroma的where语法一致）
+WHERE_OPERATORS = ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte", "$in", "$nin")
+WHERE_LOGICAL_OPERATORS = ("$and", "$or")
+
+
+def normalize_where(where: Optional[Dict]) -> Optional[Dict]:
+    """校验元数据过滤条件，并规范为Chroma接受的形式
+
+    Chroma要求每个条件字典只有一个键、每个字段只有一个运算符，例如
+    {"file_id": {"$in": [...]}, "start": {"$gte": 0, "$lt": 5000}} 规范为
+    {"$and": [{"file_id": {"$in": [...]}}, {"start": {"$gte": 0}}, {"start": {"$lt": 5000}}]}
+    """
+    if not where:
+        return None
+    if not isinstance(where, dict):
+        raise ValueError(f"过滤条件必须是字典: {where}")
+    conditions = []
+    for key, value in where.items():
+        if key in WHERE_LOGICAL_OPERATORS:
+            if not isinstance(value, list) or not value:
+                raise ValueError(f"{key} 的值必须是非空列表")
+            children = [normalize_where(condition) for condition in value]
+            conditions.append(children[0] if len(children) == 1 else {key: children})
+        elif key.startswith("$"):
+            raise ValueError(f"不支持的过滤运算符: {key}")
+        elif isinstance(value, dict):
+            if not value:
+                raise ValueError(f"字段 {key} 的过滤条件为空")
+            for operator, operand in value.items():
+                if operator not in WHERE_OPERATORS:
+                    raise ValueError(f"不支持的过滤运算符: {operator}，可选: {', '.join(WHERE_OPERATORS)}")
+                if operator in ("$in", "$nin") and (not isinstance(operand, list) or not operand):
+                    raise ValueError(f"{operator} 的值必须是非空列表")
+                conditions.append({key: {operator: operand}})
+        else:
+            conditions.append({key: value})
+    return conditions[0] if len(conditions) == 1 else {"$and": conditions}
+
+
+class VectorCollection(ABC):
+    """向量集合接口（与 chromadb Collection 的用法保持一致，IndexingService 只依赖这些方法）
+
+    Chroma后端直接返回 chromadb 的 Collection 对象（按同样的方法鸭子类型使用），其他后端继承本类。
+
+    属性:
+        name: 集合名称
+        metadata: 集合元数据
+    """
+
+    name: str
+    metadata: Optional[Dict]
+
+    @abstractmethod
+    def count(self) -> int:
+        """集合中的文档数"""
+
+    @abstractmethod
+    def modify(self, metadata: Dict):
+        """替换集合元数据"""
+
+    @abstractmethod
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None) -> Dict:
+        """按ID或元数据条件取文档，返回 {"ids": [...], "metadatas": [...], "documents": [...]}"""
+
+    @abstractmethod
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]):
+        """写入或覆盖文档"""
+
+    @abstractmethod
+    def update(self, ids: List[str], metadatas: List[Dict]):
+        """只更新元数据"""
+
+    @abstractmethod
+    def delete(self, ids: List[str]):
+        """按ID删除文档"""
+
+    @abstractmethod
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None) -> Dict:
+        """向量检索，返回与Chroma相同的结构：每个字段都是 [查询数][结果数] 的二维列表"""
+
+
+class VectorBackend(ABC):
+    """向量索引后端接口：管理一组集合"""
+
+    name: str
+
+    @abstractmethod
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None) -> VectorCollection:
+        """获取集合，不存在时创建"""
+
+    @abstractmethod
+    def get_collection(self, name: str) -> VectorCollection:
+        """获取已存在的集合，不存在时抛出ValueError"""
+
+    @abstractmethod
+    def list_collections(self) -> List[VectorCollection]:
+        """列出全部集合"""
+
+    @abstractmethod
+    def delete_collection(self, name: str):
+        """删除集合"""
@@ -0,0 +1,50 @@
+import threading
+from typing import Dict, List, Optional
+
+from backend.utils.config import CHROMA_DB_PATH
+from backend.utils.startup import timed_import
+from backend.services.vector_backends.base import VectorBackend
+
+
+class ChromaBackend(VectorBackend):
+    """Chroma持久化后端（chromadb的Collection本身即满足 VectorCollection 接口）"""
+
+    name = "chroma"
+
+    def __init__(self, path: str = CHROMA_DB_PATH):
+        # chromadb导入和数据库打开都推迟到首次使用
+        self.path = path
+        self._client = None
+        self._client_lock = threading.Lock()
+
+    @property
+    def client(self):
+        """Chroma客户端（首次访问时创建）"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    chromadb = timed_import("chromadb")
+                    self._client = chromadb.PersistentClient(
+                        path=self.path,
+                        settings=timed_import("chromadb.config").Settings(anonymized_telemetry=False)
+                    )
+        return self._client
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None):
+        if metadata:
+            return self.client.get_or_create_collection(name=name, metadata=metadata)
+        return self.client.get_or_create_collection(name=name)
+
+    def get_collection(self, name: str):
+        return self.client.get_collection(name=name)
+
+    def list_collections(self) -> List:
+        collections = self.client.list_collections()
+        # chromadb新版本的list_collections直接返回名称，旧版本返回Collection对象
+        return [
+            self.client.get_collection(name=col) if isinstance(col, str) else col
+            for col in collections
+        ]
+
+    def delete_collection(self, name: str):
+        self.client.delete_collection(name=name)
@@ -0,0 +1,580 @@
+import json
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from contextlib import closing
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from backend.utils.config import (
+    VECTOR_INDEX_PATH, NUMPY_SEARCH_BLOCK_ROWS, HNSW_M, HNSW_EF_CONSTRUCTION, HNSW_EF_SEARCH,
+    VECTOR_STORAGE_PRECISION
+)
+from backend.utils.startup import timed_import
+from backend.utils.vector_store import VECTOR_PRECISIONS, quantize_vectors, dequantize_vectors
+from backend.services.vector_backends.base import VectorBackend, VectorCollection, normalize_where
+
+# 集合名称限制（与Chroma一致），同时保证可以安全地用作目录名
+_COLLECTION_NAME = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]{1,61}[A-Za-z0-9]$")
+# 失效行（删除或被覆盖的旧向量）超过该数量且多于有效行时压缩向量文件
+_COMPACT_MIN_DEAD_ROWS = 1024
+
+
+_SQL_OPERATORS = {"$eq": "=", "$ne": "!=", "$gt": ">", "$gte": ">=", "$lt": "<", "$lte": "<="}
+
+
+def _where_sql(where: Optional[Dict]) -> Tuple[str, List]:
+    """把元数据条件（见 normalize_where）转换为SQL，元数据以JSON保存，json_extract 取出的值保留原始类型"""
+    where = normalize_where(where)
+    if not where:
+        return "1", []
+    key, value = next(iter(where.items()))
+    if key in ("$and", "$or"):
+        clauses, args = [], []
+        for condition in value:
+            clause, clause_args = _where_sql(condition)
+            clauses.append(f"({clause})")
+            args.extend(clause_args)
+        return (" AND " if key == "$and" else " OR ").join(clauses), args
+
+    operator, operand = next(iter(value.items())) if isinstance(value, dict) else ("$eq", value)
+    field = "json_extract(metadata, ?)"
+    path = f'$."{key}"'
+    if operator in ("$in", "$nin"):
+        placeholders = ", ".join("?" for _ in operand)
+        if operator == "$in":
+            return f"{field} IN ({placeholders})", [path] + list(operand)
+        return f"({field} IS NULL OR {field} NOT IN ({placeholders}))", [path, path] + list(operand)
+    return f"{field} {_SQL_OPERATORS[operator]} ?", [path, operand]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _remove_file(file_path: str):
+    """删除旧代数的文件（其他线程可能仍在读取已映射的旧文件，删除失败时只提示）"""
+    try:
+        if os.path.exists(file_path):
+            os.remove(file_path)
+    except OSError as e:
+        print(f"警告: 删除旧向量索引文件失败: {file_path}: {e}")
+
+
+class _Snapshot:
+    """某个版本的只读检索视图：向量矩阵、缩放系数与行号→文档ID的映射在同一个读事务中取得"""
+
+    __slots__ = ("version", "generation", "matrix", "scales", "live_mask", "row_ids", "row_by_id")
+
+    def __init__(self, version: int, generation: int, matrix: Optional[np.ndarray],
+                 scales: Optional[np.ndarray], rows: List[Tuple[int, str]]):
+        self.version = version
+        self.generation = generation
+        self.matrix = matrix
+        self.scales = scales
+        total_rows = len(matrix) if matrix is not None else 0
+        self.live_mask = np.zeros(total_rows, dtype=bool)
+        self.row_ids = np.empty(total_rows, dtype=object)
+        self.row_by_id = {}
+        for row, doc_id in rows:
+            if row < total_rows:
+                self.live_mask[row] = True
+                self.row_ids[row] = doc_id
+                self.row_by_id[doc_id] = row
+
+    def block(self, start: int, stop: int) -> np.ndarray:
+        """按块还原为float32（float16/int8只在检索时逐块还原，不整体展开到内存）"""
+        scales = self.scales[start:stop] if self.scales is not None else None
+        return dequantize_vectors(np.asarray(self.matrix[start:stop]), scales)
+
+    def rows(self, rows: np.ndarray) -> np.ndarray:
+        scales = self.scales[rows] if self.scales is not None else None
+        return dequantize_vectors(np.asarray(self.matrix[rows]), scales)
+
+
+class NumpyCollection(VectorCollection):
+    """基于NumPy的进程内向量集合
+
+    向量归一化后按 VECTOR_STORAGE_PRECISION（创建集合时确定）量化，追加写入 vectors.{代数}.dat
+    （int8的逐向量缩放系数写入 scales.{代数}.f32），检索时只读内存映射并逐块还原为float32；
+    文档、元数据和向量行号保存在同目录的 index.db（SQLite）中。
+    删除或覆盖只让旧行失效，失效行过多时把有效行压缩到下一代文件（代数加1）。
+    检索默认是分块矩阵乘 + argpartition 的精确余弦检索；hnsw=True 时使用 hnswlib 图索引，
+    图索引按代数保存在 graph.{代数}.bin，进程重启后直接加载。
+    """
+
+    def __init__(self, name: str, path: str, hnsw: bool = False):
+        self.name = name
+        self.path = path
+        self.hnsw = hnsw
+        self._db_path = os.path.join(path, "index.db")
+        self._lock = threading.Lock()
+        self._snapshot = None  # 当前版本的 _Snapshot
+        self._graph = None  # (generation, hnswlib.Index, 已加入图的行集合)
+
+    # ---- 存储 ----
+
+    def _vector_path(self, generation: int) -> str:
+        return os.path.join(self.path, f"vectors.{generation}.dat")
+
+    def _scales_path(self, generation: int) -> str:
+        return os.path.join(self.path, f"scales.{generation}.f32")
+
+    def _graph_path(self, generation: int) -> str:
+        return os.path.join(self.path, f"graph.{generation}.bin")
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self._db_path, timeout=30, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        return conn
+
+    def _init_storage(self, metadata: Optional[Dict]):
+        os.makedirs(self.path, exist_ok=True)
+        with closing(self._connect()) as conn:
+            conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS docs (id TEXT PRIMARY KEY, row INTEGER NOT NULL UNIQUE, "
+                "document TEXT, metadata TEXT NOT NULL)"
+            )
+            conn.executemany(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES (?, ?)",
+                [("metadata", json.dumps(metadata or {}, ensure_ascii=False)),
+                 ("dim", "0"), ("version", "0"), ("generation", "0"),
+                 ("precision", VECTOR_STORAGE_PRECISION)]
+            )
+
+    def _meta(self, conn: sqlite3.Connection, key: str) -> str:
+        return conn.execute("SELECT value FROM meta WHERE key = ?", (key,)).fetchone()[0]
+
+    def _bump_version(self, conn: sqlite3.Connection, generation: bool = False):
+        conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'version'")
+        if generation:
+            conn.execute("UPDATE meta SET value = CAST(value AS INTEGER) + 1 WHERE key = 'generation'")
+
+    @property
+    def metadata(self) -> Dict:
+        with closing(self._connect()) as conn:
+            return json.loads(self._meta(conn, "metadata"))
+
+    def modify(self, metadata: Dict):
+        with closing(self._connect()) as conn:
+            conn.execute(
+                "UPDATE meta SET value = ? WHERE key = 'metadata'",
+                (json.dumps(metadata or {}, ensure_ascii=False),)
+            )
+
+    def count(self) -> int:
+        with closing(self._connect()) as conn:
+            return conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+
+    def get(self, ids: Optional[List[str]] = None, where: Optional[Dict] = None,
+            include: Optional[List[str]] = None) -> Dict:
+        include = include if include is not None else ["metadatas", "documents"]
+        clause, args = _where_sql(where)
+        with closing(self._connect()) as conn:
+            if ids is not None:
+                rows = []
+                # 分批查询，避免超出SQLite的参数个数限制
+                for start in range(0, len(ids), 500):
+                    batch = ids[start:start + 500]
+                    rows.extend(conn.execute(
+                        f"SELECT id, document, metadata FROM docs WHERE {clause} "
+                        f"AND id IN ({', '.join('?' for _ in batch)})",
+                        args + list(batch)
+                    ).fetchall())
+            else:
+                rows = conn.execute(
+                    f"SELECT id, document, metadata FROM docs WHERE {clause} ORDER BY row", args
+                ).fetchall()
+        return {
+            "ids": [row[0] for row in rows],
+            "documents": [row[1] for row in rows] if "documents" in include else None,
+            "metadatas": [json.loads(row[2]) for row in rows] if "metadatas" in include else None
+        }
+
+    def upsert(self, ids: List[str], embeddings, documents: List[str], metadatas: List[Dict]):
+        if not ids:
+            return
+        vectors = _normalize(np.ascontiguousarray(embeddings, dtype=np.float32))
+        dim = vectors.shape[1]
+
+        with closing(self._connect()) as conn:
+            # 写锁同时保护向量文件的追加，多个进程写入时行号不会冲突
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                stored_dim = int(self._meta(conn, "dim"))
+                if stored_dim and stored_dim != dim:
+                    raise ValueError(f"向量维度 {dim} 与集合 {self.name} 的维度 {stored_dim} 不一致")
+                generation = int(self._meta(conn, "generation"))
+                data, scales = quantize_vectors(vectors, self._meta(conn, "precision"))
+                row_bytes = dim * data.itemsize
+                with open(self._vector_path(generation), "ab") as f:
+                    # 上次写入中断可能留下不完整的行，截断到整行边界
+                    size = f.seek(0, os.SEEK_END)
+                    if size % row_bytes:
+                        f.truncate(size - size % row_bytes)
+                        size -= size % row_bytes
+                    first_row = size // row_bytes
+                    f.write(data.tobytes())
+                if scales is not None:
+                    with open(self._scales_path(generation), "ab") as f:
+                        # 缩放系数文件与向量文件按行对齐（不足的部分补零，对应的行不会被引用）
+                        f.truncate(first_row * 4)
+                        f.write(scales.tobytes())
+                conn.executemany(
+                    "INSERT INTO docs (id, row, document, metadata) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(id) DO UPDATE SET row = excluded.row, document = excluded.document, "
+                    "metadata = excluded.metadata",
+                    [
+                        (doc_id, first_row + i, document, json.dumps(metadata or {}, ensure_ascii=False))
+                        for i, (doc_id, document, metadata) in enumerate(zip(ids, documents, metadatas))
+                    ]
+                )
+                conn.execute("UPDATE meta SET value = ? WHERE key = 'dim'", (str(dim),))
+                self._bump_version(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self._maybe_compact()
+
+    def update(self, ids: List[str], metadatas: List[Dict]):
+        with closing(self._connect()) as conn:
+            conn.executemany(
+                "UPDATE docs SET metadata = ? WHERE id = ?",
+                [(json.dumps(metadata or {}, ensure_ascii=False), doc_id) for doc_id, metadata in zip(ids, metadatas)]
+            )
+
+    def delete(self, ids: List[str]):
+        if not ids:
+            return
+        with closing(self._connect()) as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                conn.executemany("DELETE FROM docs WHERE id = ?", [(doc_id,) for doc_id in ids])
+                self._bump_version(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        self._maybe_compact()
+
+    def _maybe_compact(self):
+        """失效行过多时把有效行写入下一代向量文件
+
+        旧代数的文件在提交后才删除，正在使用旧快照的检索不受影响；
+        其他进程在读取旧快照期间文件被删除时会重新加载快照（见 _load_snapshot）。
+        """
+        with closing(self._connect()) as conn:
+            dim = int(self._meta(conn, "dim"))
+            generation = int(self._meta(conn, "generation"))
+            precision = self._meta(conn, "precision")
+            vector_path = self._vector_path(generation)
+            if not dim or not os.path.exists(vector_path):
+                return
+            total_rows = os.path.getsize(vector_path) // (dim * VECTOR_PRECISIONS[precision])
+            live = conn.execute("SELECT COUNT(*) FROM docs").fetchone()[0]
+            dead = total_rows - live
+            if dead < _COMPACT_MIN_DEAD_ROWS or dead <= live:
+                return
+
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                # 拿到写锁后重新读取代数，其他进程可能已经完成了压缩
+                if int(self._meta(conn, "generation")) != generation:
+                    conn.execute("ROLLBACK")
+                    return
+                rows = conn.execute("SELECT id, row FROM docs ORDER BY row").fetchall()
+                sources = [(vector_path, self._vector_path(generation + 1), precision)]
+                if precision == "int8":
+                    sources.append((self._scales_path(generation), self._scales_path(generation + 1), "float32"))
+                for source_path, target_path, dtype in sources:
+                    source = np.memmap(source_path, dtype=dtype, mode="r")
+                    source = source.reshape(-1, dim) if dtype == precision else source
+                    with open(target_path, "wb") as f:
+                        for start in range(0, len(rows), NUMPY_SEARCH_BLOCK_ROWS):
+                            batch = [row for _, row in rows[start:start + NUMPY_SEARCH_BLOCK_ROWS]]
+                            f.write(np.ascontiguousarray(source[batch]).tobytes())
+                    del source
+                # 行号整体改为负数再改回，避免UNIQUE约束在更新过程中冲突
+                conn.executemany("UPDATE docs SET row = ? WHERE id = ?", [(-1 - i, doc_id) for i, (doc_id, _) in enumerate(rows)])
+                conn.execute("UPDATE docs SET row = -1 - row")
+                self._bump_version(conn, generation=True)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+        for old_path in (vector_path, self._scales_path(generation), self._graph_path(generation)):
+            _remove_file(old_path)
+
+    # ---- 检索 ----
+
+    def _load_snapshot(self) -> _Snapshot:
+        """当前版本的检索视图，版本未变时复用
+
+        版本号、代数和行号→文档ID的映射在同一个读事务中读取，
+        因此快照中的行号与所映射的向量文件始终一致，不受并发压缩影响。
+        """
+        for _ in range(3):
+            with closing(self._connect()) as conn:
+                conn.execute("BEGIN")
+                try:
+                    version = int(self._meta(conn, "version"))
+                    with self._lock:
+                        if self._snapshot is not None and self._snapshot.version == version:
+                            return self._snapshot
+                    generation = int(self._meta(conn, "generation"))
+                    dim = int(self._meta(conn, "dim"))
+                    precision = self._meta(conn, "precision")
+                    rows = conn.execute("SELECT row, id FROM docs").fetchall()
+                finally:
+                    conn.execute("COMMIT")
+            try:
+                snapshot = self._open_snapshot(version, generation, dim, precision, rows)
+            except FileNotFoundError:
+                # 读事务结束后该代数的文件已被压缩删除，重新读取
+                continue
+            with self._lock:
+                self._snapshot = snapshot
+            return snapshot
+        raise ValueError(f"集合 {self.name} 正在频繁压缩，加载检索快照失败，请稍后重试")
+
+    def _open_snapshot(self, version: int, generation: int, dim: int, precision: str,
+                       rows: List[Tuple[int, str]]) -> _Snapshot:
+        vector_path = self._vector_path(generation)
+        if not dim or (not rows and not os.path.exists(vector_path)):
+            return _Snapshot(version, generation, None, None, [])
+        # 先打开文件再取大小，文件在此之后被删除也不影响已映射的内容
+        with open(vector_path, "rb") as f:
+            total_rows = os.fstat(f.fileno()).st_size // (dim * VECTOR_PRECISIONS[precision])
+            if not total_rows:
+                return _Snapshot(version, generation, None, None, [])
+            matrix = np.memmap(f, dtype=precision, mode="r", shape=(total_rows, dim))
+        scales = None
+        if precision == "int8":
+            with open(self._scales_path(generation), "rb") as f:
+                scales = np.memmap(f, dtype=np.float32, mode="r", shape=(total_rows,))
+        return _Snapshot(version, generation, matrix, scales, rows)
+
+    def _allowed_mask(self, where: Optional[Dict], snapshot: _Snapshot) -> np.ndarray:
+        """按元数据条件过滤出的行（通过快照中的文档ID映射为行号，不依赖当前的行号）"""
+        if not where:
+            return snapshot.live_mask
+        clause, args = _where_sql(where)
+        with closing(self._connect()) as conn:
+            doc_ids = [doc_id for (doc_id,) in conn.execute(f"SELECT id FROM docs WHERE {clause}", args)]
+        rows = [snapshot.row_by_id[doc_id] for doc_id in doc_ids if doc_id in snapshot.row_by_id]
+        mask = np.zeros_like(snapshot.live_mask)
+        mask[rows] = True
+        return mask
+
+    @staticmethod
+    def _exact_search(queries: np.ndarray, snapshot: _Snapshot, mask: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """分块矩阵乘 + argpartition 精确检索，返回 (行号, 相似度)，形状均为 [查询数, k]"""
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        best_scores = np.zeros((len(queries), 0), dtype=np.float32)
+        for start in range(0, len(snapshot.matrix), NUMPY_SEARCH_BLOCK_ROWS):
+            block_mask = mask[start:start + NUMPY_SEARCH_BLOCK_ROWS]
+            if not block_mask.any():
+                continue
+            scores = queries @ snapshot.block(start, start + NUMPY_SEARCH_BLOCK_ROWS).T
+            scores[:, ~block_mask] = -np.inf
+            block_k = min(k, scores.shape[1])
+            top = np.argpartition(-scores, block_k - 1, axis=1)[:, :block_k]
+            # 与之前的候选合并后再取前k个
+            rows = np.concatenate([best_rows, top + start], axis=1)
+            candidate_scores = np.concatenate([best_scores, np.take_along_axis(scores, top, axis=1)], axis=1)
+            keep = np.argpartition(-candidate_scores, min(k, rows.shape[1]) - 1, axis=1)[:, :k]
+            best_rows = np.take_along_axis(rows, keep, axis=1)
+            best_scores = np.take_along_axis(candidate_scores, keep, axis=1)
+        order = np.argsort(-best_scores, axis=1)
+        return np.take_along_axis(best_rows, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def _load_graph(self, hnswlib, generation: int, dim: int):
+        """加载已保存的该代数的图索引（不存在或损坏时返回None）"""
+        graph_path = self._graph_path(generation)
+        if not os.path.exists(graph_path):
+            return None
+        try:
+            index = hnswlib.Index(space="cosine", dim=dim)
+            index.load_index(graph_path)
+        except Exception as e:
+            print(f"警告: 加载图索引失败，将重新构建: {graph_path}: {e}")
+            return None
+        # 图中的行（包括已标记删除的）；同步时会对已失效的行补做删除标记
+        in_graph = np.zeros(index.get_max_elements(), dtype=bool)
+        labels = np.asarray(index.get_ids_list(), dtype=np.int64)
+        in_graph[labels[labels < len(in_graph)]] = True
+        return (generation, index, in_graph)
+
+    def _save_graph(self, generation: int, index):
+        """图索引写入临时文件后替换，其他进程不会读到写了一半的文件"""
+        graph_path = self._graph_path(generation)
+        temp_path = f"{graph_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        try:
+            index.save_index(temp_path)
+            os.replace(temp_path, graph_path)
+        except Exception as e:
+            _remove_file(temp_path)
+            print(f"警告: 保存图索引失败: {graph_path}: {e}")
+
+    def _graph_index(self, snapshot: _Snapshot):
+        """增量同步hnswlib图索引：新增的有效行加入图，已失效的行标记删除（压缩后按新代数重建）
+
+        图有变化时保存到 graph.{代数}.bin，进程重启后加载已保存的图，只同步之后的增量。
+        """
+        hnswlib = timed_import("hnswlib")
+        matrix, live_mask, generation = snapshot.matrix, snapshot.live_mask, snapshot.generation
+        params = self.metadata
+        with self._lock:
+            if self._graph is None or self._graph[0] != generation:
+                self._graph = self._load_graph(hnswlib, generation, matrix.shape[1])
+            if self._graph is None:
+                index = hnswlib.Index(space="cosine", dim=matrix.shape[1])
+                index.init_index(
+                    max_elements=max(len(matrix), 1),
+                    ef_construction=int(params.get("hnsw_ef_construction", HNSW_EF_CONSTRUCTION)),
+                    M=int(params.get("hnsw_m", HNSW_M))
+                )
+                self._graph = (generation, index, np.zeros(0, dtype=bool))
+            _, index, in_graph = self._graph
+
+            live_in_graph = np.zeros(max(len(matrix), len(in_graph)), dtype=bool)
+            live_in_graph[:len(in_graph)] = in_graph
+            live = np.zeros(len(live_in_graph), dtype=bool)
+            live[:len(live_mask)] = live_mask
+            changed = False
+            for row in np.flatnonzero(live_in_graph & ~live):
+                try:
+                    index.mark_deleted(int(row))
+                except RuntimeError:
+                    pass  # 加载的图中已标记删除
+                live_in_graph[row] = False
+                changed = True
+            new_rows = np.flatnonzero(live & ~live_in_graph)
+            if len(new_rows):
+                if index.get_current_count() + len(new_rows) > index.get_max_elements():
+                    index.resize_index(max(index.get_current_count() + len(new_rows), 2 * index.get_max_elements()))
+                for start in range(0, len(new_rows), NUMPY_SEARCH_BLOCK_ROWS):
+                    batch = new_rows[start:start + NUMPY_SEARCH_BLOCK_ROWS]
+                    index.add_items(snapshot.rows(batch), batch)
+                live_in_graph[new_rows] = True
+                changed = True
+            self._graph = (generation, index, live_in_graph)
+            if changed:
+                self._save_graph(generation, index)
+            return index
+
+    def query(self, query_embeddings, n_results: int = 10, where: Optional[Dict] = None) -> Dict:
+        queries = _normalize(np.atleast_2d(np.asarray(query_embeddings, dtype=np.float32)))
+        snapshot = self._load_snapshot()
+        mask = self._allowed_mask(where, snapshot)
+        k = min(n_results, int(mask.sum()))
+        if snapshot.matrix is None or k <= 0:
+            return {"ids": [[] for _ in queries], "documents": [[] for _ in queries],
+                    "metadatas": [[] for _ in queries], "distances": [[] for _ in queries]}
+
+        rows = distances = None
+        if self.hnsw:
+            index = self._graph_index(snapshot)
+            index.set_ef(max(int(self.metadata.get("hnsw_ef_search", HNSW_EF_SEARCH)), k))
+            # 其他线程可能已把图同步到更新的快照，图中有快照之外的行时同样需要过滤
+            needs_filter = bool(where) or index.get_current_count() > int(snapshot.live_mask.sum())
+            try:
+                labels, distances = index.knn_query(
+                    queries, k=k,
+                    filter=(lambda label: label < len(mask) and bool(mask[label])) if needs_filter else None
+                )
+                rows = labels.astype(np.int64)
+            except RuntimeError:
+                # 过滤后图中可达的结果不足k个时，退回精确检索
+                rows = None
+        if rows is None:
+            rows, scores = self._exact_search(queries, snapshot, mask, k)
+            distances = 1.0 - scores
+
+        # 行号按快照中的映射转换为文档ID，再按ID读取文档和元数据
+        row_ids = [[snapshot.row_ids[row] if 0 <= row < len(snapshot.row_ids) else None for row in query_rows.tolist()]
+                   for query_rows in rows]
+        hit_ids = list(dict.fromkeys(doc_id for query_ids in row_ids for doc_id in query_ids if doc_id is not None))
+        with closing(self._connect()) as conn:
+            records = {}
+            for start in range(0, len(hit_ids), 500):
+                batch = hit_ids[start:start + 500]
+                for doc_id, document, metadata in conn.execute(
+                    f"SELECT id, document, metadata FROM docs WHERE id IN ({', '.join('?' for _ in batch)})",
+                    batch
+                ):
+                    records[doc_id] = (doc_id, document, json.loads(metadata))
+
+        result = {"ids": [], "documents": [], "metadatas": [], "distances": []}
+        for query_ids, query_distances in zip(row_ids, distances):
+            # 快照之后被并发删除的文档直接跳过
+            hits = [(records[doc_id], float(distance))
+                    for doc_id, distance in zip(query_ids, query_distances) if doc_id in records]
+            result["ids"].append([record[0] for record, _ in hits])
+            result["documents"].append([record[1] for record, _ in hits])
+            result["metadatas"].append([record[2] for record, _ in hits])
+            result["distances"].append([distance for _, distance in hits])
+        return result
+
+
+class NumpyBackend(VectorBackend):
+    """NumPy进程内向量索引后端，每个集合一个目录（VECTOR_INDEX_PATH/{集合名}）
+
+    hnsw=False 为精确检索（numpy），hnsw=True 为 hnswlib 图索引近似检索（numpy-hnsw），两者存储格式相同。
+    """
+
+    def __init__(self, hnsw: bool = False, root: str = VECTOR_INDEX_PATH):
+        self.hnsw = hnsw
+        self.name = "numpy-hnsw" if hnsw else "numpy"
+        self.root = root
+        self._collections = {}
+        self._lock = threading.Lock()
+
+    def _collection(self, name: str) -> NumpyCollection:
+        with self._lock:
+            collection = self._collections.get(name)
+            if collection is None:
+                collection = NumpyCollection(name, os.path.join(self.root, name), self.hnsw)
+                self._collections[name] = collection
+            return collection
+
+    @staticmethod
+    def _check_name(name: str):
+        """集合名称直接用作目录名，拼接路径前先校验，避免路径穿越"""
+        if not _COLLECTION_NAME.match(name):
+            raise ValueError(f"集合名称不合法: {name}（3-63个字符，只能包含字母、数字、._-，且以字母或数字开头和结尾）")
+
+    def _exists(self, name: str) -> bool:
+        return os.path.exists(os.path.join(self.root, name, "index.db"))
+
+    def get_or_create_collection(self, name: str, metadata: Optional[Dict] = None) -> NumpyCollection:
+        self._check_name(name)
+        collection = self._collection(name)
+        if not self._exists(name):
+            collection._init_storage(metadata)
+        return collection
+
+    def get_collection(self, name: str) -> NumpyCollection:
+        self._check_name(name)
+        if not self._exists(name):
+            raise ValueError(f"集合不存在: {name}")
+        return self._collection(name)
+
+    def list_collections(self) -> List[NumpyCollection]:
+        if not os.path.isdir(self.root):
+            return []
+        return [self._collection(name) for name in sorted(os.listdir(self.root)) if self._exists(name)]
+
+    def delete_collection(self, name: str):
+        self._check_name(name)
+        if not self._exists(name):
+            raise ValueError(f"集合不存在: {name}")
+        with self._lock:
+            self._collections.pop(name, None)
+        shutil.rmtree(os.path.join(self.root, name))
@@ -15,9 +15,117 @@ AZURE_OPENAI_CHAT_DEPLOYMENT = os.getenv("AZURE_OPENAI_CHAT_DEPLOYMENT", "gpt-5-
 # 本地embedding模型配置
 LOCAL_EMBEDDING_MODEL = os.getenv("LOCAL_EMBEDDING_MODEL", "bert-base-uncased")
 
+# 本地embedding推理后端：torch（PyTorch全精度）、onnx（ONNX Runtime）、onnx-int8（ONNX动态int8量化）
+# EMBEDDING_ONNX_QUANTIZATION 为int8量化的目标指令集配置（arm64, avx2, avx512, avx512_vnni）
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+EMBEDDING_ONNX_QUANTIZATION = os.getenv("EMBEDDING_ONNX_QUANTIZATION", "avx512_vnni")
+
+# 多模型embedding：允许按请求/按集合选择的模型（逗号分隔，默认模型总是允许），
+# 已加载模型按最近使用顺序（LRU）在 EMBEDDING_MODEL_MEMORY_MB 内存预算内淘汰
+EMBEDDING_ALLOWED_MODELS = [
+    name.strip() for name in os.getenv("EMBEDDING_ALLOWED_MODELS", "").split(",") if name.strip()
+]
+EMBEDDING_MODEL_MEMORY_MB = int(os.getenv("EMBEDDING_MODEL_MEMORY_MB", "2048"))
+
+# embedding批处理配置：按token长度排序分桶，每批 EMBEDDING_BATCH_SIZE 条；
+# EMBEDDING_MAX_SEQ_LENGTH 为0时使用模型默认的最大序列长度
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "32"))
+EMBEDDING_MAX_SEQ_LENGTH = int(os.getenv("EMBEDDING_MAX_SEQ_LENGTH", "0"))
+
+# 流式嵌入：每批编码的分块数（每批完成后写入磁盘并记录断点）
+EMBEDDING_STREAM_BATCH_SIZE = int(os.getenv("EMBEDDING_STREAM_BATCH_SIZE", "1024"))
+
+# 多进程embedding编码：文本数达到 EMBEDDING_POOL_MIN_TEXTS 时分片到 EMBEDDING_POOL_WORKERS 个进程
+# （每个进程各持有一份模型），<=1表示关闭；进程池空闲 EMBEDDING_POOL_IDLE_SECONDS 秒后自动关闭
+EMBEDDING_POOL_WORKERS = int(os.getenv("EMBEDDING_POOL_WORKERS", "0"))
+EMBEDDING_POOL_MIN_TEXTS = int(os.getenv("EMBEDDING_POOL_MIN_TEXTS", "2000"))
+EMBEDDING_POOL_IDLE_SECONDS = float(os.getenv("EMBEDDING_POOL_IDLE_SECONDS", "300"))
+
+# 嵌入向量文件的存储精度：float32、float16、int8（按向量对称量化，每个向量保存一个缩放系数）
+VECTOR_STORAGE_PRECISION = os.getenv("VECTOR_STORAGE_PRECISION", "float32")
+
+# embedding持久化缓存：按（模型, 规范化文本哈希）复用已计算过的向量
+EMBEDDING_CACHE_ENABLED = os.getenv("EMBEDDING_CACHE_ENABLED", "true").lower() == "true"
+# 缓存向量文件的总大小上限，超过后按写入先后淘汰最早的向量并压缩文件；<=0表示不限制
+EMBEDDING_CACHE_MAX_MB = int(os.getenv("EMBEDDING_CACHE_MAX_MB", "2048"))
+
+# 查询embedding微批处理：QUERY_BATCH_WINDOW_MS 毫秒内到达的查询合并为一次前向计算，
+# 每批最多 QUERY_BATCH_MAX_SIZE 条，等待中的查询超过 QUERY_BATCH_MAX_QUEUE 时拒绝新请求；窗口<=0表示关闭
+QUERY_BATCH_WINDOW_MS = float(os.getenv("QUERY_BATCH_WINDOW_MS", "5"))
+QUERY_BATCH_MAX_SIZE = int(os.getenv("QUERY_BATCH_MAX_SIZE", "32"))
+QUERY_BATCH_MAX_QUEUE = int(os.getenv("QUERY_BATCH_MAX_QUEUE", "1024"))
+
+# 批量搜索：单个请求最多包含的查询数
+SEARCH_BATCH_MAX_QUERIES = int(os.getenv("SEARCH_BATCH_MAX_QUERIES", "10000"))
+
+# 启动预热：服务启动后在后台线程加载embedding模型和向量数据库，加载完成前 /api/system/ready 返回503
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
+# 流水线阶段执行器配置：I/O线程池、CPU进程池（加载/分块/解析）、文档嵌入推理线程池、查询编码线程池
+STAGE_IO_WORKERS = int(os.getenv("STAGE_IO_WORKERS", "8"))
+STAGE_CPU_WORKERS = int(os.getenv("STAGE_CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+STAGE_INFERENCE_WORKERS = int(os.getenv("STAGE_INFERENCE_WORKERS", "1"))
+STAGE_QUERY_WORKERS = int(os.getenv("STAGE_QUERY_WORKERS", "1"))
+
+# 大型PDF并行加载配置：页数达到阈值时按页范围拆分到多个进程提取，<=1表示关闭
+PARALLEL_LOADING_WORKERS = int(os.getenv("PARALLEL_LOADING_WORKERS", str(min(4, os.cpu_count() or 1))))
+PARALLEL_LOADING_PAGE_THRESHOLD = int(os.getenv("PARALLEL_LOADING_PAGE_THRESHOLD", "200"))
+
+# load_result 进程内缓存上限（按结果文件字节数计算）
+RESULT_CACHE_MAX_MB = int(os.getenv("RESULT_CACHE_MAX_MB", "256"))
+
+# 搜索结果缓存：按集合版本号失效（写入/删除集合时版本号加1），
+# 容量按结果的JSON字节数计算，条目超过 SEARCH_CACHE_TTL_SECONDS 秒后过期；容量为0表示关闭
+SEARCH_CACHE_MAX_MB = int(os.getenv("SEARCH_CACHE_MAX_MB", "64"))
+SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "300"))
+
+# 文档全文缓存：每个file_id的合并文本只构建一次（磁盘缓存 + 进程内LRU，单位为文档数）
+DOCUMENT_TEXT_CACHE_SIZE = int(os.getenv("DOCUMENT_TEXT_CACHE_SIZE", "8"))
+
+# 异步摄取任务队列配置
+JOB_INPROCESS_WORKERS = int(os.getenv("JOB_INPROCESS_WORKERS", "1"))  # API进程内的任务线程数，0表示只用独立worker
+JOB_POLL_INTERVAL = float(os.getenv("JOB_POLL_INTERVAL", "1.0"))  # 队列为空时的轮询间隔（秒）
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", "600"))  # 租约过期后任务可被其他worker接管
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_BACKOFF_SECONDS = float(os.getenv("JOB_RETRY_BACKOFF_SECONDS", "10"))  # 阶段失败后的重试间隔，每次重试翻倍
+
+# 文件上传配置：按固定大小的块流式写入磁盘，并限制单个文件大小
+UPLOAD_BLOCK_SIZE = int(os.getenv("UPLOAD_BLOCK_SIZE", str(1024 * 1024)))
+MAX_UPLOAD_SIZE_MB = int(os.getenv("MAX_UPLOAD_SIZE_MB", "500"))
+
+# 向量索引后端：chroma（默认）、numpy（进程内精确检索）、numpy-hnsw（hnswlib图索引近似检索）
+# VECTOR_COLLECTION_BACKENDS 按集合指定后端，格式为 "集合A:numpy,集合B:numpy-hnsw"
+VECTOR_BACKEND = os.getenv("VECTOR_BACKEND", "chroma")
+VECTOR_COLLECTION_BACKENDS = dict(
+    item.strip().split(":", 1) for item in os.getenv("VECTOR_COLLECTION_BACKENDS", "").split(",") if ":" in item
+)
+# numpy后端精确检索时每次矩阵乘的向量行数
+NUMPY_SEARCH_BLOCK_ROWS = int(os.getenv("NUMPY_SEARCH_BLOCK_ROWS", "65536"))
+# numpy-hnsw后端的默认图参数（可在集合元数据中用 hnsw_m/hnsw_ef_construction/hnsw_ef_search 覆盖）
+HNSW_M = int(os.getenv("HNSW_M", "16"))
+HNSW_EF_CONSTRUCTION = int(os.getenv("HNSW_EF_CONSTRUCTION", "200"))
+HNSW_EF_SEARCH = int(os.getenv("HNSW_EF_SEARCH", "64"))
+
+# 向量索引：每批写入/删除的文档数
+INDEX_UPSERT_BATCH_SIZE = int(os.getenv("INDEX_UPSERT_BATCH_SIZE", "512"))
+
+# BM25词法索引参数；混合检索用RRF（倒数排名融合）合并词法和向量排名，
+# 每种检索各取 max(n_results, HYBRID_CANDIDATES) 个候选
+BM25_K1 = float(os.getenv("BM25_K1", "1.2"))
+BM25_B = float(os.getenv("BM25_B", "0.75"))
+HYBRID_RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "50"))
+
 # 数据存储路径
 DATA_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), "data")
 CHROMA_DB_PATH = os.path.join(os.path.dirname(os.path.dirname(__file__)), "chroma_db")
+VECTOR_INDEX_PATH = os.getenv("VECTOR_INDEX_PATH", os.path.join(DATA_DIR, "vector_index"))
+LEXICAL_INDEX_PATH = os.getenv("LEXICAL_INDEX_PATH", os.path.join(DATA_DIR, "lexical_index"))
+# 结果目录（SQLite），保存各模块记录的摘要字段，供历史列表查询
+CATALOG_DB_PATH = os.getenv("CATALOG_DB_PATH", os.path.join(DATA_DIR, "catalog.db"))
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", os.path.join(DATA_DIR, "jobs.db"))
+# 各集合的版本号（多个进程共享，用于搜索结果缓存失效）
+COLLECTION_VERSIONS_DB_PATH = os.getenv("COLLECTION_VERSIONS_DB_PATH", os.path.join(DATA_DIR, "collection_versions.db"))
 
 # 确保目录存在
 os.makedirs(DATA_DIR, exist_ok=True)
@@ -0,0 +1,205 @@
+import hashlib
+import os
+import re
+import sqlite3
+from contextlib import closing
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from backend.utils.config import DATA_DIR, EMBEDDING_CACHE_MAX_MB
+
+EMBEDDING_CACHE_DIR = os.path.join(DATA_DIR, "embedding_cache")
+_INDEX_DB_PATH = os.path.join(EMBEDDING_CACHE_DIR, "index.db")
+# 超过上限时压缩到上限的这个比例，避免之后的每次写入都触发压缩
+_COMPACT_TARGET_RATIO = 0.8
+_COMPACT_BLOCK_ROWS = 4096
+
+
+def text_hash(text: str) -> str:
+    """规范化文本（合并连续空白、去掉首尾空白）后计算SHA-256
+
+    分词器本身会忽略空白差异，因此只改动了空白的文本可以复用同一个向量。
+    """
+    normalized = " ".join(text.split())
+    return hashlib.sha256(normalized.encode("utf-8")).hexdigest()
+
+
+def _vector_file(model_name: str, dim: int, generation: int = 0) -> str:
+    """向量文件路径，每次压缩生成新一代文件（第0代沿用旧的文件名，兼容已有缓存）"""
+    slug = re.sub(r"[^0-9A-Za-z._-]+", "_", model_name)
+    if generation == 0:
+        return os.path.join(EMBEDDING_CACHE_DIR, f"{slug}.{dim}.f32")
+    return os.path.join(EMBEDDING_CACHE_DIR, f"{slug}.{dim}.{generation}.f32")
+
+
+def _connect() -> sqlite3.Connection:
+    os.makedirs(EMBEDDING_CACHE_DIR, exist_ok=True)
+    conn = sqlite3.connect(_INDEX_DB_PATH, timeout=30, isolation_level=None)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS vectors ("
+        "model TEXT NOT NULL, text_hash TEXT NOT NULL, dim INTEGER NOT NULL, row INTEGER NOT NULL, "
+        "PRIMARY KEY (model, text_hash))"
+    )
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'files'").fetchone():
+        # 每个（模型, 维度）当前使用的向量文件代数；旧版本的缓存都在第0代文件中
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "model TEXT NOT NULL, dim INTEGER NOT NULL, generation INTEGER NOT NULL, "
+            "PRIMARY KEY (model, dim))"
+        )
+        conn.execute("INSERT OR IGNORE INTO files (model, dim, generation) SELECT DISTINCT model, dim, 0 FROM vectors")
+    return conn
+
+
+def _generation(conn: sqlite3.Connection, model_name: str, dim: int) -> int:
+    row = conn.execute("SELECT generation FROM files WHERE model = ? AND dim = ?", (model_name, dim)).fetchone()
+    return row[0] if row else 0
+
+
+def lookup(model_name: str, hashes: List[str]) -> Dict[str, np.ndarray]:
+    """查询缓存，返回 {文本哈希: 向量} （只包含命中的部分）"""
+    if not hashes:
+        return {}
+
+    rows = []
+    matrices = {}
+    with closing(_connect()) as conn:
+        # 读事务持有共享锁直到向量文件映射完成：压缩要等读取结束才能提交并删除旧文件，
+        # 读到的行号和打开的文件始终属于同一代
+        conn.execute("BEGIN")
+        try:
+            unique = list(dict.fromkeys(hashes))
+            # 分批查询，避免超出SQLite的参数个数限制
+            for start in range(0, len(unique), 500):
+                batch = unique[start:start + 500]
+                rows.extend(conn.execute(
+                    f"SELECT text_hash, dim, row FROM vectors WHERE model = ? "
+                    f"AND text_hash IN ({', '.join('?' for _ in batch)})",
+                    [model_name] + batch
+                ).fetchall())
+            for dim in {row[1] for row in rows}:
+                matrices[dim] = np.memmap(
+                    _vector_file(model_name, dim, _generation(conn, model_name, dim)), dtype=np.float32, mode="r"
+                ).reshape(-1, dim)
+        finally:
+            conn.execute("COMMIT")
+
+    found = {}
+    for hash_value, dim, row in rows:
+        matrix = matrices[dim]
+        if row < len(matrix):
+            found[hash_value] = np.array(matrix[row])
+    return found
+
+
+def store(model_name: str, hashes: List[str], vectors: np.ndarray):
+    """将新计算的向量追加到该模型的二进制向量文件，并登记行号
+
+    先登记行号，只追加真正新插入的向量：并发写入同一文本时，后写入的一方不会在文件中留下孤立的行。
+    缓存文件总大小超过 EMBEDDING_CACHE_MAX_MB 时在同一事务中压缩。
+    """
+    if not hashes:
+        return
+
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    dim = vectors.shape[1]
+    row_bytes = dim * 4
+    created, stale = [], []
+
+    with closing(_connect()) as conn:
+        # 写锁同时保护向量文件的追加，多个进程写入时行号不会冲突
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute("INSERT OR IGNORE INTO files (model, dim, generation) VALUES (?, ?, 0)", (model_name, dim))
+            vector_file = _vector_file(model_name, dim, _generation(conn, model_name, dim))
+            with open(vector_file, "ab") as f:
+                # 上次写入中断可能留下不完整的行，截断到整行边界
+                size = f.seek(0, os.SEEK_END)
+                if size % row_bytes:
+                    f.truncate(size - size % row_bytes)
+                    size -= size % row_bytes
+                first_row = size // row_bytes
+                inserted = []
+                for i, hash_value in enumerate(hashes):
+                    cursor = conn.execute(
+                        "INSERT OR IGNORE INTO vectors (model, text_hash, dim, row) VALUES (?, ?, ?, ?)",
+                        (model_name, hash_value, dim, first_row + len(inserted))
+                    )
+                    if cursor.rowcount:
+                        inserted.append(i)
+                if inserted:
+                    f.write(vectors[inserted].tobytes())
+            max_bytes = EMBEDDING_CACHE_MAX_MB * 1024 * 1024
+            if max_bytes > 0 and _total_bytes(conn) > max_bytes:
+                stale = _compact(conn, int(max_bytes * _COMPACT_TARGET_RATIO), created)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            for path in created:
+                _remove_file(path)
+            raise
+
+    for path in stale:
+        _remove_file(path)
+
+
+def _total_bytes(conn: sqlite3.Connection) -> int:
+    """当前各代向量文件的总大小"""
+    total = 0
+    for model_name, dim, generation in conn.execute("SELECT model, dim, generation FROM files").fetchall():
+        path = _vector_file(model_name, dim, generation)
+        if os.path.exists(path):
+            total += os.path.getsize(path)
+    return total
+
+
+def _compact(conn: sqlite3.Connection, target_bytes: int, created: List[str]) -> List[str]:
+    """按写入先后淘汰最早的向量，直到剩余向量不超过 target_bytes，再把保留的向量写入新一代文件
+
+    必须在写事务中调用。新文件路径追加到 created（事务回滚时删除），返回提交后可以删除的旧文件。
+    """
+    kept: Dict[Tuple[str, int], List[Tuple[str, int]]] = {}
+    used = 0
+    cutoff = None
+    cursor = conn.execute("SELECT rowid, model, text_hash, dim, row FROM vectors ORDER BY rowid DESC")
+    for rowid, model_name, hash_value, dim, row in cursor:
+        if used + dim * 4 > target_bytes:
+            cutoff = rowid
+            break
+        used += dim * 4
+        kept.setdefault((model_name, dim), []).append((hash_value, row))
+    cursor.close()
+    if cutoff is not None:
+        conn.execute("DELETE FROM vectors WHERE rowid <= ?", (cutoff,))
+
+    stale = []
+    for model_name, dim, generation in conn.execute("SELECT model, dim, generation FROM files").fetchall():
+        old_file = _vector_file(model_name, dim, generation)
+        entries = sorted(kept.get((model_name, dim), []), key=lambda entry: entry[1])
+        stale.append(old_file)
+        if not entries:
+            conn.execute("DELETE FROM files WHERE model = ? AND dim = ?", (model_name, dim))
+            continue
+
+        new_file = _vector_file(model_name, dim, generation + 1)
+        created.append(new_file)
+        old_matrix = np.memmap(old_file, dtype=np.float32, mode="r").reshape(-1, dim)
+        with open(new_file, "wb") as f:
+            for start in range(0, len(entries), _COMPACT_BLOCK_ROWS):
+                rows = [row for _, row in entries[start:start + _COMPACT_BLOCK_ROWS]]
+                f.write(np.ascontiguousarray(old_matrix[rows]).tobytes())
+        del old_matrix
+        conn.executemany(
+            "UPDATE vectors SET row = ? WHERE model = ? AND text_hash = ?",
+            [(new_row, model_name, hash_value) for new_row, (hash_value, _) in enumerate(entries)]
+        )
+        conn.execute("UPDATE files SET generation = ? WHERE model = ? AND dim = ?", (generation + 1, model_name, dim))
+    return stale
+
+
+def _remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
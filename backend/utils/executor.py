@@ -0,0 +1,103 @@
+import asyncio
+import functools
+import multiprocessing
+import threading
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict
+
+from backend.utils.config import STAGE_IO_WORKERS, STAGE_CPU_WORKERS, STAGE_INFERENCE_WORKERS, STAGE_QUERY_WORKERS
+
+# 阶段名称 -> (执行器类型, 并发数)
+#   io:        文件读写、Chroma查询、Azure OpenAI调用等I/O密集型操作
+#   cpu:       文档加载、分块、解析等CPU密集型纯Python操作，放到独立进程避免占用GIL
+#   inference: 文档嵌入（整个分块集合）的模型推理，模型常驻当前进程，单独的线程池避免与其他阶段争抢
+#   query:     搜索查询的编码，与文档嵌入分开，长时间的摄取嵌入不会阻塞搜索
+STAGES = {
+    "io": ("thread", STAGE_IO_WORKERS),
+    "cpu": ("process", STAGE_CPU_WORKERS),
+    "inference": ("thread", STAGE_INFERENCE_WORKERS),
+    "query": ("thread", STAGE_QUERY_WORKERS),
+}
+
+_executors = {}
+_lock = threading.Lock()
+
+
+def _create_executor(stage: str):
+    kind, workers = STAGES[stage]
+    if kind == "process":
+        # 使用spawn启动子进程，避免在多线程的服务进程中fork
+        return ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"stage-{stage}")
+
+
+def get_executor(stage: str):
+    """获取（必要时创建）指定阶段的执行器"""
+    if stage not in STAGES:
+        raise ValueError(f"不支持的执行阶段: {stage}")
+
+    executor = _executors.get(stage)
+    if executor is None:
+        with _lock:
+            executor = _executors.get(stage)
+            if executor is None:
+                executor = _create_executor(stage)
+                _executors[stage] = executor
+    return executor
+
+
+async def run_in_stage(stage: str, func, *args, **kwargs):
+    """在指定阶段的执行器中运行阻塞函数，不阻塞事件循环
+
+    cpu阶段运行在子进程中，func及其参数、返回值都需要可以被pickle。
+    """
+    loop = asyncio.get_running_loop()
+    executor = get_executor(stage)
+    try:
+        return await loop.run_in_executor(executor, functools.partial(func, *args, **kwargs))
+    except BrokenProcessPool:
+        _discard_executor(stage, executor)
+        raise ValueError(f"{stage}阶段的工作进程异常退出，请重试")
+
+
+def run_in_stage_sync(stage: str, func, *args, **kwargs):
+    """在指定阶段的执行器中运行阻塞函数并等待结果（供任务worker等不在事件循环中的线程使用）"""
+    executor = get_executor(stage)
+    try:
+        return executor.submit(func, *args, **kwargs).result()
+    except BrokenProcessPool:
+        _discard_executor(stage, executor)
+        raise ValueError(f"{stage}阶段的工作进程异常退出，请重试")
+
+
+def _discard_executor(stage: str, executor):
+    # 子进程异常退出（例如内存不足被杀）后进程池不可再用，丢弃以便下次重建
+    with _lock:
+        if _executors.get(stage) is executor:
+            del _executors[stage]
+    executor.shutdown(wait=False)
+
+
+def executor_stats() -> Dict:
+    """各阶段执行器的配置与状态"""
+    return {
+        stage: {
+            "type": kind,
+            "max_workers": workers,
+            "started": stage in _executors
+        }
+        for stage, (kind, workers) in STAGES.items()
+    }
+
+
+def shutdown_executors(wait: bool = True):
+    """关闭所有执行器（应用退出时调用）"""
+    with _lock:
+        executors = list(_executors.values())
+        _executors.clear()
+    for executor in executors:
+        executor.shutdown(wait=wait)
@@ -0,0 +1,13 @@
+import hashlib
+
+# 计算文件哈希时每次读取的块大小
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(file_path: str, block_size: int = HASH_BLOCK_SIZE) -> str:
+    """按块读取文件并计算SHA-256（不会把整个文件读入内存）"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
@@ -0,0 +1,73 @@
+import importlib
+import sys
+import threading
+import time
+from typing import Callable, Dict
+
+# 进程启动时间，用于计算各组件就绪时距启动的耗时
+_process_started = time.perf_counter()
+
+_lock = threading.Lock()
+_import_timings = {}  # 模块名 -> 首次导入耗时（秒）
+_components = {}  # 预热组件名 -> 状态
+
+
+def timed_import(module_name: str):
+    """导入模块并记录首次导入耗时（已导入的模块直接返回，不重复计时）
+
+    用于延迟导入fitz、sentence_transformers、chromadb等较重的依赖，
+    在 /api/system/startup 中查看每个模块的导入耗时。
+    """
+    module = sys.modules.get(module_name)
+    if module is not None:
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    with _lock:
+        _import_timings.setdefault(module_name, round(time.perf_counter() - started, 4))
+    return module
+
+
+def start_warmup(name: str, func: Callable[[], object]):
+    """在后台线程中执行预热（如加载模型），完成前 readiness 中该组件为未就绪"""
+    with _lock:
+        _components[name] = {"status": "loading", "seconds": None, "error": None}
+
+    def run():
+        started = time.perf_counter()
+        try:
+            func()
+            status, error = "ready", None
+        except Exception as e:
+            status, error = "failed", str(e)
+            print(f"警告: {name} 预热失败: {e}")
+        with _lock:
+            _components[name] = {
+                "status": status,
+                "seconds": round(time.perf_counter() - started, 4),
+                "ready_after_start": round(time.perf_counter() - _process_started, 4),
+                "error": error
+            }
+
+    threading.Thread(target=run, name=f"warmup-{name}", daemon=True).start()
+
+
+def readiness() -> Dict:
+    """所有预热组件均已就绪时 ready 为True"""
+    with _lock:
+        components = {name: dict(state) for name, state in _components.items()}
+    return {
+        "ready": all(state["status"] == "ready" for state in components.values()),
+        "components": components
+    }
+
+
+def startup_report() -> Dict:
+    """启动耗时报告：各模块首次导入耗时（按耗时倒序）与预热组件状态"""
+    with _lock:
+        imports = sorted(_import_timings.items(), key=lambda item: item[1], reverse=True)
+    return {
+        "uptime_seconds": round(time.perf_counter() - _process_started, 4),
+        "imports": [{"module": name, "seconds": seconds} for name, seconds in imports],
+        "warmup": readiness()["components"]
+    }
@@ -1,7 +1,148 @@
 import json
 import os
+import sqlite3
+import threading
+import time
+from contextlib import closing, contextmanager
 from pathlib import Path
-from backend.utils.config import DATA_DIR
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+from backend.utils.config import DATA_DIR, CATALOG_DB_PATH, RESULT_CACHE_MAX_MB
+from backend.utils.lru_cache import ByteLRUCache
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# 各模块历史列表展示的摘要字段（与各路由的 /history 返回格式保持一致）
+HISTORY_SUMMARY_FIELDS = {
+    "loading": lambda record_id, data: {
+        "file_id": record_id,
+        "file_name": data.get("file_name", ""),
+        "file_path": data.get("file_path", ""),
+        "loading_method": data.get("loading_method", ""),
+        "total_pages": data.get("result", {}).get("total_pages", 0),
+        "total_chunks": data.get("result", {}).get("total_chunks", 0),
+    },
+    "chunking": lambda record_id, data: {
+        "chunk_id": data.get("chunk_id", record_id),
+        "file_id": data.get("file_id", ""),
+        "chunking_strategy": data.get("strategy", data.get("chunking_strategy", "")),
+        "total_chunks": data.get("total_chunks", 0),
+    },
+    "parsing": lambda record_id, data: {
+        "parse_id": data.get("parse_id", record_id),
+        "file_id": data.get("file_id", ""),
+        "parse_type": data.get("parse_type", ""),
+    },
+    "embedding": lambda record_id, data: {
+        "embedding_id": data.get("embedding_id", record_id),
+        "chunk_id": data.get("chunk_id", ""),
+        "model": data.get("embedding_model", data.get("model", "")),
+        "embedding_dim": data.get("embedding_dim", 0),
+        "total_embeddings": data.get("total_embeddings", data.get("total_chunks", 0)),
+    },
+    "indexing": lambda record_id, data: {
+        "index_id": data.get("index_id", record_id),
+        "embedding_id": data.get("embedding_id", ""),
+        "collection_name": data.get("collection_name", ""),
+        "total_documents": data.get("total_documents", 0),
+    },
+    "filtering": lambda record_id, data: {
+        "filter_id": data.get("filter_id", record_id),
+        "total_results": data.get("total_results", 0),
+        "filtered_count": data.get("filtered_count", 0),
+        "min_score": data.get("min_score", 0),
+        "max_score": data.get("max_score", 1),
+    },
+    "generation": lambda record_id, data: {
+        "generation_id": data.get("generation_id", record_id),
+        "query": data.get("query", ""),
+        "filter_id": data.get("filter_id", ""),
+    },
+}
+
+# 记录之间的血缘字段，单独建列以便按上游ID查询
+LINEAGE_FIELDS = ["file_id", "chunk_id", "embedding_id", "filter_id", "collection_name"]
+
+
+# load_result 的进程内LRU缓存：以结果文件的字节数计入容量，命中时校验文件的修改时间和大小，
+# 文件被其他进程改写后会自动失效
+_result_cache = ByteLRUCache(RESULT_CACHE_MAX_MB * 1024 * 1024)
+
+_catalog_lock = threading.Lock()
+_catalog_ready = False
+# 当前进程内已与磁盘文件对账过的模块
+_synced_modules = set()
+
+
+def _connect_catalog() -> sqlite3.Connection:
+    """打开结果目录数据库（首次调用时建表）"""
+    global _catalog_ready
+    conn = sqlite3.connect(CATALOG_DB_PATH, timeout=30)
+    conn.row_factory = sqlite3.Row
+    if not _catalog_ready:
+        with _catalog_lock:
+            if not _catalog_ready:
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.execute(
+                    """
+                    CREATE TABLE IF NOT EXISTS results (
+                        module TEXT NOT NULL,
+                        record_id TEXT NOT NULL,
+                        created_at REAL NOT NULL,
+                        file_id TEXT,
+                        chunk_id TEXT,
+                        embedding_id TEXT,
+                        filter_id TEXT,
+                        collection_name TEXT,
+                        content_key TEXT,
+                        summary TEXT NOT NULL,
+                        PRIMARY KEY (module, record_id)
+                    )
+                    """
+                )
+                conn.execute(
+                    "CREATE INDEX IF NOT EXISTS idx_results_module_created "
+                    "ON results (module, created_at)"
+                )
+                # 兼容旧版本建立的目录：补充 content_key 列
+                columns = {row["name"] for row in conn.execute("PRAGMA table_info(results)")}
+                if "content_key" not in columns:
+                    conn.execute("ALTER TABLE results ADD COLUMN content_key TEXT")
+                for field in LINEAGE_FIELDS + ["content_key"]:
+                    conn.execute(
+                        f"CREATE INDEX IF NOT EXISTS idx_results_{field} ON results ({field})"
+                    )
+                conn.commit()
+                _catalog_ready = True
+    return conn
+
+
+def _catalog_row(module_name: str, file_id: str, result: dict, created_at: float) -> tuple:
+    """根据结果数据生成目录行"""
+    summarize = HISTORY_SUMMARY_FIELDS.get(module_name)
+    summary = summarize(file_id, result) if summarize else {}
+    summary["status"] = result.get("status", "unknown")
+    lineage = [result.get(field) for field in LINEAGE_FIELDS]
+    if module_name == "loading":
+        lineage[0] = file_id
+    return (
+        module_name, file_id, created_at, *lineage, result.get("content_key"),
+        json.dumps(summary, ensure_ascii=False)
+    )
+
+
+def _catalog_upsert(conn: sqlite3.Connection, module_name: str, file_id: str,
+                    result: dict, created_at: float):
+    conn.execute(
+        f"INSERT OR REPLACE INTO results "
+        f"(module, record_id, created_at, {', '.join(LINEAGE_FIELDS)}, content_key, summary) "
+        f"VALUES (?, ?, ?, {', '.join('?' for _ in LINEAGE_FIELDS)}, ?, ?)",
+        _catalog_row(module_name, file_id, result, created_at)
+    )
 
 
 def save_result(module_name: str, file_id: str, result: dict):
@@ -26,19 +167,41 @@ def save_result(module_name: str, file_id: str, result: dict):
         if os.path.exists(temp_path):
             os.remove(temp_path)
         raise ValueError(f"保存文件失败: {file_path}\n错误信息: {str(e)}")
+    finally:
+        _result_cache.invalidate((module_name, file_id))
+
+    # 同步更新结果目录；目录只是索引，写入失败时下次对账会补上
+    try:
+        with closing(_connect_catalog()) as conn, conn:
+            _catalog_upsert(conn, module_name, file_id, result, os.path.getmtime(file_path))
+    except Exception as e:
+        _synced_modules.discard(module_name)
+        print(f"警告: 结果目录更新失败 {module_name}/{file_id}: {e}")
 
     return file_path
 
 
 def load_result(module_name: str, file_id: str) -> dict:
-    """从JSON文件加载功能模块的处理结果"""
+    """从JSON文件加载功能模块的处理结果
+
+    结果会缓存在进程内（按文件修改时间和大小校验），返回的字典在调用方之间共享，不要修改。
+    """
     file_path = os.path.join(DATA_DIR, module_name, f"{file_id}.json")
-    if not os.path.exists(file_path):
+    try:
+        stat = os.stat(file_path)
+    except FileNotFoundError:
         return None
 
+    cache_key = (module_name, file_id)
+    cached = _result_cache.get(cache_key, (stat.st_mtime_ns, stat.st_size))
+    if cached is not None:
+        return cached
+
     try:
         with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
+            result = json.load(f)
+        _result_cache.put(cache_key, result, stat.st_size, (stat.st_mtime_ns, stat.st_size))
+        return result
     except json.JSONDecodeError as e:
         # JSON 解析错误，可能是文件损坏
         raise ValueError(
@@ -51,6 +214,209 @@ def load_result(module_name: str, file_id: str) -> dict:
         raise ValueError(f"加载文件失败: {file_path}\n错误信息: {str(e)}")
 
 
+def result_cache_stats() -> Dict:
+    """load_result 缓存的命中/未命中/淘汰计数和容量"""
+    return _result_cache.stats()
+
+
+def stream_file_name(file_id: str) -> str:
+    """流式结果文件名（JSONL，每行一条记录）"""
+    return f"{file_id}.jsonl"
+
+
+def save_result_stream(module_name: str, file_id: str, records: Iterable[dict]) -> int:
+    """将记录逐条追加写入JSONL文件（边产生边写入，不在内存中汇总）
+
+    与save_result一致，先写临时文件，全部写完后再重命名。
+
+    Returns:
+        写入的记录数
+    """
+    module_dir = os.path.join(DATA_DIR, module_name)
+    os.makedirs(module_dir, exist_ok=True)
+
+    file_path = os.path.join(module_dir, stream_file_name(file_id))
+    temp_path = f"{file_path}.tmp"
+    count = 0
+    try:
+        with open(temp_path, "w", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record, ensure_ascii=False))
+                f.write("\n")
+                count += 1
+        os.replace(temp_path, file_path)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise ValueError(f"保存文件失败: {file_path}\n错误信息: {str(e)}")
+
+    return count
+
+
+def iter_result_stream(module_name: str, file_id: str) -> Iterator[dict]:
+    """逐行读取JSONL结果文件（惰性读取，内存占用与文件大小无关）"""
+    file_path = os.path.join(DATA_DIR, module_name, stream_file_name(file_id))
+    if not os.path.exists(file_path):
+        raise ValueError(f"未找到流式结果文件: {file_path}")
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError as e:
+                raise ValueError(
+                    f"JSONL文件解析失败: {file_path}\n"
+                    f"错误位置: 第 {line_number} 行\n"
+                    f"错误信息: {str(e)}\n"
+                    f"文件可能已损坏，建议删除该文件后重新生成。"
+                )
+
+
+# 增量解析JSON结果文件时每次读取的字符数
+_JSON_READ_SIZE = 64 * 1024
+
+
+class _JsonReader:
+    """按块读取JSON文本并逐个解码值，缓冲区中只保留尚未解码的部分"""
+
+    def __init__(self, f, path: str):
+        self.f = f
+        self.path = path
+        self.buffer = ""
+        self.pos = 0
+        self.decoder = json.JSONDecoder()
+
+    def _fill(self) -> bool:
+        block = self.f.read(_JSON_READ_SIZE)
+        if not block:
+            return False
+        self.buffer = self.buffer[self.pos:] + block
+        self.pos = 0
+        return True
+
+    def next_char(self) -> str:
+        """跳过空白，返回下一个字符并前进"""
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in " \t\r\n":
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                self.pos += 1
+                return self.buffer[self.pos - 1]
+            if not self._fill():
+                raise ValueError(f"JSON文件不完整: {self.path}\n文件可能已损坏，建议删除该文件后重新生成。")
+
+    def value(self):
+        """跳过空白，解码下一个值"""
+        self.next_char()
+        self.pos -= 1
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError as e:
+                # 值被块边界截断：再读一块后重试
+                if self._fill():
+                    continue
+                raise ValueError(
+                    f"JSON文件解析失败: {self.path}\n"
+                    f"错误信息: {str(e)}\n"
+                    f"文件可能已损坏，建议删除该文件后重新生成。"
+                )
+            # 数字恰好在缓冲区末尾结束时可能还没读完
+            if end == len(self.buffer) and self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def expect(self, expected: str) -> str:
+        char = self.next_char()
+        if char not in expected:
+            raise ValueError(f"JSON文件格式错误: {self.path}\n位置 {self.pos} 处应为 {expected!r}，实际为 {char!r}")
+        return char
+
+
+def _seek_array_field(reader: _JsonReader, field: str) -> Tuple[dict, bool]:
+    """读取顶层对象中 field 之前的键值，遇到 field 时停在数组开头
+
+    Returns:
+        (field 之前的键值, 是否找到 field)
+    """
+    header = {}
+    reader.expect("{")
+    if reader.expect('"}') == "}":
+        return header, False
+    reader.pos -= 1
+    while True:
+        key = reader.value()
+        reader.expect(":")
+        if key == field:
+            reader.expect("[")
+            return header, True
+        header[key] = reader.value()
+        if reader.expect(",}") == "}":
+            return header, False
+
+
+def load_result_header(module_name: str, file_id: str, field: str) -> Optional[dict]:
+    """读取JSON结果文件中数组字段 field 之前的顶层字段，不解析数组本身
+
+    save_result 按字典的插入顺序写入，清单字段（总数、来源ID等）都在大数组之前；文件不存在时返回None。
+    """
+    file_path = os.path.join(DATA_DIR, module_name, f"{file_id}.json")
+    if not os.path.exists(file_path):
+        return None
+    with open(file_path, "r", encoding="utf-8") as f:
+        header, _ = _seek_array_field(_JsonReader(f, file_path), field)
+    return header
+
+
+def iter_result_items(module_name: str, file_id: str, field: str) -> Iterator:
+    """逐个读取JSON结果文件中顶层数组字段 field 的元素（增量解析，内存占用与数组长度无关）"""
+    file_path = os.path.join(DATA_DIR, module_name, f"{file_id}.json")
+    if not os.path.exists(file_path):
+        raise ValueError(f"未找到结果文件: {file_path}")
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        reader = _JsonReader(f, file_path)
+        _, found = _seek_array_field(reader, field)
+        if not found:
+            return
+        if reader.next_char() == "]":
+            return
+        reader.pos -= 1
+        while True:
+            yield reader.value()
+            if reader.expect(",]") == "]":
+                return
+
+
+@contextmanager
+def result_lock(module_name: str, file_id: str):
+    """结果文件的跨进程排他锁（锁文件 {file_id}.lock，持有锁的进程退出时自动释放）"""
+    module_dir = os.path.join(DATA_DIR, module_name)
+    os.makedirs(module_dir, exist_ok=True)
+    with open(os.path.join(module_dir, f"{file_id}.lock"), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_NBLCK, 1)
+                    break
+                except OSError:
+                    time.sleep(0.1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
 def list_results(module_name: str) -> list:
     """列出指定模块的所有结果文件"""
     module_dir = os.path.join(DATA_DIR, module_name)
@@ -67,3 +433,124 @@ def list_results(module_name: str) -> list:
             })
 
     return results
+
+
+def sync_catalog(module_name: str) -> List[str]:
+    """将结果目录与磁盘上的JSON文件对账
+
+    只读取目录中缺失的文件（例如目录建立之前生成的历史记录），
+    并删除文件已不存在的目录行。
+
+    Returns:
+        无法解析而被跳过的文件错误信息列表
+    """
+    module_dir = os.path.join(DATA_DIR, module_name)
+    on_disk = set()
+    if os.path.exists(module_dir):
+        on_disk = {
+            file[:-len(".json")]
+            for file in os.listdir(module_dir)
+            if file.endswith(".json")
+        }
+
+    errors = []
+    with closing(_connect_catalog()) as conn, conn:
+        cataloged = {
+            row["record_id"]
+            for row in conn.execute("SELECT record_id FROM results WHERE module = ?", (module_name,))
+        }
+        for record_id in cataloged - on_disk:
+            conn.execute(
+                "DELETE FROM results WHERE module = ? AND record_id = ?",
+                (module_name, record_id)
+            )
+        for record_id in on_disk - cataloged:
+            try:
+                result = load_result(module_name, record_id)
+            except Exception as e:
+                error = f"跳过损坏的文件 {module_name}/{record_id}: {str(e)}"
+                print(f"警告: 结果目录对账{error}")
+                errors.append(error)
+                continue
+            if result:
+                file_path = os.path.join(module_dir, f"{record_id}.json")
+                _catalog_upsert(conn, module_name, record_id, result, os.path.getmtime(file_path))
+
+    # 损坏的文件记录日志后跳过，不在之后的每次查询中重新读取（文件被重新保存时 save_result 会更新目录）
+    _synced_modules.add(module_name)
+    return errors
+
+
+def list_history(module_name: str, limit: Optional[int] = None, offset: int = 0,
+                 order: str = "desc") -> Dict:
+    """从结果目录中分页查询历史记录（不打开任何结果文件）
+
+    Args:
+        module_name: 模块名称
+        limit: 返回条数，None表示全部
+        offset: 跳过的条数
+        order: 按创建时间排序 (desc, asc)
+
+    Returns:
+        {"total": 总条数, "history": 摘要列表, "errors": 对账时跳过的文件}
+    """
+    if order not in ("desc", "asc"):
+        raise ValueError(f"不支持的排序方式: {order}")
+
+    errors = []
+    if module_name not in _synced_modules:
+        errors = sync_catalog(module_name)
+
+    with closing(_connect_catalog()) as conn:
+        total = conn.execute(
+            "SELECT COUNT(*) FROM results WHERE module = ?", (module_name,)
+        ).fetchone()[0]
+        rows = conn.execute(
+            f"SELECT record_id, created_at, summary FROM results WHERE module = ? "
+            f"ORDER BY created_at {order.upper()}, record_id LIMIT ? OFFSET ?",
+            (module_name, -1 if limit is None else limit, offset)
+        ).fetchall()
+
+    history = []
+    for row in rows:
+        item = json.loads(row["summary"])
+        item["created_at"] = row["created_at"]
+        history.append(item)
+
+    return {
+        "total": total,
+        "history": history,
+        "errors": errors
+    }
+
+
+def find_result_by_content(module_name: str, content_key: str) -> Optional[str]:
+    """按内容键查找已有的结果记录（用于去重复用），返回最新一条记录的ID
+
+    内容键由各服务根据输入内容和处理参数生成，例如加载阶段为 "文件哈希:加载方法"。
+    """
+    with closing(_connect_catalog()) as conn:
+        row = conn.execute(
+            "SELECT record_id FROM results WHERE module = ? AND content_key = ? "
+            "ORDER BY created_at DESC LIMIT 1",
+            (module_name, content_key)
+        ).fetchone()
+    if row is None:
+        return None
+    # 目录只是索引，结果文件被手动删除时视为未命中
+    if not os.path.exists(os.path.join(DATA_DIR, module_name, f"{row['record_id']}.json")):
+        return None
+    return row["record_id"]
+
+
+def forget_content_key(module_name: str, **lineage) -> int:
+    """清除满足血缘条件的记录的内容键，使其不再被去重复用（例如集合被删除后的索引记录）"""
+    conditions = [f"{field} = ?" for field in lineage if field in LINEAGE_FIELDS]
+    if not conditions:
+        raise ValueError("必须至少指定一个血缘字段")
+    with closing(_connect_catalog()) as conn, conn:
+        cursor = conn.execute(
+            f"UPDATE results SET content_key = NULL WHERE module = ? AND {' AND '.join(conditions)}",
+            [module_name] + [lineage[field] for field in lineage if field in LINEAGE_FIELDS]
+        )
+        return cursor.rowcount
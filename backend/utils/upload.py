@@ -0,0 +1,107 @@
+import hashlib
+import os
+import uuid
+from typing import Tuple
+
+from fastapi import HTTPException, UploadFile
+from fastapi.responses import JSONResponse
+from starlette.datastructures import Headers
+
+from backend.utils.config import DATA_DIR, UPLOAD_BLOCK_SIZE, MAX_UPLOAD_SIZE_MB
+from backend.utils.executor import run_in_stage
+
+UPLOAD_DIR = os.path.join(DATA_DIR, "upload")
+# multipart请求体中表单字段和分隔符的余量
+MULTIPART_OVERHEAD_BYTES = 1024 * 1024
+
+
+class UploadTooLargeError(ValueError):
+    """上传文件超过大小限制"""
+
+
+class UploadSizeLimitMiddleware:
+    """在解析multipart请求体之前限制上传大小
+
+    UploadFile 在路由函数执行之前就已被完整接收并缓存到临时文件，只在 save_upload_file 中检查大小为时已晚。
+    Content-Length 超过上限的请求直接返回413，不读取请求体；
+    没有 Content-Length（分块传输）时边接收边计数，超过上限立即中止。
+    """
+
+    def __init__(self, app, max_bytes: int = MAX_UPLOAD_SIZE_MB * 1024 * 1024 + MULTIPART_OVERHEAD_BYTES):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if not headers.get("content-type", "").startswith("multipart/form-data"):
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"上传文件超过大小限制: {MAX_UPLOAD_SIZE_MB}MB"
+        content_length = headers.get("content-length", "")
+        if content_length.isdigit() and int(content_length) > self.max_bytes:
+            await JSONResponse({"detail": detail}, status_code=413)(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+async def save_upload_file(file: UploadFile) -> Tuple[str, str]:
+    """将上传的文件按块流式写入 data/upload 目录，同时计算内容哈希
+
+    每次只读取 UPLOAD_BLOCK_SIZE 字节，单个上传占用的内存与文件大小无关；
+    超过 MAX_UPLOAD_SIZE_MB 时中止并删除已写入的部分。
+    相同内容的文件只保存一份，文件名为 SHA-256 + 原文件扩展名。
+
+    Returns:
+        (保存路径, 内容哈希)
+    """
+    os.makedirs(UPLOAD_DIR, exist_ok=True)
+
+    max_bytes = MAX_UPLOAD_SIZE_MB * 1024 * 1024
+    digest = hashlib.sha256()
+    total_bytes = 0
+
+    # 先写入临时文件，哈希确定后再重命名为内容寻址的文件名
+    temp_path = os.path.join(UPLOAD_DIR, f".{uuid.uuid4()}.part")
+    try:
+        with open(temp_path, "wb") as f:
+            while True:
+                block = await file.read(UPLOAD_BLOCK_SIZE)
+                if not block:
+                    break
+                total_bytes += len(block)
+                if total_bytes > max_bytes:
+                    raise UploadTooLargeError(f"上传文件超过大小限制: {MAX_UPLOAD_SIZE_MB}MB")
+                digest.update(block)
+                await run_in_stage("io", f.write, block)
+    except Exception:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    content_hash = digest.hexdigest()
+    file_ext = os.path.splitext(file.filename)[1] if file.filename else ""
+    file_path = os.path.join(UPLOAD_DIR, f"{content_hash}{file_ext}")
+
+    # 相同内容已上传过则直接复用
+    if os.path.exists(file_path):
+        os.remove(temp_path)
+    else:
+        os.replace(temp_path, file_path)
+
+    return file_path, content_hash
@@ -0,0 +1,106 @@
+"""向量存储精度基准测试：对比float16/int8量化后的检索召回率
+
+用法（在项目根目录）：
+    python -m backend.utils.vector_benchmark --embedding-id <embedding_id> --k 10 --queries 200
+
+以嵌入结果中的向量作为基准，随机抽取其中的向量作为查询（查询保持float32），
+分别用各精度还原后的向量做精确余弦检索，报告 recall@k 和存储大小。
+"""
+import argparse
+import json
+import sys
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+
+# 添加项目根目录到Python路径，支持从backend目录或项目根目录运行
+project_root = Path(__file__).resolve().parents[2]
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from backend.utils.storage import load_result
+from backend.utils.vector_store import (
+    VECTOR_PRECISIONS, quantize_vectors, dequantize_vectors, load_embedding_vectors
+)
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.maximum(norms, 1e-12)
+
+
+def _top_k(queries: np.ndarray, vectors: np.ndarray, k: int) -> np.ndarray:
+    """精确余弦检索，返回每个查询的前k个向量下标（无序）"""
+    scores = _normalize(queries) @ _normalize(vectors).T
+    return np.argpartition(-scores, k - 1, axis=1)[:, :k]
+
+
+def recall_at_k(vectors, k: int = 10, num_queries: int = 200,
+                precisions: Optional[List[str]] = None, seed: int = 0) -> Dict:
+    """计算各存储精度相对float32基准的 recall@k
+
+    Args:
+        vectors: 基准向量矩阵
+        k: 每个查询取回的结果数
+        num_queries: 随机抽取的查询数（不超过向量总数）
+        precisions: 待测精度，默认全部
+        seed: 抽样随机种子
+
+    Returns:
+        {"k", "queries", "vectors", "dim", "results": {精度: {recall, bytes, compression}}}
+    """
+    baseline = np.asarray(vectors, dtype=np.float32)
+    if len(baseline) == 0:
+        raise ValueError("向量矩阵为空，无法进行基准测试")
+    k = min(k, len(baseline))
+    rng = np.random.default_rng(seed)
+    query_indices = rng.choice(len(baseline), size=min(num_queries, len(baseline)), replace=False)
+    queries = baseline[query_indices]
+
+    expected = _top_k(queries, baseline, k)
+    full_bytes = baseline.nbytes
+    results = {}
+    for precision in precisions or list(VECTOR_PRECISIONS):
+        stored, scales = quantize_vectors(baseline, precision)
+        restored = dequantize_vectors(stored, scales)
+        found = _top_k(queries, restored, k)
+        hits = sum(len(set(row_expected) & set(row_found)) for row_expected, row_found in zip(expected, found))
+        stored_bytes = stored.nbytes + (scales.nbytes if scales is not None else 0)
+        results[precision] = {
+            "recall": round(hits / (len(queries) * k), 4),
+            "bytes": int(stored_bytes),
+            "compression": round(full_bytes / stored_bytes, 2)
+        }
+
+    return {
+        "k": k,
+        "queries": len(queries),
+        "vectors": len(baseline),
+        "dim": int(baseline.shape[1]),
+        "results": results
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="向量存储精度 recall@k 基准测试")
+    parser.add_argument("--embedding-id", required=True, help="作为基准的嵌入结果ID（建议为float32精度）")
+    parser.add_argument("--k", type=int, default=10, help="recall@k 中的k")
+    parser.add_argument("--queries", type=int, default=200, help="抽样查询数")
+    parser.add_argument("--precisions", nargs="*", choices=list(VECTOR_PRECISIONS), help="待测精度，默认全部")
+    args = parser.parse_args()
+
+    embedding_result = load_result("embedding", args.embedding_id)
+    if not embedding_result:
+        parser.error(f"未找到embedding_id: {args.embedding_id} 的嵌入结果")
+    if embedding_result.get("vector_dtype", "float32") != "float32":
+        print(f"警告: 该嵌入结果以 {embedding_result['vector_dtype']} 精度保存，基准本身已有量化误差")
+
+    # 基准需要完整的float32矩阵计算精确的近邻
+    vectors, scales = load_embedding_vectors(embedding_result)
+    report = recall_at_k(dequantize_vectors(vectors, scales), args.k, args.queries, args.precisions)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,188 @@
+import os
+from typing import Optional, Tuple
+
+import numpy as np
+
+from backend.utils.config import DATA_DIR, VECTOR_STORAGE_PRECISION
+
+# 支持的存储精度 -> 每个分量占用的字节数
+VECTOR_PRECISIONS = {"float32": 4, "float16": 2, "int8": 1}
+
+
+def vector_file_name(file_id: str) -> str:
+    """向量文件名（与JSON清单同名，扩展名为.npy）"""
+    return f"{file_id}.npy"
+
+
+def scales_file_name(file_id: str) -> str:
+    """int8量化向量的缩放系数文件名"""
+    return f"{file_id}.scales.npy"
+
+
+def quantize_vectors(vectors, precision: str = VECTOR_STORAGE_PRECISION) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """按存储精度转换向量矩阵
+
+    int8 使用逐向量的对称标量量化：scale = max(|x|) / 127，q = round(x / scale)，
+    返回 (量化矩阵, 缩放系数)；float32/float16 的缩放系数为None。
+    """
+    if precision not in VECTOR_PRECISIONS:
+        raise ValueError(f"不支持的向量存储精度: {precision}，可选: {', '.join(VECTOR_PRECISIONS)}")
+
+    matrix = np.ascontiguousarray(vectors, dtype=np.float32)
+    if precision != "int8":
+        return matrix.astype(precision, copy=False), None
+
+    scales = np.abs(matrix).max(axis=1, initial=0.0) / 127.0
+    # 全零向量的缩放系数取1，避免除零
+    scales = np.where(scales > 0, scales, 1.0).astype(np.float32)
+    quantized = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return quantized, scales
+
+
+def dequantize_vectors(vectors: np.ndarray, scales: Optional[np.ndarray] = None) -> np.ndarray:
+    """还原为float32矩阵（float32输入直接返回，保留内存映射）"""
+    if vectors.dtype == np.float32:
+        return vectors
+    if scales is not None:
+        return vectors.astype(np.float32) * np.asarray(scales, dtype=np.float32)[:, None]
+    return vectors.astype(np.float32)
+
+
+def _save_array(file_path: str, array: np.ndarray):
+    # 与save_result一致：先写临时文件再重命名，避免读到半截文件
+    temp_path = f"{file_path}.tmp"
+    try:
+        with open(temp_path, "wb") as f:
+            np.save(f, array, allow_pickle=False)
+        os.replace(temp_path, file_path)
+    except Exception as e:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise ValueError(f"保存向量文件失败: {file_path}\n错误信息: {str(e)}")
+
+
+def save_vectors(module_name: str, file_id: str, vectors, precision: str = VECTOR_STORAGE_PRECISION) -> str:
+    """将向量矩阵按存储精度以 .npy 格式保存在JSON清单旁边（int8额外保存缩放系数文件）"""
+    module_dir = os.path.join(DATA_DIR, module_name)
+    os.makedirs(module_dir, exist_ok=True)
+
+    file_path = os.path.join(module_dir, vector_file_name(file_id))
+    matrix, scales = quantize_vectors(vectors, precision)
+    # 先写缩放系数，保证向量文件可见时缩放系数已完整
+    if scales is not None:
+        _save_array(os.path.join(module_dir, scales_file_name(file_id)), scales)
+    _save_array(file_path, matrix)
+
+    return file_path
+
+
+class VectorStreamWriter:
+    """按批写入预分配的 .npy 内存映射文件（流式嵌入）
+
+    写入过程中使用 .partial 后缀的临时文件，finish() 时重命名为正式文件；
+    resume=True 时打开已有的临时文件继续写入（断点续传）。
+    """
+
+    def __init__(self, module_name: str, file_id: str, rows: int, dim: int,
+                 precision: str = VECTOR_STORAGE_PRECISION, resume: bool = False):
+        if precision not in VECTOR_PRECISIONS:
+            raise ValueError(f"不支持的向量存储精度: {precision}，可选: {', '.join(VECTOR_PRECISIONS)}")
+        module_dir = os.path.join(DATA_DIR, module_name)
+        os.makedirs(module_dir, exist_ok=True)
+        self.precision = precision
+        self.vector_path = os.path.join(module_dir, vector_file_name(file_id))
+        self.scales_path = os.path.join(module_dir, scales_file_name(file_id))
+
+        mode = "r+" if resume else "w+"
+        self.vectors = np.lib.format.open_memmap(
+            f"{self.vector_path}.partial", mode=mode, dtype=precision, shape=(rows, dim)
+        )
+        self.scales = np.lib.format.open_memmap(
+            f"{self.scales_path}.partial", mode=mode, dtype=np.float32, shape=(rows,)
+        ) if precision == "int8" else None
+        if self.vectors.shape != (rows, dim):
+            raise ValueError(f"断点文件的向量形状 {self.vectors.shape} 与预期 {(rows, dim)} 不一致")
+
+    @staticmethod
+    def partial_exists(module_name: str, file_id: str) -> bool:
+        return os.path.exists(os.path.join(DATA_DIR, module_name, f"{vector_file_name(file_id)}.partial"))
+
+    def write(self, start: int, vectors):
+        """写入从第start行开始的一批向量"""
+        matrix, scales = quantize_vectors(vectors, self.precision)
+        self.vectors[start:start + len(matrix)] = matrix
+        if scales is not None:
+            self.scales[start:start + len(scales)] = scales
+
+    def flush(self):
+        """把已写入的批次刷到磁盘（记录断点之前调用）"""
+        self.vectors.flush()
+        if self.scales is not None:
+            self.scales.flush()
+
+    def finish(self) -> str:
+        """全部写完后重命名为正式的向量文件"""
+        self.flush()
+        del self.vectors
+        if self.scales is not None:
+            del self.scales
+            os.replace(f"{self.scales_path}.partial", self.scales_path)
+        os.replace(f"{self.vector_path}.partial", self.vector_path)
+        return self.vector_path
+
+
+def load_vectors(module_name: str, file_id: str, mmap: bool = True) -> Optional[np.ndarray]:
+    """加载向量矩阵（按存储精度原样返回），默认以只读内存映射方式打开（零拷贝）"""
+    file_path = os.path.join(DATA_DIR, module_name, vector_file_name(file_id))
+    if not os.path.exists(file_path):
+        return None
+
+    try:
+        return np.load(file_path, mmap_mode="r" if mmap else None, allow_pickle=False)
+    except Exception as e:
+        raise ValueError(
+            f"向量文件加载失败: {file_path}\n"
+            f"错误信息: {str(e)}\n"
+            f"文件可能已损坏，建议删除该记录后重新生成。"
+        )
+
+
+def load_scales(module_name: str, file_id: str) -> Optional[np.ndarray]:
+    """加载int8量化向量的缩放系数"""
+    file_path = os.path.join(DATA_DIR, module_name, scales_file_name(file_id))
+    if not os.path.exists(file_path):
+        return None
+    return np.load(file_path, allow_pickle=False)
+
+
+def load_embedding_vectors(embedding_result: dict) -> Tuple[np.ndarray, Optional[np.ndarray]]:
+    """获取嵌入结果对应的向量矩阵（按存储精度原样返回，不整体还原）
+
+    新格式的向量保存在 .npy 旁路文件中，以内存映射方式打开；int8 精度同时返回缩放系数，
+    调用方用 dequantize_rows 按批还原为float32，内存中不会出现整个float32矩阵。
+    旧格式的记录仍把向量以列表形式写在 embedded_chunks 里，这里转换为 float32 矩阵返回。
+
+    Returns:
+        (向量矩阵, 缩放系数；非int8精度时为None)
+    """
+    if embedding_result.get("vector_file"):
+        embedding_id = embedding_result["embedding_id"]
+        vectors = load_vectors("embedding", embedding_id)
+        if vectors is None:
+            raise ValueError(f"未找到embedding_id: {embedding_id} 的向量文件")
+        scales = None
+        if embedding_result.get("vector_dtype") == "int8":
+            scales = load_scales("embedding", embedding_id)
+            if scales is None:
+                raise ValueError(f"未找到embedding_id: {embedding_id} 的向量缩放系数文件")
+        return vectors, scales
+
+    embedded_chunks = embedding_result.get("embedded_chunks", [])
+    if not embedded_chunks:
+        return np.zeros((0, embedding_result.get("embedding_dim", 0)), dtype=np.float32), None
+    return np.asarray([chunk["embedding"] for chunk in embedded_chunks], dtype=np.float32), None
+
+
+def dequantize_rows(vectors: np.ndarray, scales: Optional[np.ndarray], rows) -> np.ndarray:
+    """取出指定的行（切片或行号列表）并还原为float32，只转换取出的部分"""
+    return dequantize_vectors(np.asarray(vectors[rows]), scales[rows] if scales is not None else None)
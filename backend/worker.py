@@ -0,0 +1,52 @@
+"""独立的摄取任务worker
+
+用法（在项目根目录）：
+    python -m backend.worker --processes 4
+
+每个进程各自从 data/jobs.db 中领取任务，多个进程（或多台共享数据目录的机器）可以并行消费同一个队列。
+"""
+import argparse
+import multiprocessing
+import signal
+import sys
+import threading
+from pathlib import Path
+
+# 添加项目根目录到Python路径，支持从backend目录或项目根目录运行
+backend_dir = Path(__file__).parent
+project_root = backend_dir.parent
+if str(project_root) not in sys.path:
+    sys.path.insert(0, str(project_root))
+
+from backend.services.job_service import JobService
+
+
+def run_worker():
+    """单个worker进程：收到SIGTERM/SIGINT后处理完当前阶段再退出"""
+    stop_event = threading.Event()
+    signal.signal(signal.SIGTERM, lambda *_: stop_event.set())
+    signal.signal(signal.SIGINT, lambda *_: stop_event.set())
+    JobService.work_loop(stop_event)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG摄取任务worker")
+    parser.add_argument("--processes", type=int, default=1, help="worker进程数")
+    args = parser.parse_args()
+
+    if args.processes <= 1:
+        run_worker()
+        return
+
+    ctx = multiprocessing.get_context("spawn")
+    processes = [ctx.Process(target=run_worker, name=f"job-worker-{i}") for i in range(args.processes)]
+    for process in processes:
+        process.start()
+    # 主进程忽略信号，由子进程各自处理后退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()